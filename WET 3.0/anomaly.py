@@ -0,0 +1,294 @@
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import ANOMALY_FILE, TRANSACTION_FILE
+from fx import BASE_CURRENCY, convert_frame
+from records import TransactionColumns
+from utils import load_json_data, save_json_data
+
+# Weight of the newest week in the exponentially weighted statistics (about a 9 week span)
+ALPHA = 0.2
+# A week is flagged once a category has this many weeks of history and it
+# exceeds both the mean by THRESHOLD_SIGMAS deviations and THRESHOLD_RATIO times the mean
+MIN_WEEKS = 4
+THRESHOLD_SIGMAS = 3.0
+THRESHOLD_RATIO = 1.5
+# Flagged closed weeks kept in the state file
+MAX_FLAGS = 50
+
+WEEK = pd.Timedelta(days=7)
+# Transaction fields the statistics depend on
+ANOMALY_INPUTS = ["date", "transaction type", "category", "amount(kes)", "transaction fees", "currency"]
+
+
+def _frame(transactions):
+    if isinstance(transactions, TransactionColumns):
+        return transactions.to_frame()
+    return pd.DataFrame(list(transactions))
+
+
+def _row_hashes(transactions):
+    """
+    Hash of each row's ANOMALY_INPUTS; the sum over a run of rows fingerprints it
+
+    Values are normalised first, so a column store and the dicts it was
+    built from hash alike.
+    """
+    df = _frame(transactions)
+    inputs = pd.DataFrame({
+        column: (pd.to_numeric(df[column], errors="coerce").astype("float64").round(2)
+                 if column in ("amount(kes)", "transaction fees") else df[column].astype(str))
+        if column in df.columns else pd.Series("", index=df.index)
+        for column in ANOMALY_INPUTS
+    }, index=df.index)
+    return pd.util.hash_pandas_object(inputs, index=False).to_numpy()
+
+
+def _fingerprint(hashes):
+    # Sum of row hashes as text, as JSON cannot hold every uint64; any edit or removal changes it
+    return str(int(hashes.sum(dtype="uint64")))
+
+
+def _spend_frame(transactions):
+    """
+    Money out (amount plus fees, in shillings) with the Monday of its week
+    """
+    df = _frame(transactions)
+    if df.empty:
+        return pd.DataFrame(columns=["week", "category", "spend"])
+    df = convert_frame(df[df["transaction type"] == "credit"], BASE_CURRENCY)
+    days = pd.to_datetime(df["date"], errors="coerce")
+    return pd.DataFrame({
+        "week": days - pd.to_timedelta(days.dt.weekday, unit="D"),
+        "category": df["category"].astype(str),
+        "spend": pd.to_numeric(df["amount(kes)"], errors="coerce").fillna(0.0)
+        + pd.to_numeric(df["transaction fees"], errors="coerce").fillna(0.0),
+    }).dropna(subset=["week"])
+
+
+def is_anomalous(spend, stats):
+    """
+    Whether a week's spend is out of line with a category's statistics
+    """
+    if stats["weeks"] < MIN_WEEKS or stats["mean"] <= 0:
+        return False
+    return spend > stats["mean"] + THRESHOLD_SIGMAS * math.sqrt(stats["var"]) \
+        and spend > THRESHOLD_RATIO * stats["mean"]
+
+
+def _flag(week, category, spend, stats):
+    return {
+        "week": week,
+        "category": category,
+        "spend": round(float(spend), 2),
+        "usual": round(float(stats["mean"]), 2),
+        "ratio": round(float(spend / stats["mean"]), 2),
+    }
+
+
+def _fold_week(stats, spend):
+    """
+    Add one closed week to a category's exponentially weighted mean and variance in O(1)
+    """
+    if stats["weeks"] == 0:
+        stats["mean"], stats["var"] = spend, 0.0
+    else:
+        diff = spend - stats["mean"]
+        increment = ALPHA * diff
+        stats["mean"] += increment
+        stats["var"] = (1 - ALPHA) * (stats["var"] + diff * increment)
+    stats["weeks"] += 1
+
+
+def update_stats(state, week, category, spend):
+    """
+    Fold one transaction into the rolling statistics
+
+    Each category keeps the total of its open (latest) week plus statistics
+    over the closed weeks before it. A transaction in a later week closes
+    the open week, checks it for an anomaly and folds it in, along with a
+    zero for every week without spending in between.
+
+    Args:
+        state (dict): Anomaly state, updated in place
+        week (str): ISO date of the transaction's Monday
+        category (str): Transaction category
+        spend (float): Amount plus fees in shillings
+
+    Returns:
+        bool: False if the transaction is older than the category's open
+              week, which needs a backfill instead
+    """
+    stats = state["categories"].get(category)
+    if stats is None:
+        state["categories"][category] = {"week": week, "total": spend, "mean": 0.0, "var": 0.0, "weeks": 0}
+        return True
+    if week == stats["week"]:
+        stats["total"] += spend
+        return True
+    if week < stats["week"]:
+        return False
+
+    if is_anomalous(stats["total"], stats):
+        state["flags"] = (state["flags"] + [_flag(stats["week"], category, stats["total"], stats)])[-MAX_FLAGS:]
+    _fold_week(stats, stats["total"])
+    gap = (pd.Timestamp(week) - pd.Timestamp(stats["week"])) // WEEK - 1
+    for _ in range(gap):
+        _fold_week(stats, 0.0)
+    stats["week"], stats["total"] = week, spend
+    return True
+
+
+def backfill(transactions):
+    """
+    Compute the statistics over the full history in one vectorised pass
+
+    Weekly spend is pivoted to a weeks x categories table with zeros for
+    quiet weeks. pandas' exponentially weighted mean and biased variance
+    (adjust=False) follow the same recurrence as update_stats, so the
+    result matches replaying every transaction.
+
+    Returns:
+        dict: Anomaly state with per-category statistics and flagged weeks
+    """
+    state = {"version": None, "rows": len(transactions), "categories": {}, "flags": []}
+    spend = _spend_frame(transactions)
+    if spend.empty:
+        return state
+
+    weekly = spend.pivot_table(index="week", columns="category", values="spend", aggfunc="sum")
+    weekly = weekly.reindex(pd.date_range(weekly.index.min(), weekly.index.max(), freq="7D"))
+    seen = weekly.notna()
+    first = seen.idxmax()
+    last = seen[::-1].idxmax()
+    rows = np.arange(len(weekly))[:, None]
+    first_row = weekly.index.get_indexer(first)
+    last_row = weekly.index.get_indexer(last)
+
+    # Weeks before a category's first spend stay NaN so its statistics start there
+    values = weekly.fillna(0.0).where(rows >= first_row)
+    ewm = values.ewm(alpha=ALPHA, adjust=False)
+    # Statistics as of the end of the previous week, i.e. before each week is added
+    mean = ewm.mean().shift(1)
+    var = ewm.var(bias=True).shift(1)
+    weeks = pd.DataFrame(rows - first_row, index=weekly.index, columns=weekly.columns)
+
+    flagged = (weeks >= MIN_WEEKS) & (mean > 0) & (rows < last_row) \
+        & (values > mean + THRESHOLD_SIGMAS * np.sqrt(var)) & (values > THRESHOLD_RATIO * mean)
+    for week, category in flagged.stack().loc[lambda s: s].index:
+        stats = {"mean": mean.at[week, category], "var": var.at[week, category], "weeks": weeks.at[week, category]}
+        state["flags"].append(_flag(week.strftime("%Y-%m-%d"), category, values.at[week, category], stats))
+    state["flags"] = state["flags"][-MAX_FLAGS:]
+
+    for category, row in zip(weekly.columns, last_row):
+        closed = int(weeks[category].iloc[row])
+        state["categories"][category] = {
+            "week": weekly.index[row].strftime("%Y-%m-%d"),
+            "total": float(values[category].iloc[row]),
+            "mean": float(mean[category].iloc[row]) if closed else 0.0,
+            "var": float(var[category].iloc[row]) if closed else 0.0,
+            "weeks": closed,
+        }
+    return state
+
+
+def load_anomaly_state():
+    if not os.path.exists(ANOMALY_FILE):
+        return None
+    try:
+        with open(ANOMALY_FILE) as file:
+            return json.load(file)
+    except json.JSONDecodeError:
+        return None
+
+
+def save_anomaly_state(state):
+    # Sessions refresh at the same time; each writes a temp file and swaps it in
+    save_json_data(ANOMALY_FILE, state)
+
+
+def refresh_anomalies(transactions, version):
+    """
+    Bring the anomaly state up to date with the ledger
+
+    Rows appended since the state was saved are folded in one at a time,
+    provided the rows already folded in are unchanged, which a fingerprint
+    of them tells; edits, removals, or rows dated before a category's open
+    week trigger a backfill.
+    The state is kept in the session and in ANOMALY_FILE so a new session
+    starts where the last one stopped.
+
+    Args:
+        transactions (list): The ledger in file order
+        version: Ledger file version from its stat
+
+    Returns:
+        dict: Current anomaly state
+    """
+    version = list(version) if version else None
+    state = st.session_state.get("anomaly_state") or load_anomaly_state()
+    if state is not None and state["version"] == version:
+        st.session_state.anomaly_state = state
+        return state
+
+    hashes = _row_hashes(transactions)
+    if state is not None and state["rows"] < len(transactions) \
+            and _fingerprint(hashes[:state["rows"]]) == state.get("fingerprint"):
+        new = _spend_frame(transactions[state["rows"]:]).sort_values("week", kind="stable")
+        in_order = all(update_stats(state, week.strftime("%Y-%m-%d"), category, spend)
+                       for week, category, spend in new.itertuples(index=False))
+        if not in_order:
+            state = None
+    else:
+        state = None
+
+    if state is None:
+        state = backfill(transactions)
+    state.update(version=version, rows=len(transactions), fingerprint=_fingerprint(hashes))
+    save_anomaly_state(state)
+    st.session_state.anomaly_state = state
+    return state
+
+
+def current_anomalies(state, today=None, weeks=4):
+    """
+    Flagged weeks from the recent past, plus open weeks already out of line
+
+    Args:
+        state (dict): Anomaly state
+        today (date): Reference date, defaults to today
+        weeks (int): How many weeks back closed flags are shown
+
+    Returns:
+        list: Flag dicts with "week", "category", "spend", "usual" and "ratio",
+              newest first
+    """
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    since = (today - pd.Timedelta(days=today.weekday()) - weeks * WEEK).strftime("%Y-%m-%d")
+    flags = [flag for flag in state["flags"] if flag["week"] >= since]
+    flags += [_flag(stats["week"], category, stats["total"], stats)
+              for category, stats in state["categories"].items()
+              if stats["week"] >= since and is_anomalous(stats["total"], stats)]
+    return sorted(flags, key=lambda flag: flag["week"], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute per-category spending statistics for the WET ledger")
+    parser.add_argument("--backfill", action="store_true", help="rebuild from the full history")
+    args = parser.parse_args()
+    if args.backfill:
+        ledger = load_json_data(TRANSACTION_FILE)
+        stat = os.stat(TRANSACTION_FILE)
+        state = backfill(ledger)
+        state["version"] = [stat.st_mtime_ns, stat.st_size]
+        state["fingerprint"] = _fingerprint(_row_hashes(ledger))
+        save_anomaly_state(state)
+        print(f"Statistics for {len(state['categories'])} categories, {len(state['flags'])} flagged weeks")
+    else:
+        parser.print_help()
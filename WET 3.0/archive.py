@@ -0,0 +1,278 @@
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from config import ARCHIVE_FOLDER, ARCHIVE_INDEX, ARCHIVE_JOURNAL, TRANSACTION_FILE
+from fx import BASE_CURRENCY, convert_frame, rates_version
+from history import commit, events_since, history_version, store_lock
+from utils import load_json_data, save_json_data
+
+# History label of the change that trims archived rows from the hot file
+ARCHIVE_LABEL = "Archive closed periods"
+# Partition keys are date prefixes: "2024" for yearly, "2024-03" for monthly
+PARTITION_LENGTHS = {
+    "year": 4,
+    "month": 7,
+}
+
+
+def archive_path(key):
+    return os.path.join(ARCHIVE_FOLDER, f"transactions_{key}.json.gz")
+
+
+def summarize_partition(transactions):
+    """
+    Totals kept for a closed partition so dashboards never need to open it
+
+    Money totals are in shillings, converted at each transaction's date.
+    Daily totals are kept too, so a reporting currency can be applied at
+    each day's rate as it is for the hot ledger.
+
+    Args:
+        transactions (list): Transaction dicts in the partition
+
+    Returns:
+        dict: Row count, date span, inflow/outflow/fee totals, per-category
+              sums, "daily" [inflow, outflow, fees] by day and the number of
+              rows "unconverted" for want of an exchange rate
+    """
+    df = convert_frame(pd.DataFrame(transactions))
+    amounts = pd.to_numeric(df.get("amount(kes)", pd.Series(dtype=float)), errors="coerce")
+    unconverted = int(amounts.isna().sum())
+    amounts = amounts.fillna(0.0)
+    fees = pd.to_numeric(df.get("transaction fees", pd.Series(0.0, index=df.index)), errors="coerce").fillna(0.0)
+    types = df.get("transaction type", pd.Series("", index=df.index)).astype(str).str.lower()
+    categories = df.get("category", pd.Series("", index=df.index)).fillna("").astype(str)
+    dates = pd.to_datetime(df.get("date"), errors="coerce")
+
+    money_in = types.str.contains("debit|money in", na=False)
+    money_out = types.str.contains("credit|money out", na=False)
+    inflow = float(amounts[money_in].sum())
+    outflow = float(amounts[money_out].sum())
+    total_fees = float(fees.sum())
+    daily = pd.DataFrame({"inflow": amounts.where(money_in, 0.0), "outflow": amounts.where(money_out, 0.0),
+                          "fees": fees}).groupby(dates.dt.strftime("%Y-%m-%d")).sum()
+
+    return {
+        "rows": len(df),
+        "first_date": dates.min().strftime("%Y-%m-%d"),
+        "last_date": dates.max().strftime("%Y-%m-%d"),
+        "inflow": inflow,
+        "outflow": outflow,
+        "fees": total_fees,
+        "net": inflow - outflow - total_fees,
+        "income_by_category": amounts[money_in].groupby(categories[money_in]).sum().to_dict(),
+        "expense_by_category": amounts[money_out].groupby(categories[money_out]).sum().to_dict(),
+        "daily": {day: [float(value) for value in values] for day, values in zip(daily.index, daily.to_numpy())},
+        "unconverted": unconverted,
+    }
+
+
+def load_archive_summaries():
+    """
+    Load the summary record of every archived partition
+
+    Returns:
+        dict: Partition key to summary, oldest first
+    """
+    if not os.path.exists(ARCHIVE_INDEX):
+        return {}
+    with open(ARCHIVE_INDEX, "r") as file:
+        return dict(sorted(json.load(file).items()))
+
+
+def _file_version(file_path):
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def archived_flows(currency=BASE_CURRENCY):
+    """
+    Daily inflow, outflow, fees and net of the archived partitions
+
+    Each day is converted at its own rate, like the transactions of the hot
+    ledger. Summaries written before daily totals were kept count as one
+    day, their last.
+
+    Args:
+        currency (str): Reporting currency
+
+    Returns:
+        DataFrame: "date", "inflow", "outflow", "fees" and "net", one row per day
+    """
+    return _archived_flows(_file_version(ARCHIVE_INDEX), currency, rates_version())
+
+
+@st.cache_data(show_spinner=False)
+def _archived_flows(version, currency, rates):
+    rows = []
+    for summary in load_archive_summaries().values():
+        daily = summary.get("daily") or {summary["last_date"]: [summary["inflow"], summary["outflow"], summary["fees"]]}
+        rows.extend([day, *values] for day, values in daily.items())
+    flows = pd.DataFrame(rows, columns=["date", "inflow", "outflow", "fees"]).assign(currency=BASE_CURRENCY)
+    flows = convert_frame(flows, currency, columns=("inflow", "outflow", "fees")).drop(columns="currency")
+    flows["net"] = flows["inflow"] - flows["outflow"] - flows["fees"]
+    return flows
+
+
+def archived_totals(currency=BASE_CURRENCY):
+    """
+    Add up the inflow, outflow, fees and net of all archived partitions
+
+    Returns:
+        dict: Money totals in the reporting currency, plus the archived "rows"
+              and how many of them are "unconverted" for want of a rate
+    """
+    summaries = load_archive_summaries()
+    flows = archived_flows(currency)
+    totals = {key: float(flows[key].sum()) for key in ("inflow", "outflow", "fees", "net")}
+    totals["rows"] = sum(summary["rows"] for summary in summaries.values())
+    totals["unconverted"] = sum(summary.get("unconverted", 0) for summary in summaries.values())
+    return totals
+
+
+def _write_archive(key, transactions):
+    path = archive_path(key)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+        json.dump(transactions, file)
+    os.replace(tmp_path, path)
+
+
+@st.cache_data(show_spinner=False)
+def _read_archive(path, mtime):
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def load_partition(key):
+    """
+    Open an archived partition, caching it until the archive file changes
+
+    Args:
+        key (str): Partition key such as "2023"
+
+    Returns:
+        list: The archived transaction dicts, or [] if there is no archive
+    """
+    path = archive_path(key)
+    if not os.path.exists(path):
+        return []
+    return _read_archive(path, os.path.getmtime(path))
+
+
+def load_transactions_between(start, end):
+    """
+    Load transactions in a date range, opening only the archives that overlap it
+
+    Args:
+        start: First date of the range (inclusive)
+        end: Last date of the range (inclusive)
+
+    Returns:
+        list: Matching archived and hot transaction dicts
+    """
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    transactions = []
+    for key, summary in load_archive_summaries().items():
+        if pd.Timestamp(summary["last_date"]) >= start and pd.Timestamp(summary["first_date"]) <= end:
+            transactions.extend(load_partition(key))
+    transactions.extend(load_json_data(TRANSACTION_FILE))
+
+    dates = pd.to_datetime(pd.Series([t.get("date") for t in transactions], dtype=object), errors="coerce")
+    in_range = ((dates >= start) & (dates <= end)).to_numpy()
+    return [t for t, keep in zip(transactions, in_range) if keep]
+
+
+def _journal_bases():
+    """
+    Archive lengths journaled by a compaction that did not finish, or {}
+
+    A run journals how many rows each archive it extends held before, and
+    the history sequence number at that point. If its trim of the hot file
+    was recorded since, only removing the journal was left to do.
+    Otherwise the hot file still holds the rows, so the next run rewrites
+    those archives from the journaled lengths instead of appending twice.
+    """
+    if not os.path.exists(ARCHIVE_JOURNAL):
+        return {}
+    with open(ARCHIVE_JOURNAL) as file:
+        journal = json.load(file)
+    if any(event["label"] == ARCHIVE_LABEL for event in events_since("transactions", journal["seq"])):
+        os.remove(ARCHIVE_JOURNAL)
+        return {}
+    return journal["bases"]
+
+
+def compact_ledger(granularity="year", today=None):
+    """
+    Move closed periods out of the hot transactions file into archives
+
+    A period is closed once today falls in a later period. Rows that arrive
+    for an already archived period are merged into its archive on the next
+    run. Archives and summaries are written before the hot file is trimmed,
+    and a journal of the archive lengths makes a run that was interrupted
+    safe to repeat: its archives are rewritten, never appended to twice.
+
+    Args:
+        granularity (str): "year" or "month"
+        today (datetime): Reference date, defaults to now
+
+    Returns:
+        list: Partition keys that were written
+    """
+    today = today or datetime.now()
+    current_key = today.strftime("%Y-%m-%d")[:PARTITION_LENGTHS[granularity]]
+
+    # Hold the store lock from reading the ledger to trimming it, so no row saved meanwhile is dropped
+    with store_lock("transactions"):
+        bases = _journal_bases()
+        transactions = load_json_data(TRANSACTION_FILE)
+        dates = pd.to_datetime(pd.Series([t.get("date") for t in transactions], dtype=object), errors="coerce")
+        keys = dates.dt.strftime("%Y-%m-%d").str[:PARTITION_LENGTHS[granularity]]
+
+        hot, closed = [], {}
+        for transaction, key in zip(transactions, keys):
+            if pd.isna(key) or key >= current_key:
+                hot.append(transaction)
+            else:
+                closed.setdefault(key, []).append(transaction)
+
+        if not closed and not bases:
+            return []
+
+        os.makedirs(ARCHIVE_FOLDER, exist_ok=True)
+        bases = {key: bases.get(key, len(load_partition(key))) for key in sorted(set(bases) | set(closed))}
+        save_json_data(ARCHIVE_JOURNAL, {"seq": (history_version("transactions") or (0,))[0], "bases": bases})
+        summaries = load_archive_summaries()
+        for key, base in bases.items():
+            rows = load_partition(key)[:base] + closed.get(key, [])
+            if rows:
+                _write_archive(key, rows)
+                summaries[key] = summarize_partition(rows)
+            else:
+                # Only an interrupted run had archived rows here, and they are back in the hot file
+                if os.path.exists(archive_path(key)):
+                    os.remove(archive_path(key))
+                summaries.pop(key, None)
+        save_json_data(ARCHIVE_INDEX, summaries)
+        if closed:
+            # The rows now live in the archive, so this cannot be undone from the ledger history
+            commit("transactions", hot, base=transactions, label=ARCHIVE_LABEL, undoable=False)
+        os.remove(ARCHIVE_JOURNAL)
+    return sorted(closed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed periods of the WET transactions file")
+    parser.add_argument("--granularity", choices=list(PARTITION_LENGTHS), default="year")
+    args = parser.parse_args()
+    archived = compact_ledger(args.granularity)
+    print(f"Archived partitions: {', '.join(archived)}" if archived else "Nothing to archive")
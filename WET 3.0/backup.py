@@ -0,0 +1,301 @@
+import argparse
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime
+
+from config import BACKUP_FOLDER, WET_FOLDER
+
+# Files in the data folder that are backed up
+DATA_EXTENSIONS = (".json", ".jsonl", ".csv", ".gz")
+# Text files are cut after a line whose checksum matches CHUNK_MASK, so an
+# edit or insert only changes the chunks around it; sizes stay between
+# MIN_CHUNK and MAX_CHUNK bytes. Binary files use fixed MAX_CHUNK pieces.
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 256 * 1024
+CHUNK_MASK = 0x1FF
+
+
+def chunk_data(data, text=True):
+    """
+    Split file contents into content-defined chunks
+
+    Args:
+        data (bytes): File contents
+        text (bool): Cut on line boundaries chosen by content
+
+    Returns:
+        list: The chunks, which join back to data
+    """
+    if not text:
+        return [data[i:i + MAX_CHUNK] for i in range(0, len(data), MAX_CHUNK)] or [b""]
+    chunks, start, position = [], 0, 0
+    for line in data.splitlines(keepends=True):
+        position += len(line)
+        size = position - start
+        if size >= MAX_CHUNK or (size >= MIN_CHUNK and zlib.crc32(line) & CHUNK_MASK == 0):
+            chunks.append(data[start:position])
+            start = position
+    if start < len(data) or not chunks:
+        chunks.append(data[start:])
+    return chunks
+
+
+def _chunk_path(root, digest):
+    return os.path.join(root, "chunks", digest[:2], digest)
+
+
+def _store_chunk(root, chunk):
+    """
+    Write a chunk unless the store already has it
+
+    Returns:
+        tuple: (sha256 of the chunk, True if it was written)
+    """
+    digest = hashlib.sha256(chunk).hexdigest()
+    path = _chunk_path(root, digest)
+    if os.path.exists(path):
+        return digest, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "wb") as file:
+        file.write(zlib.compress(chunk, 1))
+    os.replace(f"{path}.tmp", path)
+    return digest, True
+
+
+def read_chunk(root, digest):
+    """
+    A stored chunk, checked against its checksum
+
+    Raises:
+        ValueError: If the chunk is missing, unreadable or does not match
+    """
+    try:
+        with open(_chunk_path(root, digest), "rb") as file:
+            chunk = zlib.decompress(file.read())
+    except (OSError, zlib.error) as e:
+        raise ValueError(f"chunk {digest[:12]} unreadable: {e}")
+    if hashlib.sha256(chunk).hexdigest() != digest:
+        raise ValueError(f"chunk {digest[:12]} is corrupt")
+    return chunk
+
+
+def data_files(folder=WET_FOLDER):
+    """
+    Relative paths of the data files to back up, e.g. "saved_transactions.json"
+    """
+    found = []
+    for directory, subdirectories, files in os.walk(folder):
+        subdirectories[:] = sorted(d for d in subdirectories if d != "__pycache__")
+        for name in sorted(files):
+            if name.endswith(DATA_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(directory, name), folder))
+    return found
+
+
+def list_backups(root=BACKUP_FOLDER):
+    """
+    Backup names, oldest first
+    """
+    folder = os.path.join(root, "backups")
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name[:-5] for name in os.listdir(folder) if name.endswith(".json"))
+
+
+def load_backup(name, root=BACKUP_FOLDER):
+    with open(os.path.join(root, "backups", f"{name}.json")) as file:
+        return json.load(file)
+
+
+def create_backup(folder=WET_FOLDER, root=BACKUP_FOLDER):
+    """
+    Back up the data folder, storing only chunks the backup store lacks
+
+    Files whose size and modification time match the previous backup reuse
+    its chunk list without being read, as long as those chunks are still
+    stored, so a backup costs time in proportion to the files that changed.
+
+    Returns:
+        dict: Backup "name", "files" changed, "chunks" written and "bytes" written
+    """
+    backups = list_backups(root)
+    previous = load_backup(backups[-1], root)["files"] if backups else {}
+    manifest, changed, written, written_bytes = {}, 0, 0, 0
+
+    for relative in data_files(folder):
+        path = os.path.join(folder, relative)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        version = [stat.st_mtime_ns, stat.st_size]
+        # An entry is only reused while its chunks are stored, e.g. not after verify --repair dropped one
+        if relative in previous and previous[relative]["version"] == version \
+                and all(os.path.exists(_chunk_path(root, digest)) for digest in previous[relative]["chunks"]):
+            manifest[relative] = previous[relative]
+            continue
+
+        with open(path, "rb") as file:
+            data = file.read()
+        digests = []
+        for chunk in chunk_data(data, text=not relative.endswith(".gz")):
+            digest, stored = _store_chunk(root, chunk)
+            digests.append(digest)
+            written += stored
+            written_bytes += len(chunk) if stored else 0
+        manifest[relative] = {"version": version, "size": len(data),
+                              "sha256": hashlib.sha256(data).hexdigest(), "chunks": digests}
+        changed += 1
+
+    name = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    os.makedirs(os.path.join(root, "backups"), exist_ok=True)
+    path = os.path.join(root, "backups", f"{name}.json")
+    with open(f"{path}.tmp", "w") as file:
+        json.dump({"created": datetime.now().isoformat(timespec="seconds"), "files": manifest}, file)
+    os.replace(f"{path}.tmp", path)
+    return {"name": name, "files": changed, "chunks": written, "bytes": written_bytes}
+
+
+def _restore_bytes(entry, root):
+    data = b"".join(read_chunk(root, digest) for digest in entry["chunks"])
+    if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+        raise ValueError("reassembled file does not match its checksum")
+    return data
+
+
+def _readable(relative, data):
+    if not relative.endswith(".json"):
+        return True
+    try:
+        # save_json_data never leaves an empty file, so an empty one is a failed write
+        json.loads(data)
+        return True
+    except ValueError:
+        return False
+
+
+def verify(folder=WET_FOLDER, root=BACKUP_FOLDER, all_backups=False):
+    """
+    Check the backup store and the live data files for corruption
+
+    Only the chunks of the latest backup are read (or of every backup with
+    all_backups), each once, however many backups share it. Live JSON files
+    are parsed, to catch a truncated write.
+
+    Returns:
+        dict: "chunks" checked, "bad chunks" {digest: error}, "damaged backups"
+              {name: [files]} and "unreadable" live files
+    """
+    backups = list_backups(root)
+    names = backups if all_backups else backups[-1:]
+    checked, bad, damaged = set(), {}, {}
+    for name in names:
+        for relative, entry in load_backup(name, root)["files"].items():
+            for digest in entry["chunks"]:
+                if digest not in checked:
+                    checked.add(digest)
+                    try:
+                        read_chunk(root, digest)
+                    except ValueError as e:
+                        bad[digest] = str(e)
+                if digest in bad:
+                    damaged.setdefault(name, []).append(relative)
+                    break
+
+    unreadable = []
+    for relative in data_files(folder):
+        if relative.endswith(".json"):
+            with open(os.path.join(folder, relative), "rb") as file:
+                if not _readable(relative, file.read()):
+                    unreadable.append(relative)
+    return {"chunks": len(checked), "bad chunks": bad, "damaged backups": damaged, "unreadable": unreadable}
+
+
+def last_good_version(relative, root=BACKUP_FOLDER):
+    """
+    The newest backed-up copy of a file that is intact and, for JSON, parses
+
+    Returns:
+        tuple: (backup name, file bytes), or (None, None) if there is none
+    """
+    for name in reversed(list_backups(root)):
+        entry = load_backup(name, root)["files"].get(relative)
+        if entry is None:
+            continue
+        try:
+            data = _restore_bytes(entry, root)
+        except ValueError:
+            continue
+        if _readable(relative, data):
+            return name, data
+    return None, None
+
+
+def restore(relatives=None, folder=WET_FOLDER, root=BACKUP_FOLDER):
+    """
+    Put back the last good version of data files
+
+    Args:
+        relatives (list): Files to restore, relative to the data folder;
+                          every file in the latest backup if None
+
+    Returns:
+        dict: Restored file to the backup it came from, None where no good copy exists
+    """
+    backups = list_backups(root)
+    if relatives is None:
+        relatives = list(load_backup(backups[-1], root)["files"]) if backups else []
+    restored = {}
+    for relative in relatives:
+        name, data = last_good_version(relative, root)
+        if name is not None:
+            path = os.path.join(folder, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.tmp", "wb") as file:
+                file.write(data)
+            os.replace(f"{path}.tmp", path)
+        restored[relative] = name
+    return restored
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental, checksummed backups of the WET data folder")
+    parser.add_argument("command", choices=["backup", "verify", "restore", "list"])
+    parser.add_argument("--dest", default=BACKUP_FOLDER, help="backup store folder")
+    parser.add_argument("--all", action="store_true", help="verify: check every backup, not just the latest")
+    parser.add_argument("--repair", action="store_true", help="verify: restore unreadable live files")
+    parser.add_argument("--file", action="append", help="restore: file relative to the data folder (repeatable)")
+    args = parser.parse_args()
+
+    if args.command == "backup":
+        result = create_backup(root=args.dest)
+        print(f"Backup {result['name']}: {result['files']} changed file(s), "
+              f"{result['chunks']} new chunk(s), {result['bytes']:,} bytes")
+    elif args.command == "list":
+        for name in list_backups(args.dest):
+            files = load_backup(name, args.dest)["files"]
+            print(f"{name}  {len(files)} files  {sum(entry['size'] for entry in files.values()):,} bytes")
+    elif args.command == "verify":
+        report = verify(root=args.dest, all_backups=args.all)
+        print(f"Checked {report['chunks']} chunk(s)")
+        for digest, error in report["bad chunks"].items():
+            print(f"  {error}")
+        for name, files in report["damaged backups"].items():
+            print(f"  backup {name} cannot restore: {', '.join(files)}")
+        for relative in report["unreadable"]:
+            print(f"  live file unreadable: {relative}")
+        if args.repair:
+            # The next backup reads every file that used a dropped chunk again and stores it
+            for digest in report["bad chunks"]:
+                # A missing chunk is reported as bad too; there is nothing to drop
+                if os.path.exists(_chunk_path(args.dest, digest)):
+                    os.remove(_chunk_path(args.dest, digest))
+            for relative, name in restore(report["unreadable"], root=args.dest).items():
+                print(f"  {relative}: " + (f"restored from {name}" if name else "no good copy"))
+        if not report["bad chunks"] and not report["unreadable"]:
+            print("All good")
+    else:
+        for relative, name in restore(args.file, root=args.dest).items():
+            print(f"{relative}: " + (f"restored from {name}" if name else "no good copy"))
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from records import EPOCH, TRANSACTION_TYPE_CODES, TransactionColumns
+
+# Columns shown in the transaction browser, in display order
+BROWSER_COLUMNS = [
+    "date", "transaction type", "amount(kes)", "currency", "transaction fees", "category",
+    "subcategory", "payment method", "item description (money in)", "item description (money out)"
+]
+
+SORT_OPTIONS = {
+    "Newest first": ("dates", False),
+    "Oldest first": ("dates", True),
+    "Largest amount": ("amounts", False),
+    "Smallest amount": ("amounts", True),
+}
+
+
+def _day_number(date):
+    return (pd.Timestamp(date).date() - EPOCH).days
+
+
+def _codes_for(names, selected):
+    lookup = {name: code for code, name in enumerate(names)}
+    return [lookup[name] for name in selected if name in lookup]
+
+
+def build_ledger_index(transactions):
+    """
+    Build a date-sorted columnar index over the ledger
+
+    Only the fields used for filtering and sorting are kept, as compact
+    numeric columns with categories and payment methods interned to codes.
+    Rows are referenced by their position in the transactions list so a
+    page can fetch just the rows it displays.
+
+    Args:
+        transactions: Schema-validated transaction dicts, or a TransactionColumns store
+
+    Returns:
+        dict: Parallel numpy arrays sorted by date plus the code name tables
+    """
+    # The current ledger snapshot already holds its rows in a column store
+    columns = transactions if isinstance(transactions, TransactionColumns) \
+        else TransactionColumns.from_transactions(transactions)
+    dates = columns.column("dates")
+
+    order = np.argsort(dates, kind="stable")
+    return {
+        "rows": order,
+        "dates": dates[order],
+        "amounts": columns.column("amounts")[order] / 100,
+        "types": columns.column("types")[order],
+        "categories": columns.column("categories")[order],
+        "payment_methods": columns.column("payment_methods")[order],
+        "category_names": columns.category_names.values,
+        "payment_method_names": columns.payment_method_names.values,
+    }
+
+
+def get_ledger_index(transactions, version):
+    """
+    Return the session's ledger index, rebuilding it only when the version changes
+
+    Args:
+        transactions (list): Transaction dicts as stored in the JSON file
+        version: Any value that changes whenever the ledger file changes
+
+    Returns:
+        dict: Ledger index from build_ledger_index
+    """
+    cached = st.session_state.get("ledger_index")
+    if cached is None or cached["version"] != version:
+        cached = {"version": version, "index": build_ledger_index(transactions)}
+        st.session_state.ledger_index = cached
+    return cached["index"]
+
+
+def query_ledger_index(index, start=None, end=None, transaction_type=None, categories=None,
+                       payment_methods=None, min_amount=None, max_amount=None, sort="Newest first"):
+    """
+    Filter and sort the ledger index
+
+    The date range is resolved with a binary search over the sorted dates,
+    so the remaining filters only look at rows inside the range.
+
+    Args:
+        index (dict): Ledger index from build_ledger_index
+        start, end: Inclusive date bounds, or None for open-ended
+        transaction_type (str): "debit", "credit" or None for both
+        categories (list): Categories to keep, or None/empty for all
+        payment_methods (list): Payment methods to keep, or None/empty for all
+        min_amount, max_amount (float): Inclusive amount bounds, or None
+        sort (str): One of SORT_OPTIONS
+
+    Returns:
+        ndarray: Positions in the transactions list, in display order
+    """
+    lo, hi = 0, len(index["dates"])
+    if start is not None:
+        lo = np.searchsorted(index["dates"], _day_number(start), side="left")
+    if end is not None:
+        hi = np.searchsorted(index["dates"], _day_number(end), side="right")
+    window = slice(lo, max(lo, hi))
+
+    mask = np.ones(window.stop - window.start, dtype=bool)
+    if transaction_type:
+        mask &= index["types"][window] == TRANSACTION_TYPE_CODES[transaction_type]
+    if categories:
+        mask &= np.isin(index["categories"][window], _codes_for(index["category_names"], categories))
+    if payment_methods:
+        mask &= np.isin(index["payment_methods"][window], _codes_for(index["payment_method_names"], payment_methods))
+    if min_amount is not None:
+        mask &= index["amounts"][window] >= min_amount
+    if max_amount is not None:
+        mask &= index["amounts"][window] <= max_amount
+
+    positions = np.flatnonzero(mask) + window.start
+    key, ascending = SORT_OPTIONS[sort]
+    if key != "dates":
+        positions = positions[np.argsort(index[key][positions], kind="stable")]
+    if not ascending:
+        positions = positions[::-1]
+    return index["rows"][positions]
+
+
+def fetch_page(transactions, rows, page, page_size):
+    """
+    Materialise a single page of transactions
+
+    Args:
+        transactions (list): Transaction dicts as stored in the JSON file
+        rows (ndarray): Matching positions from query_ledger_index
+        page (int): 1-based page number
+        page_size (int): Rows per page
+
+    Returns:
+        DataFrame: The visible rows, indexed by their position in the ledger
+    """
+    visible = rows[(page - 1) * page_size:page * page_size]
+    df = pd.DataFrame([transactions[i] for i in visible], index=visible)
+    for col in BROWSER_COLUMNS:
+        if col not in df.columns:
+            df[col] = ""
+    return df[BROWSER_COLUMNS]
@@ -10,6 +10,23 @@ TRANSACTION_FILE = os.path.join(WET_FOLDER, "saved_transactions.json")
 TRANSACTION_JSON = os.path.join(WET_FOLDER, "transactions.json")
 TRANSACTION_CSV = os.path.join(WET_FOLDER, "transactions_export.csv")
 BUDGET_FILE = os.path.join(WET_FOLDER, "budgets.json")
+RECURRING_FILE = os.path.join(WET_FOLDER, "recurring.json")
+FX_RATE_FILE = os.path.join(WET_FOLDER, "fx_rates.json")
+ANOMALY_FILE = os.path.join(WET_FOLDER, "anomaly_state.json")
+GOALS_FILE = os.path.join(WET_FOLDER, "savings_goals.json")
+# Event log and snapshots behind undo/redo and point-in-time views
+HISTORY_FOLDER = os.path.join(WET_FOLDER, "history")
+# Other ledgers (a partner's, a business) shown together on the Household page
+HOUSEHOLD_FILE = os.path.join(WET_FOLDER, "household.json")
+# Content-addressed backup store, kept outside the data folder it protects
+BACKUP_FOLDER = "WET backups"
+# Static HTML reports rendered by reports.py
+REPORT_FOLDER = "WET reports"
+
+# Closed periods are compacted into gzip archives with a summary index
+ARCHIVE_FOLDER = os.path.join(WET_FOLDER, "archive")
+ARCHIVE_INDEX = os.path.join(ARCHIVE_FOLDER, "summaries.json")
+ARCHIVE_JOURNAL = os.path.join(ARCHIVE_FOLDER, "journal.json")
 
 # Standard column mappings
 STANDARD_COLUMNS = {
@@ -28,7 +45,7 @@ STANDARD_COLUMNS = {
 
 # Export column order
 EXPORT_COLUMNS = [
-    "date", "week", "amount(kes)", "transaction fees", "transaction type",
+    "date", "week", "amount(kes)", "currency", "transaction fees", "transaction type",
     "category", "subcategory", "payment method",
     "item description (money in)", "item description (money out)"
 ]
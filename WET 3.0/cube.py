@@ -0,0 +1,122 @@
+import pandas as pd
+
+from fx import convert_frame, rates_version
+
+# Cube dimensions, in index order
+CUBE_DIMENSIONS = ["period", "payment method", "category", "transaction type"]
+CUBE_MEASURES = ["count", "amount", "fees"]
+# Transaction columns the cube is built from
+CUBE_INPUTS = ["date", "payment method", "category", "transaction type", "amount(kes)", "transaction fees"]
+
+# Latest cube per reporting currency, shared by every session
+_latest = {}
+
+
+def build_cube(df):
+    """
+    Aggregate transactions into a (period, payment method, category, type) cube
+
+    One groupby pass produces the count, amount and fee total of every cell.
+
+    Args:
+        df (DataFrame): Schema-validated transactions in the reporting currency
+
+    Returns:
+        DataFrame: Measures indexed by the cube dimensions, period as "YYYY-MM"
+    """
+    if df.empty:
+        return pd.DataFrame(columns=CUBE_MEASURES,
+                            index=pd.MultiIndex.from_arrays([[]] * len(CUBE_DIMENSIONS), names=CUBE_DIMENSIONS))
+
+    keys = pd.DataFrame({
+        "period": pd.to_datetime(df["date"], errors="coerce").dt.strftime("%Y-%m").fillna("unknown"),
+        "payment method": df["payment method"].fillna("").astype(str).replace("", "Unspecified"),
+        "category": df["category"].fillna("").astype(str),
+        "transaction type": df["transaction type"].astype(str),
+        "amount": pd.to_numeric(df["amount(kes)"], errors="coerce").fillna(0.0),
+        "fees": pd.to_numeric(df["transaction fees"], errors="coerce").fillna(0.0),
+    })
+    cube = keys.groupby(CUBE_DIMENSIONS, observed=True).agg(
+        count=("amount", "size"),
+        amount=("amount", "sum"),
+        fees=("fees", "sum"),
+    )
+    return cube
+
+
+def merge_cubes(cube, other):
+    """
+    Add the cells of two cubes, e.g. the stored cube and one built from new rows
+    """
+    if cube.empty:
+        return other
+    if other.empty:
+        return cube
+    merged = cube.add(other, fill_value=0)
+    merged["count"] = merged["count"].astype("int64")
+    return merged
+
+
+def _fingerprint(df):
+    # Sum of row hashes, so the fingerprint of appended rows adds on to the
+    # prefix's; any edit to a cube input changes it, row order does not
+    if df.empty:
+        return 0
+    return int(pd.util.hash_pandas_object(df[CUBE_INPUTS], index=False).to_numpy().sum())
+
+
+def get_cube(ledger, currency):
+    """
+    The cube of a ledger snapshot, built once per snapshot for every session
+
+    The latest cube per reporting currency is kept for the process, so a
+    snapshot that only appends rows folds those into it instead of
+    rebuilding. An edit anywhere, or new FX rates, rebuild it.
+
+    Args:
+        ledger (LedgerSnapshot): Current ledger snapshot
+        currency (str): Reporting currency
+
+    Returns:
+        DataFrame: Cube from build_cube; callers must not mutate it
+    """
+    rates = rates_version()
+
+    def build(records):
+        df = convert_frame(ledger.frame(), currency) if records else pd.DataFrame(columns=CUBE_INPUTS)
+        latest = _latest.get(currency)
+        if latest is not None and latest["rates"] == rates and latest["rows"] <= len(df) \
+                and _fingerprint(df.iloc[:latest["rows"]]) == latest["fingerprint"]:
+            appended = df.iloc[latest["rows"]:]
+            cube = merge_cubes(latest["cube"], build_cube(appended)) if len(appended) else latest["cube"]
+            fingerprint = (latest["fingerprint"] + _fingerprint(appended)) % 2 ** 64
+        else:
+            cube, fingerprint = build_cube(df), _fingerprint(df)
+        _latest[currency] = {"rates": rates, "rows": len(df), "fingerprint": fingerprint, "cube": cube}
+        return cube
+
+    return ledger.derived(("cube", currency, rates), build)
+
+
+def slice_cube(cube, by, **filters):
+    """
+    Roll the cube up along one dimension after fixing others
+
+    This only touches the pre-aggregated cells, never the transactions.
+
+    Args:
+        cube (DataFrame): Cube from build_cube
+        by (str): Dimension to group the result by
+        filters: Dimension name (spaces as underscores) to a list of allowed values
+
+    Returns:
+        DataFrame: count, amount, fees and fee ratio per value of "by"
+    """
+    for name, allowed in filters.items():
+        if allowed:
+            level = name.replace("_", " ")
+            cube = cube[cube.index.get_level_values(level).isin(allowed)]
+
+    result = cube.groupby(level=by).sum()
+    result["fee ratio"] = result["fees"] / result["amount"].where(result["amount"] != 0)
+    return result
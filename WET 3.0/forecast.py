@@ -0,0 +1,213 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import BUDGET_FILE, RECURRING_FILE
+from fx import BASE_CURRENCY, convert_frame, rates_version
+from periods import load_period_index
+from recurring import RECURRING_REFERENCE, load_recurring, occurrence_dates, project_recurring
+
+# Weight of the latest week in the exponentially smoothed level of each category
+FORECAST_ALPHA = 0.3
+# Completed weeks of history fed to the model
+HISTORY_WEEKS = 26
+FORECAST_HORIZONS = list(range(4, 13))
+# Template fields an occurrence saved without a reference is recognised by, besides its date
+OCCURRENCE_KEYS = ["amount(kes)", "currency", "transaction type", "category"]
+
+
+def _file_version(file_path):
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def weekly_flows(df):
+    """
+    Income and expense per week and category, the buckets the model runs on
+
+    Materialised recurring transactions are left out; the forecast adds
+    their future occurrences from the schedules instead.
+
+    Args:
+        df (DataFrame): Transactions in shillings
+
+    Returns:
+        DataFrame: Weeks (Mondays) by a ("flow", "category") column index,
+                   flow being "income" or "expense" (amount plus fees)
+    """
+    if "reference" in df.columns:
+        df = df[~df["reference"].fillna("").astype(str).str.startswith(RECURRING_REFERENCE)]
+    return _bucket(df)
+
+
+def _bucket(df):
+    columns = pd.MultiIndex.from_arrays([[], []], names=["flow", "category"])
+    if df.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([]), columns=columns, dtype=float)
+    days = pd.to_datetime(df["date"], errors="coerce")
+    expense = (df["transaction type"] == "credit").to_numpy()
+    amounts = pd.to_numeric(df["amount(kes)"], errors="coerce").fillna(0.0).to_numpy()
+    fees = pd.to_numeric(df["transaction fees"], errors="coerce").fillna(0.0).to_numpy()
+    frame = pd.DataFrame({
+        "week": days - pd.to_timedelta(days.dt.weekday, unit="D"),
+        "flow": np.where(expense, "expense", "income"),
+        "category": df["category"].fillna("").astype(str).to_numpy(),
+        "amount": amounts + np.where(expense, fees, 0.0),
+    }).dropna(subset=["week"])
+    if frame.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([]), columns=columns, dtype=float)
+    weekly = frame.pivot_table(index="week", columns=["flow", "category"], values="amount",
+                               aggfunc="sum", fill_value=0.0)
+    return weekly.reindex(pd.date_range(weekly.index.min(), weekly.index.max(), freq="7D"), fill_value=0.0)
+
+
+def materialised_occurrences(df, definitions):
+    """
+    Rows that are materialised occurrences of recurring definitions
+
+    Occurrences carry their definition's reference. Older ones were saved
+    without it and are recognised by the template's amount, currency,
+    type and category on one of the dates materialised so far.
+
+    Args:
+        df (DataFrame): Transactions as stored, before currency conversion
+        definitions (list): Recurring definitions
+
+    Returns:
+        ndarray: Boolean mask over the rows
+    """
+    reference = df["reference"].fillna("").astype(str) if "reference" in df.columns \
+        else pd.Series("", index=df.index)
+    mask = reference.str.startswith(RECURRING_REFERENCE).to_numpy(copy=True)
+    occurrences = []
+    for definition in definitions:
+        if definition.get("materialised_until"):
+            dates = occurrence_dates(definition, definition["start_date"], definition["materialised_until"])
+            template = definition["template"]
+            occurrences.append(pd.DataFrame({"date": dates.strftime("%Y-%m-%d"),
+                                             **{key: template.get(key) for key in OCCURRENCE_KEYS}}))
+    unreferenced = (reference == "").to_numpy()
+    if occurrences and unreferenced.any() and set(OCCURRENCE_KEYS) <= set(df.columns):
+        keys = ["date"] + OCCURRENCE_KEYS
+        rows = df.loc[unreferenced, keys].assign(row=np.flatnonzero(unreferenced))
+        matched = rows.merge(pd.concat(occurrences, ignore_index=True).drop_duplicates(), on=keys)["row"]
+        mask[matched.to_numpy()] = True
+    return mask
+
+
+def get_weekly_flows(ledger):
+    """
+    weekly_flows of a ledger snapshot, built once per snapshot, FX version
+    and version of the recurring definitions
+    """
+    def build(records):
+        frame = ledger.frame()
+        frame = frame[~materialised_occurrences(frame, load_recurring())]
+        return weekly_flows(convert_frame(frame, BASE_CURRENCY))
+
+    return ledger.derived(("weekly_flows", rates_version(), _file_version(RECURRING_FILE)), build)
+
+
+def smoothed_levels(weekly, this_week):
+    """
+    Exponentially smoothed weekly level of every column, over recent completed weeks
+
+    Weeks without activity count as zero, so a category that stopped
+    fades out of the forecast.
+
+    Returns:
+        Series: Level per ("flow", "category") column
+    """
+    history = pd.date_range(end=this_week - pd.Timedelta(weeks=1), periods=HISTORY_WEEKS, freq="7D")
+    recent = weekly.reindex(history, fill_value=0.0)
+    if recent.columns.empty:
+        return pd.Series(dtype=float, index=recent.columns)
+    return recent.ewm(alpha=FORECAST_ALPHA, adjust=False).mean().iloc[-1]
+
+
+def budget_plan(period_index, weeks):
+    """
+    Budgeted amount per future week and expense category, NaN where there is none
+    """
+    categories = period_index.columns.difference(["key", "week start", "overall budget", "budgeted"], sort=False)
+    plan = period_index.set_index("week start")[categories]
+    plan = plan[~plan.index.duplicated(keep="last")].reindex(weeks)
+    plan.columns = pd.MultiIndex.from_product([["expense"], plan.columns], names=["flow", "category"])
+    return plan.where(plan > 0)
+
+
+def recurring_plan(weeks, definitions):
+    """
+    Scheduled recurring occurrences in the forecast weeks, bucketed like weekly_flows
+    """
+    upcoming = project_recurring(weeks[0], weeks[-1] + pd.Timedelta(days=6), definitions)
+    return _bucket(convert_frame(upcoming, BASE_CURRENCY)).reindex(weeks, fill_value=0.0)
+
+
+def forecast_by_category(weekly, period_index, definitions, weeks_ahead, today=None):
+    """
+    Projected income and expense per week and category
+
+    Each category continues at its smoothed weekly level, plus any recurring
+    occurrences scheduled in the week. Where the week has a budget for an
+    expense category, the budget is used instead, as it is the plan.
+
+    Args:
+        weekly (DataFrame): From weekly_flows
+        period_index (DataFrame): Budget period index from periods
+        definitions (list): Recurring definitions
+        weeks_ahead (int): Forecast horizon in weeks, starting next week
+        today (date): Reference date, defaults to today
+
+    Returns:
+        DataFrame: Forecast weeks by ("flow", "category") columns, in shillings
+    """
+    today = pd.Timestamp(today or datetime.today()).normalize()
+    this_week = today - pd.Timedelta(days=today.weekday())
+    weeks = pd.date_range(this_week + pd.Timedelta(weeks=1), periods=weeks_ahead, freq="7D")
+
+    levels = smoothed_levels(weekly, this_week)
+    scheduled = recurring_plan(weeks, definitions)
+    budgets = budget_plan(period_index, weeks)
+
+    columns = levels.index.union(scheduled.columns).union(budgets.columns)
+    trend = pd.DataFrame(np.tile(levels.reindex(columns, fill_value=0.0).to_numpy(), (len(weeks), 1)),
+                         index=weeks, columns=columns)
+    forecast = trend + scheduled.reindex(columns=columns, fill_value=0.0)
+    planned = budgets.reindex(columns=columns)
+    return forecast.where(planned.isna(), planned).sort_index(axis=1)
+
+
+def forecast_totals(by_category, opening_balance=0.0):
+    """
+    Weekly income, expense, net and running balance from forecast_by_category
+
+    Returns:
+        DataFrame: "income", "expense", "net" and "balance" per forecast week
+    """
+    flows = by_category.T.groupby(level="flow").sum().T
+    totals = pd.DataFrame({"income": flows.get("income", 0.0), "expense": flows.get("expense", 0.0)},
+                          index=by_category.index).fillna(0.0)
+    totals["net"] = totals["income"] - totals["expense"]
+    totals["balance"] = opening_balance + totals["net"].cumsum()
+    return totals
+
+
+def get_forecast(ledger, weeks_ahead, today=None):
+    """
+    Forecast for a ledger snapshot, cached until the ledger, budgets,
+    recurring schedules, FX rates or the current week change
+
+    Returns:
+        DataFrame: From forecast_by_category, in shillings
+    """
+    today = pd.Timestamp(today or datetime.today()).normalize()
+    this_week = today - pd.Timedelta(days=today.weekday())
+    key = ("forecast", weeks_ahead, this_week, rates_version(),
+           _file_version(BUDGET_FILE), _file_version(RECURRING_FILE))
+    return ledger.derived(key, lambda records: forecast_by_category(
+        get_weekly_flows(ledger), load_period_index(), load_recurring(), weeks_ahead, today))
@@ -0,0 +1,177 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import FX_RATE_FILE
+from utils import load_json_data, save_json_data
+
+# Every rate is stored as Kenya shillings per one unit of the currency
+BASE_CURRENCY = "KES"
+DEFAULT_CURRENCIES = ["KES", "USD", "EUR"]
+
+
+def rates_version():
+    """
+    Fingerprint of the FX rate file; anything converted with its rates depends on it
+    """
+    if not os.path.exists(FX_RATE_FILE):
+        return None
+    stat = os.stat(FX_RATE_FILE)
+    return stat.st_mtime_ns, stat.st_size
+
+
+@st.cache_data(show_spinner=False)
+def _load_rate_table(version):
+    rates = pd.DataFrame(load_json_data(FX_RATE_FILE), columns=["date", "currency", "rate"])
+    rates["date"] = pd.to_datetime(rates["date"], errors="coerce")
+    rates["currency"] = rates["currency"].astype(str).str.upper()
+    rates["rate"] = pd.to_numeric(rates["rate"], errors="coerce")
+    return rates.dropna().sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def load_rate_table():
+    """
+    The FX rate table sorted by date, re-read only when the file changes
+
+    Returns:
+        DataFrame: "date", "currency" and "rate" (KES per unit) columns
+    """
+    return _load_rate_table(rates_version())
+
+
+def available_currencies():
+    """
+    Currencies that can be recorded or reported in
+    """
+    return sorted(set(DEFAULT_CURRENCIES) | set(load_rate_table()["currency"]))
+
+
+def add_rate(date, currency, rate):
+    """
+    Record how many shillings one unit of a currency was worth on a date
+
+    A rate already stored for the same date and currency is replaced.
+    """
+    currency = currency.upper()
+    date = pd.Timestamp(date).strftime("%Y-%m-%d")
+    rates = [r for r in load_json_data(FX_RATE_FILE) if not (r["date"] == date and r["currency"] == currency)]
+    rates.append({"date": date, "currency": currency, "rate": float(rate)})
+    save_json_data(FX_RATE_FILE, sorted(rates, key=lambda r: (r["date"], r["currency"])))
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def rate_series(currency, start, end, version):
+    """
+    Daily as-of rates for one currency over a date range
+
+    Each day takes the latest rate on or before it; days before the first
+    known rate use the earliest one. Cached per (currency, date range, FX
+    table version).
+
+    Args:
+        currency (str): ISO currency code
+        start, end (str): Inclusive ISO date range
+        version: FX table version from the file stat
+
+    Returns:
+        Series: KES per unit indexed by day, NaN if the currency has no rates
+    """
+    days = pd.DataFrame({"date": pd.date_range(start, end, freq="D")})
+    if currency == BASE_CURRENCY:
+        return pd.Series(1.0, index=days["date"])
+
+    table = _load_rate_table(version)
+    table = table[table["currency"] == currency][["date", "rate"]]
+    if table.empty:
+        return pd.Series(np.nan, index=days["date"])
+    merged = pd.merge_asof(days, table, on="date", direction="backward")
+    merged["rate"] = merged["rate"].fillna(table["rate"].iloc[0])
+    return merged.set_index("date")["rate"]
+
+
+def _rates_for(currencies, dates):
+    """
+    KES per unit for each row, looked up in the cached daily series
+    """
+    version = rates_version()
+    rates = np.full(len(dates), np.nan)
+    valid = ~np.isnat(dates)
+    if not valid.any():
+        return rates
+    start = pd.Timestamp(dates[valid].min()).strftime("%Y-%m-%d")
+    end = pd.Timestamp(dates[valid].max()).strftime("%Y-%m-%d")
+    day_offsets = (dates - np.datetime64(start, "D")).astype("timedelta64[D]").astype("int64")
+
+    for currency in np.unique(currencies[valid]):
+        series = rate_series(currency, start, end, version).to_numpy()
+        rows = valid & (currencies == currency)
+        rates[rows] = series[day_offsets[rows]]
+    return rates
+
+
+def convert_frame(df, reporting_currency=BASE_CURRENCY, columns=("amount(kes)", "transaction fees")):
+    """
+    Convert money columns of a transactions frame into one reporting currency
+
+    Rows are converted at the as-of rate of their own date. Rows without a
+    currency are treated as shillings. Rows whose currency has no rate keep
+    NaN amounts so they drop out of totals instead of being counted wrongly.
+
+    Args:
+        df (DataFrame): Transactions with "date", "currency" and money columns
+        reporting_currency (str): Currency to report in
+        columns (tuple): Money columns to convert
+
+    Returns:
+        DataFrame: A copy with converted money columns
+    """
+    currencies = df["currency"].fillna(BASE_CURRENCY).astype(str).str.upper().to_numpy() \
+        if "currency" in df.columns else np.full(len(df), BASE_CURRENCY)
+    if reporting_currency == BASE_CURRENCY and (currencies == BASE_CURRENCY).all():
+        return df
+
+    dates = pd.to_datetime(df["date"], errors="coerce").to_numpy(dtype="datetime64[D]")
+    factor = _rates_for(currencies, dates) / _rates_for(np.full(len(df), reporting_currency), dates)
+
+    df = df.copy()
+    for col in columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce") * factor
+    df["currency"] = reporting_currency
+    return df
+
+
+def rows_without_rate(df, reporting_currency=BASE_CURRENCY):
+    """
+    Count the rows convert_frame leaves as NaN for want of a rate
+
+    Args:
+        df (DataFrame): Transactions with "date" and "currency"
+        reporting_currency (str): Currency to report in
+
+    Returns:
+        dict: Currency code to number of rows that cannot be converted
+    """
+    currencies = df["currency"].fillna(BASE_CURRENCY).astype(str).str.upper().to_numpy() \
+        if "currency" in df.columns else np.full(len(df), BASE_CURRENCY)
+    if reporting_currency == BASE_CURRENCY and (currencies == BASE_CURRENCY).all():
+        return {}
+
+    dates = pd.to_datetime(df["date"], errors="coerce").to_numpy(dtype="datetime64[D]")
+    factor = _rates_for(currencies, dates) / _rates_for(np.full(len(df), reporting_currency), dates)
+    missing, counts = np.unique(currencies[np.isnan(factor)], return_counts=True)
+    return {str(currency): int(count) for currency, count in zip(missing, counts)}
+
+
+def convert_amount(amount, from_currency, to_currency, date=None):
+    """
+    Convert a single amount at the as-of rate for a date (default today)
+    """
+    if from_currency == to_currency:
+        return amount
+    dates = np.array([pd.Timestamp(date or pd.Timestamp.today()).normalize()], dtype="datetime64[D]")
+    from_rate = _rates_for(np.array([from_currency]), dates)[0]
+    to_rate = _rates_for(np.array([to_currency]), dates)[0]
+    return amount * from_rate / to_rate
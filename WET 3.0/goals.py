@@ -0,0 +1,193 @@
+import os
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import GOALS_FILE
+from fx import BASE_CURRENCY, convert_frame, rates_version
+from utils import load_json_data, save_json_data
+
+# Categories and subcategories that hold savings, compared case-insensitively.
+# Anything mentioning "saving" counts too.
+SAVINGS_CATEGORIES = {"savings & investment", "savings"}
+SAVINGS_SUBCATEGORIES = {"mshwari", "m-shwari", "sacco", "chama", "mmf", "savings"}
+# Weeks averaged for a goal's contribution rate
+RATE_WEEKS = 12
+
+GOAL_COLUMNS = ["name", "target", "saved", "progress", "weekly rate", "required rate",
+                "weeks to target", "projected date", "deadline", "shortfall", "on track"]
+
+
+def savings_mask(df):
+    """
+    Rows that move money into or out of savings
+    """
+    categories = df["category"].fillna("").astype(str).str.strip().str.lower()
+    subcategories = df["subcategory"].fillna("").astype(str).str.strip().str.lower()
+    return categories.isin(SAVINGS_CATEGORIES) | subcategories.isin(SAVINGS_SUBCATEGORIES) \
+        | categories.str.contains("saving") | subcategories.str.contains("saving")
+
+
+def savings_contributions(df):
+    """
+    Signed savings per row: money out into savings adds, money in from savings withdraws
+
+    Returns:
+        Series: Contribution per row, 0 for rows that are not savings
+    """
+    amounts = pd.to_numeric(df["amount(kes)"], errors="coerce").fillna(0.0)
+    sign = np.where(df["transaction type"] == "credit", 1.0, -1.0)
+    return (amounts * sign).where(savings_mask(df), 0.0)
+
+
+def weekly_savings(df):
+    """
+    Net savings per week for every (category, subcategory) pair
+
+    Args:
+        df (DataFrame): Transactions in shillings
+
+    Returns:
+        DataFrame: Weeks (Mondays) by a (category, subcategory) column
+                   index, every week from the first saving to the last
+    """
+    savings = df[savings_mask(df)]
+    if savings.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([]),
+                            columns=pd.MultiIndex.from_arrays([[], []], names=["category", "subcategory"]))
+    days = pd.to_datetime(savings["date"], errors="coerce")
+    frame = pd.DataFrame({
+        "week": days - pd.to_timedelta(days.dt.weekday, unit="D"),
+        "category": savings["category"].fillna("").astype(str),
+        "subcategory": savings["subcategory"].fillna("").astype(str),
+        "amount": savings_contributions(savings),
+    }).dropna(subset=["week"])
+    weekly = frame.pivot_table(index="week", columns=["category", "subcategory"], values="amount",
+                               aggfunc="sum", fill_value=0.0)
+    return weekly.reindex(pd.date_range(weekly.index.min(), weekly.index.max(), freq="7D"), fill_value=0.0)
+
+
+def get_weekly_savings(ledger, currency=BASE_CURRENCY):
+    """
+    weekly_savings of a ledger snapshot, built once per snapshot, currency and FX version
+
+    Savings are converted at the rate of their own dates.
+    """
+    return ledger.derived(("weekly_savings", currency, rates_version()),
+                          lambda records: weekly_savings(convert_frame(ledger.frame(), currency)))
+
+
+def load_goals():
+    return load_json_data(GOALS_FILE) if os.path.exists(GOALS_FILE) else []
+
+
+def save_goals(goals):
+    save_json_data(GOALS_FILE, goals)
+
+
+def create_goal(name, target, deadline, categories=(), subcategories=(), start_date=None, today=None):
+    """
+    Build a savings goal
+
+    Args:
+        name (str): Label shown in the app, e.g. "Emergency fund"
+        target (float): Amount to reach, in shillings
+        deadline (date): Date the target should be reached by
+        categories, subcategories: Savings the goal counts; all savings if both are empty
+        start_date (date): Count savings from this date, or None for all history
+        today (date): Reference date, defaults to today
+
+    Returns:
+        tuple: (goal dict or None, list of validation errors)
+    """
+    today = today or datetime.today().date()
+    errors = []
+    if not str(name).strip():
+        errors.append("missing name")
+    if not target or target <= 0:
+        errors.append("target must be more than zero")
+    if deadline is None or deadline <= today:
+        errors.append("deadline must be in the future")
+    if errors:
+        return None, errors
+    return {
+        "id": uuid.uuid4().hex[:8],
+        "name": str(name).strip(),
+        "target": float(target),
+        "deadline": deadline.strftime("%Y-%m-%d"),
+        "start_date": start_date.strftime("%Y-%m-%d") if start_date else None,
+        "categories": list(categories),
+        "subcategories": list(subcategories),
+    }, []
+
+
+def _goal_columns(weekly, goal):
+    categories = {c.lower() for c in goal["categories"]}
+    subcategories = {s.lower() for s in goal["subcategories"]}
+    if not categories and not subcategories:
+        return weekly.columns
+    linked = weekly.columns.get_level_values("category").str.lower().isin(categories) \
+        | weekly.columns.get_level_values("subcategory").str.lower().isin(subcategories)
+    return weekly.columns[linked]
+
+
+def project_goals(weekly, goals, today=None):
+    """
+    Progress and projection of every goal, evaluated together
+
+    Each goal's weekly series is a sum over its linked columns; from there
+    the cumulative total, the rolling mean rate over RATE_WEEKS weeks and
+    the projections are computed for all goals at once.
+
+    Args:
+        weekly (DataFrame): From weekly_savings
+        goals (list): Goal dicts
+        today (date): Reference date, defaults to today
+
+    Returns:
+        DataFrame: GOAL_COLUMNS indexed by goal id. Rates are per week;
+                   "shortfall" is what the current rate leaves unsaved by
+                   the deadline.
+    """
+    if not goals:
+        return pd.DataFrame(columns=GOAL_COLUMNS)
+    today = pd.Timestamp(today or datetime.today()).normalize()
+    this_week = today - pd.Timedelta(days=today.weekday())
+
+    # Run every series up to this week so a pause in saving lowers the rate
+    start = min(weekly.index.min(), this_week) if len(weekly.index) else this_week
+    weeks = pd.date_range(start, this_week, freq="7D")
+    weekly = weekly.reindex(weeks, fill_value=0.0)
+    series = pd.DataFrame({goal["id"]: weekly[_goal_columns(weekly, goal)].sum(axis=1) for goal in goals},
+                          index=weeks)
+
+    starts = pd.to_datetime([goal.get("start_date") or weeks[0] for goal in goals])
+    counted = series.index.to_numpy()[:, None] >= (starts - pd.to_timedelta(starts.weekday, unit="D")).to_numpy()
+    series = series.where(counted, 0.0)
+
+    goal_ids = [goal["id"] for goal in goals]
+    target = pd.Series([goal["target"] for goal in goals], index=goal_ids)
+    deadline = pd.Series(pd.to_datetime([goal["deadline"] for goal in goals]), index=goal_ids)
+
+    saved = series.sum()
+    rate = series.where(counted).rolling(RATE_WEEKS, min_periods=1).mean().iloc[-1].fillna(0.0)
+    remaining = (target - saved).clip(lower=0.0)
+    weeks_left = ((deadline - today).dt.days / 7).clip(lower=0.0)
+    weeks_to_target = (remaining / rate.where(rate > 0)).where(remaining > 0, 0.0)
+    shortfall = (remaining - rate.clip(lower=0.0) * weeks_left).clip(lower=0.0)
+
+    return pd.DataFrame({
+        "name": [goal["name"] for goal in goals],
+        "target": target,
+        "saved": saved,
+        "progress": (saved / target).clip(0.0, 1.0),
+        "weekly rate": rate,
+        "required rate": (remaining / weeks_left.where(weeks_left > 0)).fillna(remaining),
+        "weeks to target": weeks_to_target,
+        "projected date": today + pd.to_timedelta(np.ceil(weeks_to_target * 7), unit="D"),
+        "deadline": deadline,
+        "shortfall": shortfall,
+        "on track": shortfall <= 0,
+    }, index=goal_ids)[GOAL_COLUMNS]
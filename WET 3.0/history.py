@@ -0,0 +1,405 @@
+import gzip
+import json
+import os
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import date, datetime, time
+
+from config import BUDGET_FILE, HISTORY_FOLDER, TRANSACTION_FILE
+from schema import save_validated
+from utils import save_json_data
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in this process are still serialised
+    fcntl = None
+
+# Data files with a history; transactions are a list, budgets an object keyed by period
+STORES = {"transactions": TRANSACTION_FILE, "budgets": BUDGET_FILE}
+# A full snapshot is written after this many events, which bounds how many
+# events any point-in-time view or undo has to replay
+SNAPSHOT_EVERY = 50
+# Changes that can be undone, per store
+UNDO_LIMIT = 100
+
+_locks = {store: threading.RLock() for store in STORES}
+# How deep each thread is in store_lock, so nested holds do not flock twice
+_held = threading.local()
+
+
+class HistoryConflict(ValueError):
+    """
+    A recorded change no longer matches the data, e.g. after an edit outside the app
+    """
+
+
+def _file_version(file_path):
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _folder(store):
+    return os.path.join(HISTORY_FOLDER, store)
+
+
+@contextmanager
+def store_lock(store):
+    """
+    Hold the writer lock of a store, across sessions and processes
+
+    Every write to a store's file happens under it, so a read-modify-write
+    done inside it cannot lose another writer's change. A thread may take it
+    again while holding it.
+    """
+    os.makedirs(_folder(store), exist_ok=True)
+    with _locks[store]:
+        depth = getattr(_held, store, 0)
+        setattr(_held, store, depth + 1)
+        try:
+            if depth or not fcntl:
+                yield
+            else:
+                with open(os.path.join(_folder(store), "lock"), "w") as handle:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                    yield
+        finally:
+            setattr(_held, store, depth)
+
+
+def _load_index(store):
+    path = os.path.join(_folder(store), "index.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def _read_state(store):
+    """
+    A store as its file holds it now
+
+    The ledger is the shared snapshot's column store, parsed once per file
+    version for the whole process, rather than a list of dicts of its own.
+    """
+    path = STORES[store]
+    if store == "budgets":
+        if not os.path.exists(path):
+            return {}
+        with open(path) as file:
+            return json.load(file)
+    # Imported here, as the ledger module builds on this one
+    from ledger import ledger_snapshot
+    return ledger_snapshot().records
+
+
+def diff(before, after):
+    """
+    The change that turns one state of a store into the next
+
+    Lists (the ledger) are compared from both ends, so an append, an edit
+    or a removal is recorded as one small splice. Objects (budgets) record
+    the old and new value of every key that changed, None meaning absent.
+
+    Returns:
+        dict: {"start", "removed", "added"} for lists, {"changed"} for objects
+    """
+    if isinstance(after, dict):
+        keys = set(before) | set(after)
+        return {"changed": {key: [before.get(key), after.get(key)] for key in sorted(keys)
+                            if before.get(key) != after.get(key)}}
+    limit = min(len(before), len(after))
+    start = 0
+    while start < limit and (before[start] is after[start] or before[start] == after[start]):
+        start += 1
+    end = 0
+    while end < limit - start and (before[-1 - end] is after[-1 - end] or before[-1 - end] == after[-1 - end]):
+        end += 1
+    return {"start": start, "removed": list(before[start:len(before) - end]),
+            "added": list(after[start:len(after) - end])}
+
+
+def invert(change):
+    if "changed" in change:
+        return {"changed": {key: [new, old] for key, (old, new) in change["changed"].items()}}
+    return {"start": change["start"], "removed": change["added"], "added": change["removed"]}
+
+
+def apply_change(state, change):
+    """
+    Apply a change from diff to a state, returning the new state
+
+    Raises:
+        HistoryConflict: If the state does not hold what the change replaces
+    """
+    if "changed" in change:
+        state = dict(state)
+        for key, (old, new) in change["changed"].items():
+            if state.get(key) != old:
+                raise HistoryConflict(f"{key} was changed elsewhere")
+            if new is None:
+                state.pop(key, None)
+            else:
+                state[key] = new
+        return state
+    start, removed = change["start"], change["removed"]
+    if state[start:start + len(removed)] != removed:
+        raise HistoryConflict(f"rows from {start} were changed elsewhere")
+    return list(state[:start]) + change["added"] + list(state[start + len(removed):])
+
+
+def rebase(state, change, base_length):
+    """
+    Apply a change made to an older copy of a list store to its current state
+
+    Rows appended at the end of the copy go after the rows appended since;
+    any other change must still find the rows it replaces where they were.
+
+    Raises:
+        HistoryConflict: If rows the change replaces were changed since the copy
+    """
+    if "start" in change and not change["removed"] and change["start"] == base_length:
+        change = {"start": len(state), "removed": [], "added": change["added"]}
+    return apply_change(state, change), change
+
+
+def _is_empty(change):
+    return not change.get("changed") and not change.get("removed") and not change.get("added")
+
+
+def _segment_path(store, seq):
+    return os.path.join(_folder(store), f"events-{(seq - 1) // SNAPSHOT_EVERY:06d}.jsonl")
+
+
+def _read_events(store, first, last):
+    """
+    Events with first <= seq <= last, in order
+    """
+    if first > last:
+        return
+    for segment in range((first - 1) // SNAPSHOT_EVERY, (last - 1) // SNAPSHOT_EVERY + 1):
+        path = _segment_path(store, segment * SNAPSHOT_EVERY + 1)
+        if not os.path.exists(path):
+            continue
+        with open(path) as file:
+            for line in file:
+                event = json.loads(line)
+                if first <= event["seq"] <= last:
+                    yield event
+
+
+def _write_snapshot(store, index, state, at):
+    name = f"snapshot-{len(index['snapshots']):06d}.json.gz"
+    with gzip.open(os.path.join(_folder(store), name), "wt", compresslevel=1) as file:
+        json.dump(state if isinstance(state, dict) else list(state), file)
+    index["snapshots"].append({"file": name, "seq": index["seq"], "at": at})
+
+
+def _load_snapshot(store, name):
+    with gzip.open(os.path.join(_folder(store), name), "rt") as file:
+        return json.load(file)
+
+
+def _record(store, index, before, after, change, label, kind, target, undoable, write):
+    """
+    Write a new state and append its event; the caller holds the store lock
+    """
+    at = datetime.now().isoformat(timespec="seconds")
+    path = STORES[store]
+    if index is None or index["version"] != _file_version(path):
+        # First change, or the file was written outside the history: start over from what it holds now
+        index = index or {"seq": 0, "version": None, "snapshots": [], "undo": [], "redo": []}
+        _write_snapshot(store, index, before if before is not None else _read_state(store), at)
+        index["undo"], index["redo"] = [], []
+
+    if write:
+        write(after)
+    else:
+        save_validated(path, after)
+    if not _is_empty(change):
+        index["seq"] += 1
+        event = {"seq": index["seq"], "at": at, "label": label, "kind": kind, "target": target, "change": change}
+        with open(_segment_path(store, index["seq"]), "a") as file:
+            file.write(json.dumps(event) + "\n")
+
+        if kind == "undo":
+            index["redo"].append(index["undo"].pop())
+        elif kind == "redo":
+            index["redo"].pop()
+            index["undo"].append([index["seq"], label])
+        elif undoable:
+            index["undo"] = (index["undo"] + [[index["seq"], label]])[-UNDO_LIMIT:]
+            index["redo"] = []
+        else:
+            index["undo"], index["redo"] = [], []
+
+        if index["seq"] - index["snapshots"][-1]["seq"] >= SNAPSHOT_EVERY:
+            _write_snapshot(store, index, after, at)
+
+    index["version"] = _file_version(path)
+    save_json_data(os.path.join(_folder(store), "index.json"), index)
+    return index
+
+
+def commit(store, after=None, base=None, label="", undoable=True, write=None, change=None):
+    """
+    Save a change to a store and record it in its history
+
+    The change is the difference between base and after, or given as it is.
+    Under the store lock it is applied to the store as the file holds it
+    then, so writes made by other sessions since base was read are kept.
+
+    Args:
+        store (str): "transactions" or "budgets"
+        after: The full new state, already validated; None when change is given
+        base: The state the caller changed into after; None to store after as it is
+        change: A list store splice from diff, made to base, e.g. rows appended
+                to it, so the caller never copies the whole store to describe it
+        label (str): What the change was, shown on the undo button
+        undoable (bool): False for changes such as archiving, which also
+                         drops the undo history before them
+        write: Function that writes the new state instead of save_validated
+
+    Returns:
+        The new state as written
+
+    Raises:
+        HistoryConflict: If what the change replaces was changed since base
+    """
+    with store_lock(store):
+        state = _read_state(store)
+        if change is not None:
+            after, change = rebase(state, change, len(base))
+        elif base is None:
+            change = diff(state, after)
+        elif isinstance(after, dict):
+            after = apply_change(state, diff(base, after))
+            change = diff(state, after)
+        else:
+            after, change = rebase(state, diff(base, after), len(base))
+        _record(store, _load_index(store), state, after, change, label, "edit", None, undoable, write)
+        return after
+
+
+def _replay(store, stack, kind):
+    with store_lock(store):
+        index = _load_index(store)
+        if not index or not index[stack]:
+            return None
+        if index["version"] != _file_version(STORES[store]):
+            index["undo"], index["redo"] = [], []
+            save_json_data(os.path.join(_folder(store), "index.json"), index)
+            raise HistoryConflict("the data was changed outside the app since the last change")
+        seq, label = index[stack][-1]
+        event = next(_read_events(store, seq, seq))
+        change = invert(event["change"]) if kind == "undo" else event["change"]
+        state = _read_state(store)
+        after = apply_change(state, change)
+        _record(store, index, state, after, change, label, kind, seq, True, None)
+        return label
+
+
+def undo(store):
+    """
+    Revert the latest change to a store that has not been undone
+
+    Returns:
+        str: Label of the undone change, or None if there is nothing to undo
+
+    Raises:
+        HistoryConflict: If the data was changed outside the history since
+    """
+    return _replay(store, "undo", "undo")
+
+
+def redo(store):
+    """
+    Re-apply the latest undone change, as long as nothing was changed since the undo
+
+    Returns:
+        str: Label of the change, or None if there is nothing to redo
+    """
+    return _replay(store, "redo", "redo")
+
+
+def undo_labels(store):
+    """
+    Labels of the next change undo and redo would act on, None where there is none
+    """
+    index = _load_index(store) or {"undo": [], "redo": []}
+    return (index["undo"][-1][1] if index["undo"] else None,
+            index["redo"][-1][1] if index["redo"] else None)
+
+
+def history_start(store):
+    """
+    When the first recorded state of a store was taken, as an ISO timestamp, or None
+    """
+    index = _load_index(store)
+    return index["snapshots"][0]["at"] if index else None
+
+
+def history_version(store):
+    """
+    Changes whenever an event is recorded, for caching views built from the history
+    """
+    index = _load_index(store)
+    return (index["seq"], len(index["snapshots"])) if index else None
+
+
+def history_seq(store, version):
+    """
+    Sequence number of the last event, if the store file is still at version
+
+    A cache built from the file at that version can later ask events_since
+    which changes it has not seen.
+
+    Returns:
+        int: Or None if the file was written since, or outside the history
+    """
+    index = _load_index(store)
+    return index["seq"] if index and version is not None and index["version"] == list(version) else None
+
+
+def events_since(store, seq):
+    """
+    Events recorded after sequence number seq, oldest first
+    """
+    index = _load_index(store)
+    return list(_read_events(store, seq + 1, index["seq"])) if index else []
+
+
+def state_as_of(store, when):
+    """
+    A store as it was at a point in time
+
+    Starts from the latest snapshot taken by then and replays the events
+    recorded after it up to that time, at most SNAPSHOT_EVERY of them.
+
+    Args:
+        store (str): "transactions" or "budgets"
+        when (date or datetime): A date means the end of that day
+
+    Returns:
+        The state, or None if the history starts after that time
+    """
+    if not isinstance(when, datetime) and isinstance(when, date):
+        when = datetime.combine(when, time.max)
+    when = when.isoformat(timespec="seconds")
+    index = _load_index(store)
+    if not index:
+        return None
+    snapshots = index["snapshots"]
+    position = bisect_right([snapshot["at"] for snapshot in snapshots], when) - 1
+    if position < 0:
+        return None
+    snapshot = snapshots[position]
+    last = snapshots[position + 1]["seq"] if position + 1 < len(snapshots) else index["seq"]
+    state = _load_snapshot(store, snapshot["file"])
+    for event in _read_events(store, snapshot["seq"] + 1, last):
+        if event["at"] > when:
+            break
+        state = apply_change(state, event["change"])
+    return state
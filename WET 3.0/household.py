@@ -0,0 +1,216 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import HOUSEHOLD_FILE, TRANSACTION_FILE
+from fx import BASE_CURRENCY, convert_frame, rates_version
+from recurring import RECURRING_REFERENCE
+from schema import TRANSACTION_TYPES
+from utils import load_json_data, save_json_data
+
+ROLLUP_KEYS = ["ledger", "period", "transaction type", "category", "payment method"]
+# Rows tagged like this in one ledger are paired with an opposite row of the
+# same amount in another ledger within TRANSFER_DAYS days
+TRANSFER_PATTERN = "transfer"
+TRANSFER_DAYS = 3
+MAX_WORKERS = 4
+
+# Partial rollups of ledgers that have not changed, by path
+_partials = {}
+_executor = None
+
+
+def ledger_file(path):
+    """
+    The transactions file of a ledger given as a file or a WET data folder
+    """
+    if os.path.isdir(path):
+        return os.path.join(path, os.path.basename(TRANSACTION_FILE))
+    return path
+
+
+def _file_version(file_path):
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_household():
+    """
+    Ledgers in the household view, each a {"name", "path"} dict; this app's own ledger by default
+    """
+    if not os.path.exists(HOUSEHOLD_FILE):
+        return [{"name": "Me", "path": TRANSACTION_FILE}]
+    return load_json_data(HOUSEHOLD_FILE)
+
+
+def save_household(ledgers):
+    save_json_data(HOUSEHOLD_FILE, ledgers)
+
+
+def _normalise(records):
+    df = pd.DataFrame(records)
+    for column, default in [("currency", BASE_CURRENCY), ("transaction fees", 0.0), ("payment method", ""),
+                            ("subcategory", ""), ("reference", ""), ("item description (money in)", ""),
+                            ("item description (money out)", ""), ("category", "")]:
+        if column not in df.columns:
+            df[column] = default
+    if df.empty:
+        return df.assign(date=pd.Series(dtype="datetime64[ns]"), **{"transaction type": "", "amount(kes)": 0.0})
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["transaction type"] = df["transaction type"].astype(str).str.strip().str.lower().map(TRANSACTION_TYPES)
+    df["amount(kes)"] = pd.to_numeric(df["amount(kes)"], errors="coerce")
+    df["transaction fees"] = pd.to_numeric(df["transaction fees"], errors="coerce").fillna(0.0)
+    df = df.dropna(subset=["date", "transaction type", "amount(kes)"])
+    return convert_frame(df, BASE_CURRENCY)
+
+
+def partial_rollup(name, path):
+    """
+    Aggregate one ledger; runs in a worker process
+
+    Args:
+        name (str): Ledger name shown in the household view
+        path (str): Its transactions file
+
+    Returns:
+        tuple: (rollup DataFrame of ROLLUP_KEYS with "amount", "fees" and
+               "count" in shillings, DataFrame of rows that may be transfers)
+    """
+    df = _normalise(load_json_data(path) if os.path.exists(path) else [])
+    df["ledger"] = name
+    df["period"] = df["date"].dt.strftime("%Y-%m")
+    df["payment method"] = df["payment method"].fillna("").astype(str)
+    df["category"] = df["category"].fillna("").astype(str)
+
+    rollup = df.groupby(ROLLUP_KEYS, sort=False).agg(
+        amount=("amount(kes)", "sum"), fees=("transaction fees", "sum"), count=("amount(kes)", "size")).reset_index()
+
+    text = df["category"] + " " + df["subcategory"].fillna("").astype(str) + " " \
+        + df["item description (money in)"].fillna("").astype(str) + " " \
+        + df["item description (money out)"].fillna("").astype(str)
+    reference = df["reference"].fillna("").astype(str)
+    tagged = text.str.contains(TRANSFER_PATTERN, case=False)
+    candidates = df.loc[tagged | (reference != ""), ROLLUP_KEYS + ["date", "amount(kes)"]]
+    candidates = candidates.assign(reference=reference[candidates.index], tagged=tagged[candidates.index])
+    return rollup, candidates.reset_index(drop=True)
+
+
+def match_transfers(candidates):
+    """
+    Pair money leaving one ledger with the same money arriving in another
+
+    Both rows have the same amount within TRANSFER_DAYS days, and either
+    share an M-Pesa style reference or are both tagged as a transfer.
+    References of recurring occurrences name a definition, not a payment,
+    so they never pair rows. Each row is used at most once.
+
+    Args:
+        candidates (DataFrame): Concatenated candidates from partial_rollup
+
+    Returns:
+        DataFrame: The matched rows (both sides), same columns as candidates
+    """
+    if candidates.empty:
+        return candidates
+    candidates = candidates.reset_index(drop=True).rename_axis("row").reset_index()
+    money_out = candidates[candidates["transaction type"] == "credit"]
+    money_in = candidates[candidates["transaction type"] == "debit"]
+
+    def paired(out_rows, in_rows, on):
+        pairs = out_rows.assign(cents=out_rows["amount(kes)"].round(2)).merge(
+            in_rows.assign(cents=in_rows["amount(kes)"].round(2)), on=on, suffixes=("_out", "_in"))
+        gap = (pairs["date_in"] - pairs["date_out"]).abs()
+        return pairs[(pairs["ledger_out"] != pairs["ledger_in"])
+                     & (gap <= pd.Timedelta(days=TRANSFER_DAYS))].assign(gap=gap)
+
+    def referenced(rows):
+        return rows[(rows["reference"] != "") & ~rows["reference"].str.startswith(RECURRING_REFERENCE)]
+
+    by_reference = paired(referenced(money_out), referenced(money_in), ["reference", "cents"])
+    by_amount = paired(money_out[money_out["tagged"]], money_in[money_in["tagged"]], ["cents"])
+
+    # Reference pairs first, then the closest; a row already paired is not used again
+    pairs = pd.concat([by_reference.sort_values("gap", kind="stable"), by_amount.sort_values("gap", kind="stable")])
+    pairs = pairs.drop_duplicates("row_out").drop_duplicates("row_in")
+    matched = np.concatenate([pairs["row_out"].to_numpy(), pairs["row_in"].to_numpy()])
+    return candidates[candidates["row"].isin(matched)].drop(columns="row")
+
+
+def _cpus():
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        # Spawned workers do not inherit the app server's threads
+        _executor = ProcessPoolExecutor(max_workers=min(MAX_WORKERS, _cpus()),
+                                        mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def consolidate(ledgers, parallel=True):
+    """
+    Household rollup over several ledgers, with transfers between them removed
+
+    Each changed ledger is aggregated in its own worker process, so the
+    wall time is about that of the largest one; unchanged ledgers reuse
+    their previous partial rollup. The parent merges the partials and
+    subtracts the amounts of matched transfers (their fees stay counted).
+
+    Args:
+        ledgers (list): {"name", "path"} dicts
+        parallel (bool): Use worker processes when there is more than one
+                         ledger to aggregate and more than one CPU
+
+    Returns:
+        dict: "rollup" (ROLLUP_KEYS with "amount", "fees", "count" in
+              shillings) and "transfers" (the matched rows)
+    """
+    jobs = []
+    for ledger in ledgers:
+        path = ledger_file(ledger["path"])
+        key = (ledger["name"], _file_version(path), rates_version())
+        if _partials.get(path, (None,))[0] != key:
+            jobs.append((path, ledger["name"], key))
+
+    if parallel and len(jobs) > 1 and _cpus() > 1:
+        futures = [(path, key, _pool().submit(partial_rollup, name, path)) for path, name, key in jobs]
+        for path, key, future in futures:
+            _partials[path] = (key, future.result())
+    else:
+        for path, name, key in jobs:
+            _partials[path] = (key, partial_rollup(name, path))
+
+    parts = [_partials[ledger_file(ledger["path"])][1] for ledger in ledgers]
+    rollup = pd.concat([part[0] for part in parts], ignore_index=True)
+    transfers = match_transfers(pd.concat([part[1] for part in parts], ignore_index=True))
+    if not transfers.empty:
+        removed = transfers.groupby(ROLLUP_KEYS).agg(amount=("amount(kes)", "sum"), count=("amount(kes)", "size"))
+        rollup = rollup.set_index(ROLLUP_KEYS)
+        rollup[["amount", "count"]] = rollup[["amount", "count"]].sub(removed, fill_value=0).loc[rollup.index]
+        rollup = rollup.reset_index()
+    return {"rollup": rollup, "transfers": transfers}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consolidated totals over the ledgers in the household file")
+    parser.add_argument("--serial", action="store_true", help="aggregate in this process, for comparison")
+    args = parser.parse_args()
+
+    ledgers = load_household()
+    started = time.perf_counter()
+    result = consolidate(ledgers, parallel=not args.serial)
+    elapsed = time.perf_counter() - started
+    totals = result["rollup"].pivot_table(index="ledger", columns="transaction type", values="amount",
+                                          aggfunc="sum", fill_value=0.0)
+    print(totals.rename(columns={"debit": "money in", "credit": "money out"}).round(2))
+    print(f"{len(result['transfers']) // 2} transfer(s) between ledgers removed; "
+          f"{len(ledgers)} ledger(s) in {elapsed:.2f}s")
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import textwrap
+import time
+
+from config import TRANSACTION_FILE
+from history import commit, store_lock
+from mpesa import parse_sms
+from schema import mark_validated, quarantine_records, validate_transactions
+from utils import load_json_data
+
+INGEST_HOST = "127.0.0.1"
+INGEST_PORT = 8765
+# Largest request body accepted, in bytes
+MAX_BODY = 16 * 1024 * 1024
+# Most transactions written in one commit; the rest wait for the next one
+MAX_BATCH = 50000
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def _encode(record):
+    # One element of the list exactly as json.dump(..., indent=4) lays it out
+    return textwrap.indent(json.dumps(record, indent=4), "    ")
+
+
+def _ledger_version():
+    if not os.path.exists(TRANSACTION_FILE):
+        return None
+    stat = os.stat(TRANSACTION_FILE)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class GroupCommitter:
+    """
+    Serialises ledger writes and merges concurrent requests into one commit
+
+    Requests queue their validated transactions and wait. The writer takes
+    everything queued, appends it with a single file write and then
+    answers every request in the batch, so while one write is in progress
+    the next batch builds up on its own. The ledger is kept in memory, with
+    every row already encoded, and only re-read when someone else (e.g. the
+    app) changed the file; a commit encodes just the new rows.
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.commits = 0
+        self._records = None
+        self._encoded = []
+        self._references = set()
+        self._version = None
+
+    async def submit(self, transactions):
+        """
+        Queue transactions and wait until they are on disk
+
+        Returns:
+            dict: "accepted" and "duplicates" counts for these transactions
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((transactions, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            while size < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                size += len(batch[-1][0])
+            try:
+                results = await loop.run_in_executor(None, self._commit, [items for items, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+
+    def _load(self):
+        version = _ledger_version()
+        if self._records is None or version != self._version:
+            self._records = load_json_data(TRANSACTION_FILE) if version else []
+            self._encoded = [_encode(record) for record in self._records]
+            self._references = {t.get("reference") for t in self._records if t.get("reference")}
+            self._version = version
+        return self._records
+
+    def _commit(self, groups):
+        # The app's writers take the same lock, so the version checked in _load
+        # still holds when the file is rewritten from the cached rows
+        with store_lock("transactions"):
+            records = self._load()
+            results, added = [], []
+            for transactions in groups:
+                accepted = 0
+                for transaction in transactions:
+                    reference = transaction.get("reference")
+                    if reference and reference in self._references:
+                        continue
+                    if reference:
+                        self._references.add(reference)
+                    added.append(transaction)
+                    accepted += 1
+                results.append({"accepted": accepted, "duplicates": len(transactions) - accepted})
+            if added:
+                encoded = self._encoded + [_encode(record) for record in added]
+                try:
+                    commit("transactions", records + added, base=records, label="Ingest API",
+                           write=lambda state: self._write(encoded))
+                except Exception:
+                    # Nothing was stored; reload on the next commit
+                    self._records = None
+                    raise
+                records.extend(added)
+                self._version = _ledger_version()
+                self.commits += 1
+        return results
+
+    def _write(self, encoded):
+        # Same layout as utils.save_json_data, swapped in atomically
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(TRANSACTION_FILE) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as file:
+                file.write("[\n" + ",\n".join(encoded) + "\n]" if encoded else "[]")
+            os.replace(temp_path, TRANSACTION_FILE)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        mark_validated(TRANSACTION_FILE)
+        self._encoded = encoded
+
+
+def _transactions_payload(body):
+    """
+    Raw transactions from a JSON body: one object, a list, or {"transactions": [...]}
+    """
+    payload = json.loads(body)
+    if isinstance(payload, dict) and isinstance(payload.get("transactions"), list):
+        return payload["transactions"]
+    if isinstance(payload, dict):
+        return [payload]
+    if isinstance(payload, list):
+        return payload
+    raise ValueError("expected a transaction object or a list of them")
+
+
+class IngestServer:
+    """
+    Minimal HTTP/JSON front end for scripted writes to the ledger
+
+    Endpoints:
+        GET  /health        Row count and commits so far
+        POST /transactions  One transaction object, a list, or {"transactions": [...]}
+                            in the same shape as the Home form saves
+        POST /mpesa         Plain text with one or more M-Pesa confirmation SMS
+
+    Rows failing validation are quarantined and reported with their index;
+    the rest are stored. Transactions with a reference already in the
+    ledger are skipped. Connections are kept alive so a script can stream
+    many requests over one socket.
+    """
+
+    def __init__(self, token=None):
+        self.token = token
+        self.committer = GroupCommitter()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": f"body larger than {MAX_BODY} bytes"}, close=True)
+                    break
+                body = await reader.readexactly(length)
+                status, payload = await self.route(method, path.split("?")[0], headers, body)
+
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                await self._respond(writer, status, payload, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, close=False):
+        data = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode() + data)
+        await writer.drain()
+
+    async def route(self, method, path, headers, body):
+        if self.token and headers.get("authorization") != f"Bearer {self.token}":
+            return 401, {"error": "missing or wrong token"}
+        if path == "/health":
+            records = self.committer._records
+            return 200, {"status": "ok", "rows": None if records is None else len(records),
+                         "commits": self.committer.commits}
+        if path not in ("/transactions", "/mpesa"):
+            return 404, {"error": f"no endpoint {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        unrecognised, unreadable, positions = 0, [], None
+        try:
+            if path == "/mpesa":
+                parsed = list(parse_sms(body.decode("utf-8", errors="replace").splitlines()))
+                # Position of each parsed transaction among the messages, so rejections point into the body
+                positions = [row for row, (transaction, _, _) in enumerate(parsed) if transaction is not None]
+                raw = [parsed[row][0] for row in positions]
+                unreadable = [{"row": row, "record": message, "errors": errors}
+                              for row, (_, message, errors) in enumerate(parsed) if errors]
+                unrecognised = len(parsed) - len(raw) - len(unreadable)
+            else:
+                raw = _transactions_payload(body)
+        except ValueError as e:
+            return 400, {"error": f"invalid body: {e}"}
+
+        valid, rejected = validate_transactions(raw)
+        if positions is not None:
+            rejected = [{**item, "row": positions[item["row"]]} for item in rejected]
+        rejected = sorted(unreadable + rejected, key=lambda item: item["row"])
+        if rejected:
+            quarantine_records(f"ingest API {path}", rejected)
+        try:
+            result = await self.committer.submit(valid) if valid else {"accepted": 0, "duplicates": 0}
+        except Exception as e:
+            return 500, {"error": f"could not save transactions: {e}"}
+
+        result["rejected"] = [{"index": item["row"], "errors": item["errors"]} for item in rejected]
+        if path == "/mpesa":
+            result["unrecognised"] = unrecognised
+        return (201 if result["accepted"] else 200), result
+
+    async def serve(self, host=INGEST_HOST, port=INGEST_PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        writer = asyncio.create_task(self.committer.run())
+        print(f"Accepting transactions on http://{host}:{port} (ledger {TRANSACTION_FILE})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            writer.cancel()
+
+
+def _benchmark(host, port, clients, batches, batch_size, token=None):
+    """
+    Post synthetic transactions from concurrent keep-alive clients and report records per second
+    """
+    from records import sample_transactions
+
+    rows = sample_transactions(batch_size)
+    for row in rows:
+        row.pop("reference", None)
+    body = json.dumps(rows).encode()
+    auth = f"Authorization: Bearer {token}\r\n" if token else ""
+    request = (f"POST /transactions HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n{auth}"
+               f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        accepted = 0
+        for _ in range(batches):
+            writer.write(request)
+            await writer.drain()
+            headers = {}
+            await reader.readline()
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+            accepted += json.loads(await reader.readexactly(int(headers["content-length"])))["accepted"]
+        writer.close()
+        return accepted
+
+    async def main():
+        started = time.perf_counter()
+        accepted = sum(await asyncio.gather(*(client() for _ in range(clients))))
+        return accepted, time.perf_counter() - started
+
+    accepted, elapsed = asyncio.run(main())
+    print(f"{accepted} transactions in {elapsed:.2f}s ({accepted / elapsed:,.0f}/s) from {clients} clients")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON ingestion service for the WET ledger")
+    parser.add_argument("--host", default=INGEST_HOST)
+    parser.add_argument("--port", type=int, default=INGEST_PORT)
+    parser.add_argument("--token", default=os.environ.get("WET_INGEST_TOKEN"),
+                        help="require 'Authorization: Bearer <token>' (default: $WET_INGEST_TOKEN)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="post synthetic transactions to a running service instead of serving")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args.host, args.port, args.clients, args.batches, args.batch_size, args.token)
+    else:
+        try:
+            asyncio.run(IngestServer(args.token).serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,235 @@
+import os
+import threading
+
+import pandas as pd
+import streamlit as st
+
+from config import TRANSACTION_FILE
+from history import commit, history_version, state_as_of, store_lock
+from records import TransactionColumns
+from utils import load_json_data
+
+# Sessions get shallow copies of the shared frame; with copy-on-write any
+# change they make copies the touched column instead of the shared data.
+# Always on from pandas 3.0.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _ledger_version():
+    if not os.path.exists(TRANSACTION_FILE):
+        return None
+    stat = os.stat(TRANSACTION_FILE)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class LedgerSnapshot:
+    """
+    One immutable version of the ledger, shared by every session
+
+    records holds the transactions in a TransactionColumns store rather
+    than as one dict per row; it reads as a sequence of transaction dicts,
+    which callers must treat as read-only. The DataFrame and any derived
+    structures are built on first use, once per snapshot.
+    """
+    __slots__ = ("version", "records", "_frame", "_derived", "_lock")
+
+    def __init__(self, version, records):
+        self.version = version
+        try:
+            self.records = TransactionColumns.from_transactions(records)
+        except (KeyError, TypeError, ValueError):
+            # Rows that have not been through validation yet, e.g. a file edited by hand
+            self.records = tuple(records)
+        self._frame = None
+        self._derived = {}
+        # Re-entrant, as a derived value may itself need the frame
+        self._lock = threading.RLock()
+
+    def frame(self):
+        """
+        The ledger as a DataFrame; each call returns a copy-on-write view
+        """
+        if self._frame is None:
+            with self._lock:
+                if self._frame is None:
+                    self._frame = self._build_frame()
+        return self._frame.copy(deep=False)
+
+    def _build_frame(self):
+        if not isinstance(self.records, TransactionColumns):
+            return pd.DataFrame(list(self.records))
+        if not len(self.records):
+            return pd.DataFrame()
+        frame = self.records.to_frame()
+        # The dtypes of a frame of the stored dicts, which the pages are written against
+        return frame.astype({**{name: str for name in frame.select_dtypes("category")}, "week": "int64"})
+
+    def derived(self, name, build):
+        """
+        Build a value from the records once per snapshot, e.g. an index
+
+        Args:
+            name (str): Cache key
+            build: Function taking the records tuple
+
+        Returns:
+            The shared value; callers must not mutate it
+        """
+        if name not in self._derived:
+            with self._lock:
+                if name not in self._derived:
+                    self._derived[name] = build(self.records)
+        return self._derived[name]
+
+
+class SharedLedger:
+    """
+    Process-wide holder of the current ledger snapshot
+
+    Readers take whatever snapshot is current; a new one is fully built
+    before it replaces the old one, so a session never sees a half-loaded
+    ledger and sessions still holding the old snapshot are unaffected.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = LedgerSnapshot(None, ())
+        self._past = {}
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        version = _ledger_version()
+        if snapshot.version == version:
+            return snapshot
+        # Only one session parses a changed file; the others wait and reuse it
+        with self._lock:
+            if self._snapshot.version != version:
+                self._snapshot = self._load()
+            return self._snapshot
+
+    def _load(self):
+        # Re-read if the file changed while it was being parsed
+        while True:
+            version = _ledger_version()
+            records = load_json_data(TRANSACTION_FILE)
+            if _ledger_version() == version:
+                return LedgerSnapshot(version, records)
+
+    def publish(self, records):
+        """
+        Swap in a snapshot of transactions this process has just written
+        """
+        snapshot = LedgerSnapshot(_ledger_version(), records)
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def as_of(self, day):
+        """
+        Read-only snapshot of the ledger at the end of a day, rebuilt from its history
+
+        Returns:
+            LedgerSnapshot: Or None if the history starts after that day
+        """
+        key = (day, history_version("transactions"))
+        if key not in self._past:
+            records = state_as_of("transactions", day)
+            snapshot = None if records is None else LedgerSnapshot(("as of",) + key, records)
+            with self._lock:
+                # A handful of recent views is plenty; each keeps its own derived caches
+                while len(self._past) >= 8:
+                    self._past.pop(next(iter(self._past)))
+                self._past[key] = snapshot
+        return self._past[key]
+
+
+@st.cache_resource(show_spinner=False)
+def shared_ledger():
+    """
+    The one SharedLedger of this server process
+    """
+    return SharedLedger()
+
+
+def ledger_snapshot():
+    """
+    Current ledger snapshot, parsed once per file version for all sessions
+    """
+    return shared_ledger().snapshot()
+
+
+def ledger_as_of(day):
+    """
+    The ledger as it stood at the end of a day, shared like the current one
+    """
+    return shared_ledger().as_of(day)
+
+
+def save_ledger(transactions, base, label="Edit transactions"):
+    """
+    Write validated transactions, record the change in the history and
+    publish them to every session without re-reading the file
+
+    The change from base to transactions is applied to the ledger as the
+    file holds it under the store lock, so rows other sessions saved since
+    base was read are kept.
+
+    Args:
+        transactions (list): The full new ledger
+        base: The records the session edited, e.g. its snapshot's records
+        label (str): Description shown on the undo button
+
+    Returns:
+        LedgerSnapshot: The snapshot now being served
+
+    Raises:
+        HistoryConflict: If a row the change replaces was changed since base
+    """
+    with store_lock("transactions"):
+        records = commit("transactions", list(transactions), base=base, label=label)
+        return shared_ledger().publish(records)
+
+
+def append_transactions(transactions, label="Add transactions"):
+    """
+    Append validated transactions to the ledger, like save_ledger
+
+    Only the new rows describe the change, so the shared ledger is never
+    copied into dicts to work it out.
+
+    Args:
+        transactions (list): The rows to append
+        label (str): Description shown on the undo button
+
+    Returns:
+        LedgerSnapshot: The snapshot now being served
+    """
+    with store_lock("transactions"):
+        base = ledger_snapshot().records
+        records = commit("transactions", base=base, label=label,
+                         change={"start": len(base), "removed": [], "added": list(transactions)})
+        return shared_ledger().publish(records)
+
+
+def replace_transaction(row, old, new, base, label="Edit transaction"):
+    """
+    Replace one row of the ledger, like save_ledger
+
+    Args:
+        row (int): Position of the row in base
+        old (dict): The row as the session read it
+        new (dict): The validated replacement
+        base: The records the session edited, e.g. its snapshot's records
+        label (str): Description shown on the undo button
+
+    Returns:
+        LedgerSnapshot: The snapshot now being served
+
+    Raises:
+        HistoryConflict: If the row was changed or moved since base
+    """
+    with store_lock("transactions"):
+        records = commit("transactions", base=base, label=label,
+                         change={"start": row, "removed": [old], "added": [new]})
+        return shared_ledger().publish(records)
@@ -0,0 +1,240 @@
+import csv
+import io
+import re
+from datetime import datetime
+from itertools import groupby
+
+from config import TRANSACTION_FILE
+from history import commit, store_lock
+from schema import quarantine_records, validate_transaction
+from utils import load_json_data
+
+# Every confirmation message starts with a 10 character transaction code
+MESSAGE_START = re.compile(r"\b(?P<code>[A-Z0-9]{10})\s+[Cc]onfirmed\.?")
+
+_AMOUNT = r"Ksh\s?(?P<amount>[\d,]+(?:\.\d{1,2})?)"
+_WHEN = r"on (?P<date>\d{1,2}/\d{1,2}/\d{2,4}) at (?P<time>\d{1,2}:\d{2}\s?[AP]M)"
+
+# Message kinds, tried in order; the direction is from the account holder's side
+SMS_PATTERNS = [
+    ("debit", re.compile(rf"You have received {_AMOUNT} from (?P<party>.+?)\s+{_WHEN}", re.I)),
+    ("credit", re.compile(rf"{_AMOUNT} sent to (?P<party>.+?)\s+{_WHEN}", re.I)),
+    ("credit", re.compile(rf"{_AMOUNT} paid to (?P<party>.+?)\.?\s+{_WHEN}", re.I)),
+    ("credit", re.compile(rf"{_WHEN}\s*Withdraw {_AMOUNT} from (?P<party>.+?)\s+New M-PESA", re.I)),
+    ("credit", re.compile(rf"You bought {_AMOUNT} of (?P<party>airtime)(?: for \d+)?\s+{_WHEN}", re.I)),
+]
+SMS_FEE = re.compile(r"Transaction cost,?\s?Ksh\s?(?P<fee>[\d,]+(?:\.\d{1,2})?)", re.I)
+
+# Keyword rules used to pre-fill category and subcategory; first match wins
+CATEGORY_RULES = [
+    (re.compile(r"airtime|safaricom data|bundles", re.I), "Utilities", "Airtime"),
+    (re.compile(r"kplc|kenya power", re.I), "Utilities", "Electricity"),
+    (re.compile(r"water|nairobi city water", re.I), "Utilities", "Water"),
+    (re.compile(r"naivas|carrefour|quickmart|chandarana|tuskys", re.I), "Food & Beverages", "Supermarket"),
+    (re.compile(r"fuliza", re.I), "Loan Debt Repayment", "Fuliza"),
+    (re.compile(r"sacco", re.I), "Savings & Investment", "Sacco"),
+    (re.compile(r"mshwari|m-shwari", re.I), "Savings & Investment", "Mshwari"),
+]
+# One of the app's categories, so imported rows can be filtered and budgeted like the rest
+DEFAULT_CATEGORY = "Miscellaneous"
+# Money received is income, so it falls back to one of the app's income categories instead
+DEFAULT_INCOME_CATEGORY = "Windfall"
+
+# Statement rows whose details contain this are charges for the row with the same receipt
+STATEMENT_CHARGE = re.compile(r"charge", re.I)
+STATEMENT_PARTY = re.compile(r"\s-\s(?P<party>.+)$")
+
+
+def _money(text):
+    return float(str(text).replace(",", "").strip() or 0)
+
+
+def _sms_datetime(date, time):
+    # Messages use day-first dates with either two or four digit years
+    year_format = "%y" if len(date.rsplit("/", 1)[-1]) == 2 else "%Y"
+    return datetime.strptime(f"{date} {time.replace(' ', '')}", f"%d/%m/{year_format} %I:%M%p")
+
+
+def _categorise(direction, party):
+    if direction == "credit":
+        for pattern, category, subcategory in CATEGORY_RULES:
+            if pattern.search(party):
+                return category, subcategory
+        return DEFAULT_CATEGORY, ""
+    return DEFAULT_INCOME_CATEGORY, ""
+
+
+def _transaction(code, when, direction, amount, fee, party):
+    category, subcategory = _categorise(direction, party)
+    return {
+        "date": when.strftime("%Y-%m-%d"),
+        "amount(kes)": amount,
+        "currency": "KES",
+        "transaction fees": fee,
+        "transaction type": direction,
+        "category": category,
+        "subcategory": subcategory,
+        "payment method": "M-Pesa",
+        "item description (money in)": party if direction == "debit" else "",
+        "item description (money out)": party if direction == "credit" else "",
+        "reference": code,
+    }
+
+
+def iter_sms_messages(lines):
+    """
+    Split pasted SMS text into one string per confirmation message
+
+    Args:
+        lines: Iterable of text lines, e.g. an open file or str.splitlines()
+
+    Yields:
+        str: A full message starting with its transaction code
+    """
+    buffer = ""
+    for line in lines:
+        buffer += " " + line.strip()
+        starts = [m.start() for m in MESSAGE_START.finditer(buffer)]
+        # Everything before the last message start is complete
+        for begin, end in zip(starts, starts[1:]):
+            yield buffer[begin:end].strip()
+        if starts:
+            buffer = buffer[starts[-1]:]
+    if MESSAGE_START.match(buffer.strip()):
+        yield buffer.strip()
+
+
+def parse_sms(lines):
+    """
+    Parse M-Pesa confirmation messages into canonical transactions
+
+    Args:
+        lines: Iterable of text lines holding one or more messages
+
+    Yields:
+        tuple: (transaction dict, or None if the message kind was not
+               recognised or it could not be read, the raw message, and a
+               list of errors, e.g. an invalid date)
+    """
+    for message in iter_sms_messages(lines):
+        code = MESSAGE_START.match(message).group("code")
+        for direction, pattern in SMS_PATTERNS:
+            match = pattern.search(message)
+            if match:
+                try:
+                    when = _sms_datetime(match["date"], match["time"])
+                except ValueError:
+                    yield None, message, [f"invalid date {match['date']} {match['time']}"]
+                    break
+                fee = SMS_FEE.search(message)
+                yield _transaction(code, when, direction, _money(match["amount"]), _money(fee["fee"]) if fee else 0.0,
+                                   match["party"].strip(" .")), message, []
+                break
+        else:
+            yield None, message, []
+
+
+def _statement_key(header):
+    return re.sub(r"[^a-z]", "", header.lower())
+
+
+def parse_statement(lines):
+    """
+    Parse an exported M-Pesa statement (CSV) into canonical transactions
+
+    Rows are read one at a time. Charge rows are folded into the fee of the
+    row sharing their receipt number.
+
+    Args:
+        lines: Iterable of CSV text lines with a header row
+
+    Yields:
+        tuple: (transaction dict, or None if the row could not be read,
+               the raw row, and a list of errors)
+    """
+    reader = csv.DictReader(lines)
+    rows = ({_statement_key(k): (v or "").strip() for k, v in row.items() if k} for row in reader)
+    completed = (row for row in rows if row.get("transactionstatus", "completed").lower() == "completed")
+
+    for code, group in groupby(completed, key=lambda row: row.get("receiptno", "")):
+        main, fee = None, 0.0
+        for row in group:
+            if STATEMENT_CHARGE.search(row.get("details", "")):
+                fee += _money(row.get("paidin")) or abs(_money(row.get("withdrawn")))
+            else:
+                main = row
+        if main is None:
+            continue
+        try:
+            when = datetime.strptime(main["completiontime"][:16], "%Y-%m-%d %H:%M")
+        except KeyError:
+            yield None, main, []
+            continue
+        except ValueError:
+            yield None, main, [f"invalid completion time {main['completiontime']!r}"]
+            continue
+        direction = "debit" if _money(main.get("paidin")) > 0 else "credit"
+        amount = _money(main.get("paidin")) or abs(_money(main.get("withdrawn")))
+        party = STATEMENT_PARTY.search(main.get("details", ""))
+        yield _transaction(code, when, direction, amount, fee,
+                           party["party"].strip() if party else main.get("details", "")), main, []
+
+
+def import_mpesa(lines, kind="sms"):
+    """
+    Parse, validate and store M-Pesa transactions in one batched write
+
+    Transactions whose M-Pesa code is already in the ledger, or repeated in
+    the input, are skipped.
+
+    Args:
+        lines: Iterable of text lines (pasted SMS text or statement CSV)
+        kind (str): "sms" or "statement"
+
+    Returns:
+        dict: Counts of "added", "duplicates", "rejected" and "unrecognised"
+              messages, plus the updated "transactions" list
+    """
+    parser = parse_statement if kind == "statement" else parse_sms
+    # Dedupe and write under the store lock, so a concurrent save is neither lost nor duplicated
+    with store_lock("transactions"):
+        transactions = load_json_data(TRANSACTION_FILE)
+        seen = {t.get("reference") for t in transactions if t.get("reference")}
+
+        # Rows are checked as they are parsed, so a large statement is never held twice
+        valid, duplicates, unrecognised, rejected = [], 0, [], []
+        for row, (transaction, raw, errors) in enumerate(parser(lines)):
+            if transaction is None and not errors:
+                unrecognised.append(raw)
+                continue
+            if transaction is not None:
+                if transaction["reference"] in seen:
+                    duplicates += 1
+                    continue
+                transaction, errors = validate_transaction(transaction)
+            if errors:
+                # Rows that cannot be read are rejected one by one, not the whole import
+                rejected.append({"row": row, "record": raw, "errors": errors})
+            else:
+                seen.add(transaction["reference"])
+                valid.append(transaction)
+
+        quarantine_records(f"M-Pesa {kind} import", rejected)
+        if valid:
+            transactions = commit("transactions", transactions + valid, base=transactions,
+                                  label=f"M-Pesa {kind} import")
+
+    return {
+        "added": len(valid),
+        "duplicates": duplicates,
+        "rejected": len(rejected),
+        "unrecognised": unrecognised,
+        "transactions": transactions,
+    }
+
+
+def text_lines(uploaded_file):
+    """
+    Stream the lines of an uploaded file without reading it into one string
+    """
+    return io.TextIOWrapper(uploaded_file, encoding="utf-8", errors="replace", newline="")
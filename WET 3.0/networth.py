@@ -0,0 +1,208 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Resolution options for the net-worth series mapped to pandas period codes
+RESOLUTIONS = {
+    "Day": "D",
+    "Week": "W",
+    "Month": "M",
+}
+
+
+def _numeric_column(df, col):
+    if col not in df.columns:
+        return np.zeros(len(df))
+    return np.nan_to_num(pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64"))
+
+
+def signed_amounts(df):
+    """
+    Turn each transaction into its effect on net worth
+
+    Money in adds the amount, money out subtracts it and every transaction
+    subtracts its fee.
+
+    Args:
+        df (DataFrame): Standardized transactions
+
+    Returns:
+        ndarray: Signed float amounts, one per row
+    """
+    amounts = _numeric_column(df, "amount(kes)")
+    fees = _numeric_column(df, "transaction fees")
+
+    types = df["transaction type"].astype(str).str.lower() if "transaction type" in df.columns \
+        else pd.Series("", index=df.index)
+    money_in = types.str.contains("debit|money in", na=False).to_numpy()
+    money_out = types.str.contains("credit|money out", na=False).to_numpy()
+
+    sign = np.where(money_in, 1.0, np.where(money_out, -1.0, 0.0))
+    return sign * amounts - fees
+
+
+def _fingerprint(dates, signed):
+    # Changes with any edit, removal or reordering of the rows, unlike their total
+    return hashlib.blake2b(dates.tobytes() + signed.tobytes(), digest_size=16).hexdigest()
+
+
+def _build(dates, signed):
+    order = np.argsort(dates, kind="stable")
+    return {
+        "dates": dates[order],
+        "cumulative": np.cumsum(signed[order]),
+    }
+
+
+def update_networth_cache(df, cache=None):
+    """
+    Build or extend the cumulative net-worth series for a ledger
+
+    The cache remembers how many rows it has seen and a fingerprint of
+    them. When those rows are unchanged and the ledger only grew by rows
+    dated on or after the last cached date, the new rows are summed onto
+    the tail instead of re-sorting the whole history.
+
+    Args:
+        df (DataFrame): Standardized transactions in file order
+        cache (dict): A cache previously returned by this function, or None
+
+    Returns:
+        dict: Cache with sorted int64 "dates", "cumulative" balances,
+              "rows" seen and their "fingerprint"
+    """
+    dates = pd.to_datetime(df["date"], errors="coerce") if "date" in df.columns \
+        else pd.Series(pd.NaT, index=df.index)
+    valid = dates.notna().to_numpy()
+    dates = dates.to_numpy(dtype="datetime64[ns]").astype("int64")
+    signed = signed_amounts(df)
+    signed[~valid] = 0.0
+
+    rows = len(df)
+    if cache and cache["rows"] <= rows:
+        seen = cache["rows"]
+        new_dates = dates[seen:][valid[seen:]]
+        new_signed = signed[seen:][valid[seen:]]
+        last_date = cache["dates"][-1] if len(cache["dates"]) else np.iinfo("int64").min
+        if _fingerprint(dates[:seen], signed[:seen]) == cache.get("fingerprint") and (new_dates >= last_date).all():
+            # Appends only - extend the tail
+            extension = _build(new_dates, new_signed)
+            base = cache["cumulative"][-1] if len(cache["cumulative"]) else 0.0
+            cache["dates"] = np.concatenate([cache["dates"], extension["dates"]])
+            cache["cumulative"] = np.concatenate([cache["cumulative"], base + extension["cumulative"]])
+            cache["rows"] = rows
+            cache["fingerprint"] = _fingerprint(dates, signed)
+            return cache
+
+    cache = _build(dates[valid], signed[valid])
+    cache["rows"] = rows
+    cache["fingerprint"] = _fingerprint(dates, signed)
+    return cache
+
+
+def get_networth_cache(df):
+    """
+    Return the session's net-worth cache, extended with any appended rows
+    """
+    st.session_state.networth_cache = update_networth_cache(df, st.session_state.get("networth_cache"))
+    return st.session_state.networth_cache
+
+
+def with_archived(cache, flows):
+    """
+    Net-worth cache with the archived periods ahead of the hot ledger
+
+    Each archived day adds its net, so the series climbs through the
+    archived periods instead of starting at their total. The session
+    cache itself is left as it is.
+
+    Args:
+        cache (dict): Net-worth cache from update_networth_cache
+        flows (DataFrame): Daily "date" and "net" of the archive, from archive.archived_flows,
+                           in the cache's currency
+
+    Returns:
+        dict: A cache with the same keys, covering the archived periods too
+    """
+    if flows.empty:
+        return cache
+    days = pd.to_datetime(flows["date"]).to_numpy(dtype="datetime64[ns]").astype("int64")
+    nets = np.nan_to_num(flows["net"].to_numpy(dtype="float64"))
+    steps = np.diff(cache["cumulative"], prepend=0.0)
+    archived = _build(np.concatenate([days, cache["dates"]]), np.concatenate([nets, steps]))
+    return {**cache, **archived}
+
+
+def balance_on(cache, date, opening_balance=0.0):
+    """
+    Net worth at the end of the given date
+
+    Args:
+        cache (dict): Net-worth cache from update_networth_cache
+        date: Anything pandas can parse as a date
+        opening_balance (float): Balance before the first transaction
+
+    Returns:
+        float: Opening balance plus every transaction up to and including date
+    """
+    end_of_day = (pd.Timestamp(date).normalize() + pd.Timedelta(days=1)).value
+    idx = np.searchsorted(cache["dates"], end_of_day, side="left") - 1
+    if idx < 0:
+        return float(opening_balance)
+    return float(opening_balance + cache["cumulative"][idx])
+
+
+def balance_between(cache, start, end, opening_balance=0.0):
+    """
+    Net worth movement over a date range
+
+    Args:
+        cache (dict): Net-worth cache from update_networth_cache
+        start: First date of the range (inclusive)
+        end: Last date of the range (inclusive)
+        opening_balance (float): Balance before the first transaction
+
+    Returns:
+        dict: Balance at the "start" and "end" of the range and the "change"
+    """
+    before_start = pd.Timestamp(start).normalize() - pd.Timedelta(days=1)
+    start_balance = balance_on(cache, before_start, opening_balance)
+    end_balance = balance_on(cache, end, opening_balance)
+    return {
+        "start": start_balance,
+        "end": end_balance,
+        "change": end_balance - start_balance,
+    }
+
+
+def networth_series(cache, resolution="Day", opening_balance=0.0):
+    """
+    Closing net worth per day, week or month
+
+    Periods without transactions carry the previous balance forward.
+
+    Args:
+        cache (dict): Net-worth cache from update_networth_cache
+        resolution (str): One of RESOLUTIONS
+        opening_balance (float): Balance before the first transaction
+
+    Returns:
+        DataFrame: "period" start dates and closing "net worth"
+    """
+    if not len(cache["dates"]):
+        return pd.DataFrame(columns=["period", "net worth"])
+
+    freq = RESOLUTIONS[resolution]
+    periods = pd.DatetimeIndex(cache["dates"].astype("datetime64[ns]")).to_period(freq)
+    # The series is sorted, so the last row of each run is the period close
+    is_close = np.append(periods[1:] != periods[:-1], True)
+    closing = pd.Series(cache["cumulative"][is_close], index=periods[is_close])
+
+    full_range = pd.period_range(periods[0], periods[-1], freq=freq)
+    closing = closing.reindex(full_range).ffill() + opening_balance
+    return pd.DataFrame({
+        "period": full_range.to_timestamp(),
+        "net worth": closing.to_numpy(),
+    })
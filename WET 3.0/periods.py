@@ -0,0 +1,244 @@
+import json
+import os
+import re
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import BUDGET_FILE
+
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
+PERIOD_LEVELS = ["Week", "Month", "Quarter", "Year"]
+
+# Budget keys look like "March 2025 - Week 11"
+PERIOD_KEY_PATTERN = re.compile(r"^(?P<month>[A-Za-z]+) (?P<year>\d{4}) - Week (?P<week>\d{1,2})$")
+
+
+def period_key_for(day):
+    """
+    Budget period key of the ISO week a date falls in
+
+    The week belongs to the month and year of its Thursday, as ISO 8601
+    does for years, so the month and week in a key always agree.
+
+    Args:
+        day (date): Any date in the week
+
+    Returns:
+        str: e.g. "March 2025 - Week 11"
+    """
+    iso_year, iso_week, weekday = day.isocalendar()
+    thursday = day + timedelta(days=4 - weekday)
+    return f"{MONTHS[thursday.month - 1]} {iso_year} - Week {iso_week}"
+
+
+def _iso_monday(year, week):
+    try:
+        return date.fromisocalendar(year, week, 1)
+    except ValueError:
+        return None
+
+
+def week_start(key):
+    """
+    Monday of the ISO week a period key refers to
+
+    Keys from period_key_for carry the ISO year and the month of the
+    week's Thursday. Older keys paired the calendar year of the day picked
+    with its ISO week number, so "December 2024 - Week 1" is the week of
+    30 December 2024. Those are read as the week of that number with a day
+    in the key's month, or failing that in its calendar year: keys that
+    pair a month with a week from another month ("January 2025 - Week 30")
+    go by the week number, the more specific of the two.
+
+    Returns:
+        date: Monday of the week, or None if the key cannot be read
+    """
+    match = PERIOD_KEY_PATTERN.match(key.strip())
+    if not match:
+        return None
+    year, week = int(match["year"]), int(match["week"])
+    month = MONTHS.index(match["month"].capitalize()) + 1 if match["month"].capitalize() in MONTHS else None
+
+    start = _iso_monday(year, week)
+    if start is not None and (start + timedelta(days=3)).month == month:
+        return start
+
+    # An older key: the week of that number that overlaps the calendar year, preferably the month too
+    candidates = [monday for monday in (_iso_monday(year, week), _iso_monday(year + 1, week), _iso_monday(year - 1, week))
+                  if monday is not None]
+    days = {monday: [monday + timedelta(days=offset) for offset in range(7)] for monday in candidates}
+    for wanted in (lambda day: (day.year, day.month) == (year, month), lambda day: day.year == year):
+        for monday in candidates:
+            if any(wanted(day) for day in days[monday]):
+                return monday
+    return None
+
+
+def _budget_version():
+    if not os.path.exists(BUDGET_FILE):
+        return None
+    stat = os.stat(BUDGET_FILE)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def build_period_index(budgets):
+    """
+    Flatten budget periods into one row per week
+
+    Args:
+        budgets (dict): Period key to {"overall_budget", "items"}
+
+    Returns:
+        DataFrame: "key", "week start", "overall budget" and "budgeted"
+                   (sum of items), plus one column per budgeted category,
+                   sorted by week start. Unreadable keys are left out.
+    """
+    rows, items = [], []
+    for key, period in budgets.items():
+        start = week_start(key)
+        if start is None:
+            continue
+        rows.append({"key": key, "week start": start, "overall budget": period.get("overall_budget", 0)})
+        items.extend({"key": key, "category": item["category"], "amount": item["amount"]}
+                     for item in period.get("items", []))
+
+    index = pd.DataFrame(rows, columns=["key", "week start", "overall budget"])
+    index["week start"] = pd.to_datetime(index["week start"])
+    index["overall budget"] = pd.to_numeric(index["overall budget"], errors="coerce").fillna(0.0)
+
+    items = pd.DataFrame(items, columns=["key", "category", "amount"])
+    by_category = items.pivot_table(index="key", columns="category", values="amount", aggfunc="sum", fill_value=0.0)
+    index = index.join(by_category, on="key")
+    index["budgeted"] = index[list(by_category.columns)].sum(axis=1)
+    return index.fillna(0.0).sort_values("week start", kind="stable").reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False)
+def _load_period_index(version):
+    # Read directly, as load_json_data flattens dicts and budgets are keyed by period
+    budgets = {}
+    if version:
+        try:
+            with open(BUDGET_FILE) as file:
+                budgets = json.load(file)
+        except json.JSONDecodeError:
+            pass
+    return build_period_index(budgets if isinstance(budgets, dict) else {})
+
+
+def load_period_index():
+    """
+    The saved budgets' period index, rebuilt only when budgets.json changes
+    """
+    return _load_period_index(_budget_version())
+
+
+def period_labels(week_starts, level):
+    """
+    Label weeks with the month, quarter or year they roll up into
+
+    A week is counted in the month (and so quarter and year) of its Thursday,
+    matching period_key_for.
+
+    Args:
+        week_starts (Series): Datetime Mondays
+        level (str): One of PERIOD_LEVELS
+
+    Returns:
+        Series: Labels that sort chronologically, e.g. "2025-W11",
+                "2025-03", "2025-Q1" or "2025"
+    """
+    if level == "Week":
+        iso = week_starts.dt.isocalendar()
+        return iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
+    thursdays = week_starts + pd.Timedelta(days=3)
+    if level == "Month":
+        return thursdays.dt.strftime("%Y-%m")
+    if level == "Quarter":
+        return thursdays.dt.year.astype(str) + "-Q" + thursdays.dt.quarter.astype(str)
+    return thursdays.dt.year.astype(str)
+
+
+def weekly_spending(df):
+    """
+    Money out (amount plus fees) per ISO week and category
+
+    Args:
+        df (DataFrame): Transactions in the currency budgets are compared in
+
+    Returns:
+        DataFrame: "week start", "category" and "spent"
+    """
+    money_out = df[df["transaction type"] == "credit"]
+    days = pd.to_datetime(money_out["date"], errors="coerce")
+    spent = pd.to_numeric(money_out["amount(kes)"], errors="coerce").fillna(0.0) \
+        + pd.to_numeric(money_out["transaction fees"], errors="coerce").fillna(0.0)
+    frame = pd.DataFrame({
+        "week start": days - pd.to_timedelta(days.dt.weekday, unit="D"),
+        "category": money_out["category"].astype(str),
+        "spent": spent,
+    }).dropna(subset=["week start"])
+    return frame.groupby(["week start", "category"], as_index=False)["spent"].sum()
+
+
+def get_weekly_spending(df, version, currency):
+    """
+    Session-cached weekly_spending, recomputed when the ledger or currency changes
+    """
+    cached = st.session_state.get("weekly_spending")
+    if cached is None or cached["version"] != version or cached["currency"] != currency:
+        cached = st.session_state.weekly_spending = {
+            "version": version,
+            "currency": currency,
+            "spending": weekly_spending(df),
+        }
+    return cached["spending"]
+
+
+def budget_rollup(index, spending, level, category=None, budget_rate=1.0):
+    """
+    Budgeted against spent, rolled up to weeks, months, quarters or years
+
+    Both frames are labelled with their period and aggregated with one
+    groupby each; only periods that have a budget are returned.
+
+    Args:
+        index (DataFrame): Period index from build_period_index
+        spending (DataFrame): Weekly spending from weekly_spending
+        level (str): One of PERIOD_LEVELS
+        category (str): Limit to one category, or None for all
+        budget_rate (float): Converts shilling budgets to the spending currency
+
+    Returns:
+        DataFrame: "overall budget", "budgeted", "spent", "remaining" and
+                   "used" (share of the weekly limits: overall budget,
+                   or the items where none was set) by period
+    """
+    columns = ["overall budget", "budgeted", "spent", "remaining", "used"]
+    if index.empty:
+        return pd.DataFrame(columns=columns)
+
+    overall = 0.0 if category else index["overall budget"]
+    budgeted = index.get(category, 0.0) if category else index["budgeted"]
+    budgets = pd.DataFrame({
+        "period": period_labels(index["week start"], level),
+        "overall budget": overall,
+        "budgeted": budgeted,
+        # A week without an overall budget is limited by its items
+        "limit": np.where(overall > 0, overall, budgeted),
+    }).groupby("period").sum() * budget_rate
+
+    if category:
+        spending = spending[spending["category"] == category]
+    # Only weeks that have a budget count, so a partly budgeted month compares like with like
+    spending = spending[spending["week start"].isin(index["week start"])]
+    spent = spending.groupby(period_labels(spending["week start"], level))["spent"].sum()
+
+    rollup = budgets.join(spent.rename("spent")).fillna({"spent": 0.0})
+    rollup["remaining"] = rollup["limit"] - rollup["spent"]
+    rollup["used"] = rollup["spent"] / rollup["limit"].replace(0, np.nan)
+    return rollup[columns]
@@ -0,0 +1,264 @@
+import json
+import sys
+import tracemalloc
+from array import array
+from collections.abc import Sequence
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+EPOCH = date(1970, 1, 1)
+
+# Canonical transaction keys and the attribute each is stored under
+RECORD_FIELDS = {
+    "date": "date",
+    "week": "week",
+    "amount(kes)": "amount",
+    "currency": "currency",
+    "transaction fees": "fees",
+    "transaction type": "transaction_type",
+    "category": "category",
+    "subcategory": "subcategory",
+    "payment method": "payment_method",
+    "item description (money in)": "description_in",
+    "item description (money out)": "description_out",
+    "reference": "reference",
+}
+
+TRANSACTION_TYPE_CODES = {"debit": 0, "credit": 1}
+TRANSACTION_TYPE_NAMES = ["debit", "credit"]
+
+
+class TransactionRecord:
+    """
+    A single transaction without a per-row dict
+
+    Attribute names are short, fixed slots instead of the long string keys
+    repeated in every stored transaction dict.
+    """
+    __slots__ = tuple(RECORD_FIELDS.values())
+
+    def __init__(self, **fields):
+        for attr in self.__slots__:
+            setattr(self, attr, fields.get(attr))
+
+    @classmethod
+    def from_dict(cls, transaction):
+        record = cls.__new__(cls)
+        for key, attr in RECORD_FIELDS.items():
+            value = transaction.get(key)
+            setattr(record, attr, sys.intern(value) if isinstance(value, str) else value)
+        return record
+
+    def to_dict(self):
+        return {key: getattr(self, attr) for key, attr in RECORD_FIELDS.items()}
+
+
+class _Interner:
+    """
+    Maps repeated strings (categories, payment methods) to small integer codes
+    """
+    __slots__ = ("codes", "values")
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        value = value or ""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class TransactionColumns(Sequence):
+    """
+    Column store for many transactions
+
+    Dates are int64 days since 1970-01-01, amounts and fees are int64 cents,
+    the transaction type and currency are int8 codes and categories,
+    subcategories and payment methods are int32 codes into interned string
+    tables. Columns are
+    growable arrays, so appending a transaction never copies the store.
+
+    It reads as a sequence of canonical transaction dicts, each rebuilt on
+    access, so it can stand in for the list of schema-validated dicts.
+    """
+
+    def __init__(self):
+        self.dates = array("q")
+        self.amounts = array("q")
+        self.fees = array("q")
+        self.types = array("b")
+        self.currencies = array("b")
+        self.categories = array("i")
+        self.subcategories = array("i")
+        self.payment_methods = array("i")
+        self.descriptions_in = []
+        self.descriptions_out = []
+        self.references = []
+        self.category_names = _Interner()
+        self.subcategory_names = _Interner()
+        self.payment_method_names = _Interner()
+        self.currency_names = _Interner()
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        columns = cls()
+        columns.extend(transactions)
+        return columns
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.row(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("transaction row out of range")
+        return self.row(i)
+
+    def append(self, transaction):
+        """
+        Add one schema-validated transaction dict
+        """
+        self.dates.append((date.fromisoformat(transaction["date"]) - EPOCH).days)
+        self.amounts.append(round(transaction["amount(kes)"] * 100))
+        self.fees.append(round(transaction.get("transaction fees", 0.0) * 100))
+        self.types.append(TRANSACTION_TYPE_CODES[transaction["transaction type"]])
+        self.currencies.append(self.currency_names.code(transaction.get("currency", "KES")))
+        self.categories.append(self.category_names.code(transaction["category"]))
+        self.subcategories.append(self.subcategory_names.code(transaction.get("subcategory")))
+        self.payment_methods.append(self.payment_method_names.code(transaction.get("payment method")))
+        self.descriptions_in.append(transaction.get("item description (money in)") or "")
+        self.descriptions_out.append(transaction.get("item description (money out)") or "")
+        self.references.append(transaction.get("reference") or "")
+
+    def extend(self, transactions):
+        for transaction in transactions:
+            self.append(transaction)
+
+    def column(self, name):
+        """
+        Zero-copy numpy view of a numeric column, e.g. column("amounts")
+        """
+        values = getattr(self, name)
+        return np.frombuffer(values, dtype=values.typecode) if len(values) else np.empty(0, values.typecode)
+
+    def row(self, i):
+        """
+        Rebuild the canonical transaction dict for one row
+        """
+        day = EPOCH + timedelta(days=self.dates[i])
+        return {
+            "date": day.isoformat(),
+            "week": day.isocalendar()[1],
+            "amount(kes)": self.amounts[i] / 100,
+            "currency": self.currency_names.values[self.currencies[i]],
+            "transaction fees": self.fees[i] / 100,
+            "transaction type": TRANSACTION_TYPE_NAMES[self.types[i]],
+            "category": self.category_names.values[self.categories[i]],
+            "subcategory": self.subcategory_names.values[self.subcategories[i]],
+            "payment method": self.payment_method_names.values[self.payment_methods[i]],
+            "item description (money in)": self.descriptions_in[i],
+            "item description (money out)": self.descriptions_out[i],
+            "reference": self.references[i],
+        }
+
+    def record(self, i):
+        return TransactionRecord.from_dict(self.row(i))
+
+    def to_frame(self):
+        """
+        DataFrame with the canonical columns; text codes become categoricals
+        """
+        dates = pd.to_datetime(self.column("dates"), unit="D")
+        return pd.DataFrame({
+            "date": dates.strftime("%Y-%m-%d"),
+            "week": dates.isocalendar().week.to_numpy(),
+            "amount(kes)": self.column("amounts") / 100,
+            "currency": pd.Categorical.from_codes(self.column("currencies"), self.currency_names.values),
+            "transaction fees": self.column("fees") / 100,
+            "transaction type": pd.Categorical.from_codes(self.column("types"), TRANSACTION_TYPE_NAMES),
+            "category": pd.Categorical.from_codes(self.column("categories"), self.category_names.values),
+            "subcategory": pd.Categorical.from_codes(self.column("subcategories"), self.subcategory_names.values),
+            "payment method": pd.Categorical.from_codes(self.column("payment_methods"),
+                                                        self.payment_method_names.values),
+            "item description (money in)": self.descriptions_in,
+            "item description (money out)": self.descriptions_out,
+            "reference": self.references,
+        })
+
+
+def measure_memory(transactions):
+    """
+    Compare the memory held by a list of dicts against the column store
+
+    Every representation is built from the same decoded JSON that
+    load_json_data returns and measured with tracemalloc.
+
+    Args:
+        transactions (list): Canonical transaction dicts
+
+    Returns:
+        dict: Bytes held by "dicts", "records" (slots objects) and "columns"
+    """
+    def measure(build):
+        tracemalloc.start()
+        built = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del built
+        return current
+
+    encoded = json.dumps(transactions)
+
+    def as_loaded():
+        # Same objects load_json_data would produce
+        return json.loads(encoded)
+
+    return {
+        "dicts": measure(as_loaded),
+        "records": measure(lambda: [TransactionRecord.from_dict(t) for t in as_loaded()]),
+        "columns": measure(lambda: TransactionColumns.from_transactions(as_loaded())),
+    }
+
+
+def sample_transactions(n):
+    rng = np.random.default_rng(0)
+    categories = ["Food & Beverages", "Transport", "Utilities", "Housing & Rent", "Savings & Investment"]
+    subcategories = ["Supermarket", "Fuel", "Electricity", "Rent", "Sacco"]
+    methods = ["Cash", "M-Pesa", "Bank Transfer", "Credit Card", "Debit Card", "Other"]
+    start = date(2020, 1, 1)
+    transactions = []
+    for i in range(n):
+        day = start + timedelta(days=int(i // 50))
+        money_in = i % 7 == 0
+        transactions.append({
+            "date": day.isoformat(),
+            "week": day.isocalendar()[1],
+            "amount(kes)": round(float(rng.uniform(10, 50000)), 2),
+            "currency": "KES",
+            "transaction fees": float(rng.choice([0.0, 13.0, 23.0])),
+            "transaction type": "debit" if money_in else "credit",
+            "category": "Salary" if money_in else categories[i % len(categories)],
+            "subcategory": "None" if money_in else subcategories[i % len(subcategories)],
+            "payment method": methods[i % len(methods)],
+            "item description (money in)": "salary" if money_in else "",
+            "item description (money out)": "" if money_in else f"purchase {i % 500}",
+            "reference": "",
+        })
+    return transactions
+
+
+if __name__ == "__main__":
+    rows = 100_000
+    usage = measure_memory(sample_transactions(rows))
+    for name, used in usage.items():
+        print(f"{name:>8}: {used / 2 ** 20:8.1f} MiB per {rows:,} rows")
+    print(f"column store uses {1 - usage['columns'] / usage['dicts']:.0%} less memory than dicts")
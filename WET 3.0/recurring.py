@@ -0,0 +1,191 @@
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import RECURRING_FILE, TRANSACTION_FILE
+from history import commit, store_lock
+from schema import TRANSACTION_SCHEMA, validate_transaction
+from utils import load_json_data, save_json_data
+
+# Schedules and how many months (or days) separate occurrences
+SCHEDULES = {
+    "Daily": ("days", 1),
+    "Weekly": ("days", 7),
+    "Fortnightly": ("days", 14),
+    "Monthly": ("months", 1),
+    "Quarterly": ("months", 3),
+    "Yearly": ("months", 12),
+}
+# Reference stored on materialised occurrences, followed by the definition id
+RECURRING_REFERENCE = "recurring:"
+
+
+def load_recurring():
+    """
+    Load recurring transaction definitions
+
+    Returns:
+        list: Definition dicts with a schedule, start/end dates and a transaction template
+    """
+    return load_json_data(RECURRING_FILE)
+
+
+def save_recurring(definitions):
+    save_json_data(RECURRING_FILE, definitions)
+
+
+def create_recurring(name, schedule, start_date, transaction, end_date=None):
+    """
+    Build a recurring definition from a transaction template
+
+    Args:
+        name (str): Label shown in the app, e.g. "Rent"
+        schedule (str): One of SCHEDULES
+        start_date (date): Date of the first occurrence
+        transaction (dict): Amount, fees, type, category, subcategory,
+                            payment method and descriptions
+        end_date (date): Last possible occurrence, or None to repeat forever
+
+    Returns:
+        tuple: (definition dict or None, list of validation errors)
+    """
+    if schedule not in SCHEDULES:
+        return None, [f"unknown schedule {schedule!r}"]
+    template, errors = validate_transaction({**transaction, "date": start_date.strftime("%Y-%m-%d")})
+    if errors:
+        return None, errors
+    if end_date is not None and end_date < start_date:
+        return None, ["end date is before start date"]
+
+    del template["date"], template["week"]
+    return {
+        "id": uuid.uuid4().hex[:8],
+        "name": name,
+        "schedule": schedule,
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d") if end_date else None,
+        "materialised_until": None,
+        "template": template,
+    }, []
+
+
+def occurrence_dates(definition, start, end):
+    """
+    All occurrence dates of a definition within [start, end], computed in one pass
+
+    Monthly schedules keep the start day of month, clipped to the month's
+    last day, so a rent due on the 31st falls on the 30th in April.
+
+    Args:
+        definition (dict): Recurring definition
+        start, end: Inclusive range to generate dates for
+
+    Returns:
+        DatetimeIndex: Occurrence dates in ascending order
+    """
+    first = pd.Timestamp(definition["start_date"])
+    start = max(pd.Timestamp(start).normalize(), first)
+    end = pd.Timestamp(end).normalize()
+    if definition.get("end_date"):
+        end = min(end, pd.Timestamp(definition["end_date"]))
+    if start > end:
+        return pd.DatetimeIndex([])
+
+    unit, step = SCHEDULES[definition["schedule"]]
+    if unit == "days":
+        offset = -(-(start - first).days // step) * step
+        return pd.date_range(first + pd.Timedelta(days=offset), end, freq=f"{step}D")
+
+    months = pd.period_range(first.to_period("M"), end.to_period("M"), freq="M")[::step]
+    days = np.minimum(first.day, months.days_in_month) - 1
+    dates = months.to_timestamp() + pd.to_timedelta(days, unit="D")
+    return dates[(dates >= start) & (dates <= end)]
+
+
+def _occurrences(definition, dates):
+    template = definition["template"]
+    return [{
+        **template,
+        "date": day.strftime("%Y-%m-%d"),
+        "week": day.isocalendar()[1],
+        "reference": f"{RECURRING_REFERENCE}{definition['id']}",
+    } for day in dates]
+
+
+def _due(definitions, today):
+    # Occurrences not yet materialised, marking each definition as done up to today
+    due = []
+    for definition in definitions:
+        since = definition.get("materialised_until")
+        start = pd.Timestamp(since) + pd.Timedelta(days=1) if since else definition["start_date"]
+        dates = occurrence_dates(definition, start, today)
+        if len(dates):
+            due.extend(_occurrences(definition, dates))
+            definition["materialised_until"] = today.strftime("%Y-%m-%d")
+    return due
+
+
+def materialise_due(today=None):
+    """
+    Write every recurring occurrence due up to today in one batch
+
+    Each definition remembers the last date it was materialised to, so
+    reloading the app never duplicates occurrences. Sessions materialise
+    under the ledger's store lock, and occurrences already in the ledger
+    (same definition and date, e.g. after a run stopped before saving the
+    definitions) are skipped.
+
+    Args:
+        today (date): Reference date, defaults to today
+
+    Returns:
+        int: Number of transactions added to the ledger
+    """
+    today = pd.Timestamp(today or datetime.now()).normalize()
+    # Cheap check without the lock; nearly every rerun has nothing due
+    if not _due(load_recurring(), today):
+        return 0
+
+    with store_lock("transactions"):
+        definitions = load_recurring()
+        due = _due(definitions, today)
+        if not due:
+            return 0
+        transactions = load_json_data(TRANSACTION_FILE)
+        stored = {(t.get("reference"), t.get("date")) for t in transactions
+                  if str(t.get("reference", "")).startswith(RECURRING_REFERENCE)}
+        due = [t for t in due if (t["reference"], t["date"]) not in stored]
+        if due:
+            commit("transactions", transactions + due, base=transactions, label="Recurring transactions")
+        save_recurring(definitions)
+    return len(due)
+
+
+def project_recurring(start, end, definitions=None):
+    """
+    Future occurrences of every definition, generated on demand and never stored
+
+    Args:
+        start, end: Inclusive date range to project
+        definitions (list): Definitions to project, defaults to the saved ones
+
+    Returns:
+        DataFrame: One row per projected occurrence with the canonical
+                   transaction columns plus the definition "name"
+    """
+    definitions = load_recurring() if definitions is None else definitions
+    frames = []
+    for definition in definitions:
+        dates = occurrence_dates(definition, start, end)
+        if len(dates):
+            frame = pd.DataFrame([definition["template"]] * len(dates))
+            frame["date"] = dates.strftime("%Y-%m-%d")
+            frame["week"] = dates.isocalendar().week.to_numpy()
+            frame["reference"] = f"{RECURRING_REFERENCE}{definition['id']}"
+            frame["name"] = definition["name"]
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=list(TRANSACTION_SCHEMA) + ["name"])
+    return pd.concat(frames, ignore_index=True).sort_values("date", kind="stable")
@@ -0,0 +1,404 @@
+import argparse
+import json
+import os
+import time
+from html import escape
+
+import pandas as pd
+import plotly
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+
+from archive import load_archive_summaries, load_partition
+from config import ARCHIVE_INDEX, BUDGET_FILE, REPORT_FOLDER, TRANSACTION_FILE
+from fx import BASE_CURRENCY, convert_amount, convert_frame, rates_version
+from periods import build_period_index, period_labels
+from schema import TRANSACTION_TYPES
+from utils import load_json_data, save_json_data
+
+# Weekly reports cover one ISO week; monthly ones the weeks whose Thursday
+# falls in the month, as on the Budget page, so weeks nest in months
+REPORT_KINDS = {"weekly": "Week", "monthly": "Month"}
+AGGREGATE_KEYS = ["day", "transaction type", "category"]
+# Bump when the report layout changes, so every report is rendered again
+REPORT_LAYOUT = 1
+
+
+def _file_version(file_path):
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def build_report_aggregate(df):
+    """
+    Daily totals by type and category, the only view of the ledger reports read
+
+    Args:
+        df (DataFrame): Transactions in the reporting currency
+
+    Returns:
+        DataFrame: AGGREGATE_KEYS with "amount", "fees" and "count", plus the
+                   "week start", "week" and "month" each day belongs to
+    """
+    columns = AGGREGATE_KEYS + ["amount", "fees", "count", "week start", "week", "month"]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    days = pd.to_datetime(df["date"], errors="coerce").dt.normalize()
+    frame = pd.DataFrame({
+        "day": days,
+        "transaction type": df["transaction type"].astype(str).str.strip().str.lower().map(TRANSACTION_TYPES),
+        "category": df["category"].fillna("").astype(str),
+        "amount": pd.to_numeric(df["amount(kes)"], errors="coerce").fillna(0.0),
+        "fees": pd.to_numeric(df.get("transaction fees", 0.0), errors="coerce").fillna(0.0),
+    }).dropna(subset=["day", "transaction type"])
+
+    aggregate = frame.groupby(AGGREGATE_KEYS, as_index=False).agg(
+        amount=("amount", "sum"), fees=("fees", "sum"), count=("amount", "size"))
+    aggregate["week start"] = aggregate["day"] - pd.to_timedelta(aggregate["day"].dt.weekday, unit="D")
+    # Labelled once per distinct week rather than once per row
+    weeks = aggregate["week start"].drop_duplicates()
+    for column, level in [("week", "Week"), ("month", "Month")]:
+        aggregate[column] = aggregate["week start"].map(pd.Series(period_labels(weeks, level).to_numpy(), index=weeks))
+    return aggregate[columns]
+
+
+def _cached_aggregate(name, source, records, currency, folder):
+    # Kept in the report folder with the version of its source, so a
+    # scheduled run over unchanged data never reads the transactions
+    key = [_file_version(source), list(rates_version() or []), currency]
+    path = os.path.join(folder, name)
+    if os.path.exists(path):
+        cached = pd.read_pickle(path)
+        if cached["key"] == key:
+            return cached["aggregate"]
+
+    records = records()
+    df = pd.DataFrame(records)
+    aggregate = build_report_aggregate(convert_frame(df, currency) if records else df)
+    os.makedirs(folder, exist_ok=True)
+    pd.to_pickle({"key": key, "aggregate": aggregate}, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return aggregate
+
+
+def load_report_aggregate(currency=BASE_CURRENCY, folder=REPORT_FOLDER):
+    """
+    The report aggregate of the hot ledger, rebuilt only when it or the FX rates change
+    """
+    return _cached_aggregate("aggregate.pkl", TRANSACTION_FILE,
+                             lambda: load_json_data(TRANSACTION_FILE) if os.path.exists(TRANSACTION_FILE) else [],
+                             currency, folder)
+
+
+def load_archive_aggregate(currency=BASE_CURRENCY, folder=REPORT_FOLDER):
+    """
+    The report aggregate of the archived partitions, rebuilt only when the archive or the FX rates change
+    """
+    return _cached_aggregate("archive_aggregate.pkl", ARCHIVE_INDEX,
+                             lambda: [row for key in load_archive_summaries() for row in load_partition(key)],
+                             currency, folder)
+
+
+def combine_aggregates(*aggregates):
+    """
+    One report aggregate from several, e.g. the archive's and the hot ledger's
+
+    A day can be in both when rows arrive for an archived period, so rows
+    with the same keys are added up.
+    """
+    frames = [aggregate for aggregate in aggregates if not aggregate.empty]
+    if len(frames) < 2:
+        return frames[0] if frames else aggregates[0]
+    keys = AGGREGATE_KEYS + ["week start", "week", "month"]
+    combined = pd.concat(frames, ignore_index=True).groupby(keys, as_index=False)[["amount", "fees", "count"]].sum()
+    return combined[list(aggregates[0].columns)]
+
+
+def _load_json(file_path):
+    # Read directly, as load_json_data flattens dicts
+    try:
+        with open(file_path) as file:
+            data = json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def period_fingerprints(aggregate, budget_index, level):
+    """
+    A fingerprint per period of everything its report shows
+
+    Rows are hashed once and summed per period, so finding the periods
+    that changed costs one pass over the aggregate, not a render each.
+
+    Returns:
+        Series: Hex fingerprint by period label
+    """
+    column = level.lower()
+    data = pd.util.hash_pandas_object(aggregate[AGGREGATE_KEYS + ["amount", "fees", "count"]], index=False)
+    prints = data.groupby(aggregate[column].to_numpy()).sum()
+    if not budget_index.empty:
+        budget_rows = pd.util.hash_pandas_object(budget_index.drop(columns="week start"), index=False)
+        budget_prints = budget_rows.groupby(period_labels(budget_index["week start"], level).to_numpy()).sum()
+        # Only periods with transactions get a report; their budget changes still count
+        prints = prints.add(budget_prints.reindex(prints.index, fill_value=0)).astype("uint64")
+    return prints.map(lambda value: f"{value:016x}")
+
+
+def _figure_html(fig):
+    fig.update_layout(margin=dict(l=20, r=20, t=50, b=20), height=380)
+    return fig.to_html(full_html=False, include_plotlyjs=False, config={"displaylogo": False})
+
+
+def _money(value, currency):
+    return f"{currency} {value:,.2f}"
+
+
+def budget_variance(rows, budget_rows, budget_rate=1.0):
+    """
+    Budgeted against spent per category over a report's weeks
+
+    Spending is amount plus fees, as on the Budget page, and only weeks with
+    a budget are counted.
+
+    Args:
+        rows (DataFrame): The period's rows of the report aggregate
+        budget_rows (DataFrame): The period's weeks from build_period_index
+        budget_rate (float): Converts shilling budgets to the report currency
+
+    Returns:
+        DataFrame: "budgeted", "spent", "variance" and "used" by category
+    """
+    categories = [column for column in budget_rows.columns
+                  if column not in ("key", "week start", "overall budget", "budgeted")]
+    budgeted = budget_rows[categories].sum() * budget_rate
+    money_out = rows[(rows["transaction type"] == "credit") & rows["week start"].isin(budget_rows["week start"])]
+    spent = (money_out["amount"] + money_out["fees"]).groupby(money_out["category"]).sum()
+
+    variance = pd.DataFrame({"budgeted": budgeted[budgeted > 0]}).join(spent.rename("spent"), how="outer")
+    variance = variance.fillna(0.0)
+    variance["variance"] = variance["budgeted"] - variance["spent"]
+    variance["used"] = variance["spent"] / variance["budgeted"].where(variance["budgeted"] > 0)
+    return variance.sort_values("spent", ascending=False)
+
+
+def render_report(kind, period, rows, budget_rows, currency, budget_rate, script):
+    """
+    One report as a standalone HTML page
+
+    Args:
+        kind (str): "weekly" or "monthly"
+        period (str): Period label, e.g. "2025-W11" or "2025-03"
+        rows (DataFrame): The period's rows of the report aggregate
+        budget_rows (DataFrame): The period's weeks from build_period_index
+        currency (str): Currency the amounts are in
+        budget_rate (float): Converts shilling budgets to that currency
+        script (str): The <script> tag that loads plotly.js
+
+    Returns:
+        str: The HTML
+    """
+    money_in = rows[rows["transaction type"] == "debit"]
+    money_out = rows[rows["transaction type"] == "credit"]
+    first, last = rows["week start"].min(), rows["week start"].max() + pd.Timedelta(days=6)
+    totals = {
+        "Money in": money_in["amount"].sum(),
+        "Money out": money_out["amount"].sum(),
+        "Fees": rows["fees"].sum(),
+    }
+    totals["Net"] = totals["Money in"] - totals["Money out"] - totals["Fees"]
+
+    # Daily bars for a week, weekly bars for a month, styled as on Honey Pot
+    step = "day" if kind == "weekly" else "week"
+    if step == "day":
+        steps = pd.Series(pd.date_range(first, last)).dt.strftime("%a %d %b")
+        keys = rows["day"].dt.strftime("%a %d %b")
+    else:
+        steps = pd.Series(sorted(rows["week"].unique()))
+        keys = rows["week"]
+    flows = rows.assign(step=keys.to_numpy()).pivot_table(index="step", columns="transaction type", values="amount",
+                                                          aggfunc="sum", fill_value=0.0)
+    flows = flows.reindex(index=steps, columns=["debit", "credit"], fill_value=0.0)
+    cashflow = go.Figure()
+    cashflow.add_trace(go.Bar(x=flows.index, y=flows["debit"], name="Income", marker_color="green"))
+    cashflow.add_trace(go.Bar(x=flows.index, y=flows["credit"], name="Expense", marker_color="red"))
+    cashflow.add_trace(go.Scatter(x=flows.index, y=flows["debit"] - flows["credit"], mode="lines+markers",
+                                  name="Net", line=dict(color="blue")))
+    cashflow.update_layout(barmode="group", title="Cashflow", yaxis_title=f"Amount ({currency})")
+    sections = [_figure_html(cashflow)]
+
+    pies = []
+    for subset, title, colours in [(money_in, "Income by Category", px.colors.sequential.Greens),
+                                   (money_out, "Expenses by Category", px.colors.sequential.Reds)]:
+        by_category = subset.groupby("category", as_index=False)["amount"].sum()
+        if by_category["amount"].sum() > 0:
+            pies.append(_figure_html(px.pie(by_category, values="amount", names="category", title=title,
+                                            color_discrete_sequence=colours)))
+    if pies:
+        sections.append('<div class="row">' + "".join(f"<div>{pie}</div>" for pie in pies) + "</div>")
+
+    sections.append("<h2>Budget Variance</h2>")
+    if budget_rows.empty:
+        sections.append("<p>No budget was set for this period.</p>")
+    else:
+        variance = budget_variance(rows, budget_rows, budget_rate)
+        chart = go.Figure()
+        chart.add_trace(go.Bar(x=variance.index, y=variance["budgeted"], name="Budgeted"))
+        chart.add_trace(go.Bar(x=variance.index, y=variance["spent"], name="Spent"))
+        chart.update_layout(barmode="group", yaxis_title=currency)
+        sections.append(_figure_html(chart))
+        overall = budget_rows["overall budget"].sum() * budget_rate
+        if overall:
+            sections.append(f"<p>Overall budget {_money(overall, currency)}, spent "
+                            f"{_money(variance['spent'].sum(), currency)}</p>")
+        sections.append(variance.rename(columns=str.capitalize).to_html(
+            formatters={"Used": "{:.0%}".format}, float_format="{:,.2f}".format, na_rep="", classes="variance"))
+
+    summary = "".join(f"<div class=\"metric\"><span>{label}</span><b>{_money(value, currency)}</b></div>"
+                      for label, value in totals.items())
+    title = f"{kind.capitalize()} report {period}"
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{escape(title)}</title>
+{script}
+<style>
+body {{ font-family: sans-serif; max-width: 1100px; margin: 2em auto; color: #222; }}
+.metrics, .row {{ display: flex; gap: 1em; }}
+.row > div {{ flex: 1; }}
+.metric {{ flex: 1; padding: 0.8em; background: #f3f6f8; border-radius: 6px; }}
+.metric span {{ display: block; font-size: 0.85em; color: #555; }}
+table.variance {{ border-collapse: collapse; }}
+table.variance td, table.variance th {{ padding: 0.3em 0.8em; text-align: right; }}
+</style>
+</head>
+<body>
+<h1>{escape(title)}</h1>
+<p>{first:%d %b %Y} to {last:%d %b %Y}, {int(rows["count"].sum())} transactions, amounts in {currency}</p>
+<div class="metrics">{summary}</div>
+{"".join(sections)}
+</body>
+</html>
+"""
+
+
+def _plotly_script(folder, standalone):
+    if standalone:
+        return f"<script>{get_plotlyjs()}</script>"
+    # One shared offline copy next to the reports instead of 3.5 MB in every file
+    name = f"plotly-{plotly.__version__}.min.js"
+    if not os.path.exists(os.path.join(folder, name)):
+        with open(os.path.join(folder, f"{name}.tmp"), "w") as file:
+            file.write(get_plotlyjs())
+        os.replace(os.path.join(folder, f"{name}.tmp"), os.path.join(folder, name))
+    return f'<script src="../{name}"></script>'
+
+
+def _write_index(folder, manifest):
+    links = []
+    for kind in REPORT_KINDS:
+        names = sorted((path for path in manifest if path.startswith(f"{kind}/")), reverse=True)
+        items = "".join(f'<li><a href="{escape(name)}">{escape(name[len(kind) + 1:-5])}</a></li>' for name in names)
+        links.append(f"<h2>{kind.capitalize()}</h2><ul>{items}</ul>")
+    with open(os.path.join(folder, "index.html"), "w") as file:
+        file.write(f'<!DOCTYPE html>\n<html lang="en">\n<head><meta charset="utf-8"><title>WET reports</title></head>\n'
+                   f'<body style="font-family: sans-serif">\n<h1>WET reports</h1>\n{"".join(links)}\n</body>\n</html>\n')
+
+
+def generate_reports(kinds=tuple(REPORT_KINDS), currency=BASE_CURRENCY, folder=REPORT_FOLDER, standalone=False,
+                     force=False, since=None, aggregate=None):
+    """
+    Render the weekly and monthly reports whose inputs changed since the last run
+
+    A manifest in the report folder keeps the fingerprint each report was
+    rendered from; a report is rendered again only when its period's
+    transactions or budgets, the currency or the layout change, or its file
+    is missing. Archived periods are reported like the rest. Reports of
+    periods that no longer have transactions are removed.
+
+    Args:
+        kinds: Any of "weekly" and "monthly"
+        currency (str): Currency to report in
+        folder (str): Where the reports are written
+        standalone (bool): Embed plotly.js in every file instead of sharing one copy
+        force (bool): Render every report
+        since (date): Leave out periods that end before this day
+        aggregate (DataFrame): The hot ledger's report aggregate already built,
+                               e.g. by the app; archived periods are added to it
+
+    Returns:
+        dict: "rendered" report paths and the number "unchanged"
+    """
+    if aggregate is None:
+        aggregate = load_report_aggregate(currency, folder)
+    # Compaction moves closed periods to the archive; their reports still stand
+    aggregate = combine_aggregates(load_archive_aggregate(currency, folder), aggregate)
+    budget_index = build_period_index(_load_json(BUDGET_FILE))
+    budget_rate = convert_amount(1.0, BASE_CURRENCY, currency)
+    manifest_path = os.path.join(folder, "manifest.json")
+    manifest = _load_json(manifest_path)
+    # Settings every report depends on
+    salt = f"{REPORT_LAYOUT}:{currency}:{budget_rate!r}:{standalone}"
+
+    rendered, unchanged = [], 0
+    for kind in kinds:
+        level = REPORT_KINDS[kind]
+        column = level.lower()
+        os.makedirs(os.path.join(folder, kind), exist_ok=True)
+        script = _plotly_script(folder, standalone)
+        fingerprints = period_fingerprints(aggregate, budget_index, level)
+        labels = period_labels(budget_index["week start"], level)
+
+        stale = [path for path in manifest if path.startswith(f"{kind}/") and path[len(kind) + 1:-5] not in fingerprints]
+        for path in stale:
+            if os.path.exists(os.path.join(folder, path)):
+                os.remove(os.path.join(folder, path))
+            del manifest[path]
+
+        groups = None
+        for period, fingerprint in fingerprints.items():
+            path = f"{kind}/{period}.html"
+            fingerprint = f"{salt}:{fingerprint}"
+            if not force and manifest.get(path) == fingerprint and os.path.exists(os.path.join(folder, path)):
+                unchanged += 1
+                continue
+            if groups is None:
+                groups = dict(tuple(aggregate.groupby(column)))
+            rows = groups[period]
+            if since is not None and rows["week start"].max() + pd.Timedelta(days=6) < pd.Timestamp(since):
+                continue
+            html = render_report(kind, period, rows, budget_index[labels == period], currency, budget_rate, script)
+            with open(os.path.join(folder, f"{path}.tmp"), "w") as file:
+                file.write(html)
+            os.replace(os.path.join(folder, f"{path}.tmp"), os.path.join(folder, path))
+            manifest[path] = fingerprint
+            rendered.append(path)
+
+    if rendered or not os.path.exists(os.path.join(folder, "index.html")):
+        save_json_data(manifest_path, manifest)
+        _write_index(folder, manifest)
+    return {"rendered": rendered, "unchanged": unchanged}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render static HTML reports of the ledger, e.g. from cron")
+    parser.add_argument("--kind", choices=list(REPORT_KINDS), action="append", help="report kind (repeatable)")
+    parser.add_argument("--currency", default=BASE_CURRENCY)
+    parser.add_argument("--folder", default=REPORT_FOLDER, help="where the reports are written")
+    parser.add_argument("--standalone", action="store_true", help="embed plotly.js in every report file")
+    parser.add_argument("--force", action="store_true", help="render every report, changed or not")
+    parser.add_argument("--since", type=pd.Timestamp, help="skip periods ending before this date")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = generate_reports(args.kind or tuple(REPORT_KINDS), args.currency.upper(), args.folder, args.standalone,
+                              args.force, args.since)
+    for path in result["rendered"]:
+        print(f"  {path}")
+    print(f"{len(result['rendered'])} report(s) rendered, {result['unchanged']} unchanged, "
+          f"in {time.perf_counter() - started:.2f}s; open {os.path.join(args.folder, 'index.html')}")
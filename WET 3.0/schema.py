@@ -0,0 +1,289 @@
+import json
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from config import BUDGET_FILE, STANDARD_COLUMNS, TRANSACTION_FILE, WET_FOLDER
+from utils import load_json_data, save_json_data
+
+QUARANTINE_FILE = os.path.join(WET_FOLDER, "quarantine.json")
+# Records which data files were last written through validation
+SCHEMA_MANIFEST = os.path.join(WET_FOLDER, "schema_manifest.json")
+# Bump when TRANSACTION_SCHEMA changes so stored files are revalidated
+SCHEMA_VERSION = 3
+
+# Canonical transaction fields: type, whether required, and default when missing.
+# "amount(kes)" keeps its historical name but is in the row's "currency".
+TRANSACTION_SCHEMA = {
+    "date": {"type": "date", "required": True},
+    "week": {"type": "int", "required": False},
+    "amount(kes)": {"type": "amount", "required": True},
+    "currency": {"type": "currency", "required": False, "default": "KES"},
+    "transaction fees": {"type": "amount", "required": False, "default": 0.0},
+    "transaction type": {"type": "transaction type", "required": True},
+    "category": {"type": "str", "required": True},
+    "subcategory": {"type": "str", "required": False, "default": ""},
+    "payment method": {"type": "str", "required": False, "default": ""},
+    "item description (money in)": {"type": "str", "required": False, "default": ""},
+    "item description (money out)": {"type": "str", "required": False, "default": ""},
+    # External reference such as an M-Pesa transaction code, used to skip duplicate imports
+    "reference": {"type": "str", "required": False, "default": ""},
+}
+
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]00:00(?::00)?)?")
+
+# Accepted spellings of the two transaction types
+TRANSACTION_TYPES = {
+    "debit": "debit",
+    "money in": "debit",
+    "money in (debit)": "debit",
+    "credit": "credit",
+    "money out": "credit",
+    "money out (credit)": "credit",
+}
+
+# Legacy column spellings seen in older files and CSV exports
+COLUMN_ALIASES = {
+    **STANDARD_COLUMNS,
+    "amount (kes)": "amount(kes)",
+    "Amount (Kes)": "amount(kes)",
+    "Transaction type": "transaction type",
+}
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, float) and pd.isna(value)) or str(value).strip() == ""
+
+
+def _coerce(value, field_type):
+    if field_type == "date":
+        # Form, import and API dates are already ISO; skip the pandas parser for those
+        if isinstance(value, str) and ISO_DATE.fullmatch(value.strip()):
+            try:
+                return datetime.strptime(value.strip()[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"invalid date {value!r}")
+        parsed = pd.to_datetime(value, errors="coerce")
+        if pd.isna(parsed):
+            raise ValueError(f"invalid date {value!r}")
+        return parsed.strftime("%Y-%m-%d")
+    if field_type == "amount":
+        amount = float(value)
+        if pd.isna(amount) or amount < 0:
+            raise ValueError(f"invalid amount {value!r}")
+        return round(amount, 2)
+    if field_type == "int":
+        return int(value)
+    if field_type == "currency":
+        code = str(value).strip().upper()
+        if len(code) != 3 or not code.isalpha():
+            raise ValueError(f"invalid currency code {value!r}")
+        return code
+    if field_type == "transaction type":
+        key = str(value).strip().lower()
+        if key not in TRANSACTION_TYPES:
+            raise ValueError(f"unknown transaction type {value!r}")
+        return TRANSACTION_TYPES[key]
+    if isinstance(value, (list, dict)):
+        raise ValueError(f"expected text, got {type(value).__name__}")
+    return str(value).strip()
+
+
+def validate_transaction(record):
+    """
+    Coerce a raw transaction into the canonical schema
+
+    Args:
+        record (dict): Transaction from the form, an import or an older file
+
+    Returns:
+        tuple: (clean transaction dict or None, list of error messages)
+    """
+    if not isinstance(record, dict):
+        return None, [f"expected a transaction object, got {type(record).__name__}"]
+
+    record = {COLUMN_ALIASES.get(str(key).strip(), str(key).strip()): value for key, value in record.items()}
+    clean, errors = {}, []
+    for field, spec in TRANSACTION_SCHEMA.items():
+        value = record.get(field)
+        if _is_blank(value):
+            if spec["required"]:
+                errors.append(f"missing {field}")
+            elif "default" in spec:
+                clean[field] = spec["default"]
+            continue
+        try:
+            clean[field] = _coerce(value, spec["type"])
+        except (TypeError, ValueError) as e:
+            errors.append(f"{field}: {e}")
+
+    if errors:
+        return None, errors
+
+    # Week is always derived from the date so the two cannot disagree
+    clean["week"] = datetime.strptime(clean["date"], "%Y-%m-%d").isocalendar()[1]
+    return {field: clean[field] for field in TRANSACTION_SCHEMA}, []
+
+
+def validate_transactions(records):
+    """
+    Validate a batch of transactions, collecting every error instead of stopping at the first
+
+    Args:
+        records (list): Raw transactions
+
+    Returns:
+        tuple: (list of clean transactions, list of rejected {"row", "record", "errors"})
+    """
+    valid, rejected = [], []
+    for row, record in enumerate(records):
+        clean, errors = validate_transaction(record)
+        if errors:
+            rejected.append({"row": row, "record": record, "errors": errors})
+        else:
+            valid.append(clean)
+    return valid, rejected
+
+
+def validate_budgets(budgets):
+    """
+    Validate the budgets mapping of period key to overall budget and items
+
+    Budget items are normalised to "category", "subcategory" and "amount".
+
+    Args:
+        budgets: Parsed budgets file contents
+
+    Returns:
+        tuple: (clean budgets dict, list of rejected {"row", "record", "errors"})
+    """
+    if not isinstance(budgets, dict):
+        return {}, [{"row": None, "record": budgets, "errors": ["budgets must be an object keyed by period"]}]
+
+    clean, rejected = {}, []
+    for period, data in budgets.items():
+        if not isinstance(data, dict):
+            rejected.append({"row": period, "record": data, "errors": ["period must be an object"]})
+            continue
+        try:
+            overall = _coerce(data.get("overall_budget") or 0, "amount")
+        except (TypeError, ValueError) as e:
+            rejected.append({"row": period, "record": data, "errors": [f"overall_budget: {e}"]})
+            continue
+
+        items = []
+        for item in data.get("items", []):
+            amount = item.get("amount", item.get("amount (kes)")) if isinstance(item, dict) else None
+            try:
+                if _is_blank(item.get("category")):
+                    raise ValueError("missing category")
+                items.append({
+                    "category": str(item["category"]).strip(),
+                    "subcategory": "" if _is_blank(item.get("subcategory")) else str(item["subcategory"]).strip(),
+                    "amount": _coerce(0 if _is_blank(amount) else amount, "amount"),
+                })
+            except (AttributeError, TypeError, ValueError) as e:
+                rejected.append({"row": period, "record": item, "errors": [str(e)]})
+        clean[period] = {"overall_budget": overall, "items": items}
+    return clean, rejected
+
+
+def quarantine_records(source, rejected):
+    """
+    Append rejected records to the quarantine side file for later review
+
+    Args:
+        source (str): Where the records came from, e.g. a file path or "import"
+        rejected (list): Rejections from validate_transactions or validate_budgets
+    """
+    if not rejected:
+        return
+    quarantined = load_json_data(QUARANTINE_FILE)
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    quarantined.extend({"source": source, "quarantined_at": timestamp, **item} for item in rejected)
+    save_json_data(QUARANTINE_FILE, quarantined)
+
+
+def _file_version(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size, SCHEMA_VERSION]
+
+
+def _load_manifest():
+    if not os.path.exists(SCHEMA_MANIFEST):
+        return {}
+    try:
+        with open(SCHEMA_MANIFEST, "r") as file:
+            return json.load(file)
+    except json.JSONDecodeError:
+        return {}
+
+
+def save_validated(file_path, data):
+    """
+    Write already validated data and mark the file as trusted
+
+    Readers can skip validation while the file is unchanged since this write.
+    """
+    save_json_data(file_path, data)
+    mark_validated(file_path)
+
+
+def mark_validated(file_path):
+    """
+    Record the current version of a file its writer has just validated
+    """
+    manifest = _load_manifest()
+    manifest[file_path] = _file_version(file_path)
+    save_json_data(SCHEMA_MANIFEST, manifest)
+
+
+def is_validated(file_path):
+    """
+    True if the file is unchanged since it was last written through the current schema
+    """
+    return os.path.exists(file_path) and _load_manifest().get(file_path) == _file_version(file_path)
+
+
+def ensure_valid_file(file_path, kind="transactions"):
+    """
+    Validate a data file that was written outside this layer
+
+    Bad rows are quarantined and the file is rewritten in canonical form.
+    This is a single stat call when the file is already trusted.
+
+    Args:
+        file_path (str): Data file to check
+        kind (str): "transactions" or "budgets"
+
+    Returns:
+        list: Rejections moved to quarantine, empty if none
+    """
+    if not os.path.exists(file_path) or is_validated(file_path):
+        return []
+
+    try:
+        with open(file_path, "r") as file:
+            raw = json.load(file) if os.path.getsize(file_path) else None
+    except json.JSONDecodeError as e:
+        # Leave unreadable files untouched rather than overwrite them
+        return [{"row": None, "record": None, "errors": [f"unreadable JSON: {e}"]}]
+
+    if kind == "budgets":
+        clean, rejected = validate_budgets({} if raw is None else raw)
+    else:
+        if isinstance(raw, dict):
+            raw = list(raw.values())
+        clean, rejected = validate_transactions(raw or [])
+
+    quarantine_records(file_path, rejected)
+    save_validated(file_path, clean)
+    return rejected
+
+
+if __name__ == "__main__":
+    for path, kind in [(TRANSACTION_FILE, "transactions"), (BUDGET_FILE, "budgets")]:
+        problems = ensure_valid_file(path, kind)
+        print(f"{path}: {len(problems)} record(s) quarantined")
@@ -0,0 +1,192 @@
+import re
+from bisect import bisect_left, insort
+
+import numpy as np
+import streamlit as st
+
+from history import events_since, history_seq
+
+# Transaction fields that are searchable
+SEARCH_FIELDS = [
+    "item description (money in)",
+    "item description (money out)",
+    "subcategory",
+    "payment method",
+]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Joiners dropped before splitting so "M-Pesa" and "mpesa" match
+JOINER_PATTERN = re.compile(r"[-'.]")
+
+
+def tokenize(text):
+    """
+    Split free text into lowercase alphanumeric tokens
+    """
+    return TOKEN_PATTERN.findall(JOINER_PATTERN.sub("", str(text).lower()))
+
+
+def _transaction_tokens(transaction):
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        value = transaction.get(field)
+        if value:
+            tokens.update(tokenize(value))
+    return tokens
+
+
+def build_search_index(transactions):
+    """
+    Build an inverted index over the searchable transaction fields
+
+    Args:
+        transactions (list): Transaction dicts as stored in the JSON file
+
+    Returns:
+        dict: "postings" mapping token to ascending row positions, the sorted
+              "vocab" used for prefix lookups and the number of "rows" indexed
+    """
+    index = {"postings": {}, "vocab": [], "rows": 0}
+    add_to_search_index(index, transactions)
+    return index
+
+
+def add_to_search_index(index, transactions):
+    """
+    Index the rows appended since the index was last updated
+
+    Args:
+        index (dict): Search index from build_search_index
+        transactions (list): The full transactions list, old rows included
+    """
+    postings = index["postings"]
+    for row in range(index["rows"], len(transactions)):
+        for token in _transaction_tokens(transactions[row]):
+            if token not in postings:
+                postings[token] = []
+                insort(index["vocab"], token)
+            postings[token].append(row)
+    index["rows"] = len(transactions)
+
+
+def reindex_transaction(index, row, old_transaction, new_transaction):
+    """
+    Move an edited row to its new tokens
+
+    Args:
+        index (dict): Search index from build_search_index
+        row (int): Position of the edited transaction
+        old_transaction (dict): The transaction before the edit
+        new_transaction (dict): The transaction after the edit
+    """
+    old_tokens = _transaction_tokens(old_transaction)
+    new_tokens = _transaction_tokens(new_transaction)
+    postings = index["postings"]
+
+    for token in old_tokens - new_tokens:
+        postings[token].remove(row)
+        if not postings[token]:
+            del postings[token]
+            index["vocab"].pop(bisect_left(index["vocab"], token))
+    for token in new_tokens - old_tokens:
+        if token not in postings:
+            postings[token] = []
+            insort(index["vocab"], token)
+        insort(postings[token], row)
+
+
+def _prefix_matches(index, prefix):
+    vocab = index["vocab"]
+    start = bisect_left(vocab, prefix)
+    end = bisect_left(vocab, prefix + "\uffff")
+    if end - start == 1:
+        return np.asarray(index["postings"][vocab[start]], dtype="int64")
+    matches = [index["postings"][token] for token in vocab[start:end]]
+    if not matches:
+        return np.empty(0, dtype="int64")
+    return np.unique(np.concatenate(matches))
+
+
+def search_transactions(index, query):
+    """
+    Find transactions matching every term of a query
+
+    Each term matches any token it is a prefix of, so "nai mpe" finds a
+    "Naivas" purchase paid with M-Pesa.
+
+    Args:
+        index (dict): Search index from build_search_index
+        query (str): Free text query
+
+    Returns:
+        ndarray: Ascending row positions of matching transactions
+    """
+    terms = tokenize(query)
+    if not terms:
+        return np.arange(index["rows"])
+
+    # Intersect the rarest terms first to keep the candidate set small
+    hits = sorted((_prefix_matches(index, term) for term in set(terms)), key=len)
+    result = hits[0]
+    for rows in hits[1:]:
+        if not len(result):
+            break
+        result = np.intersect1d(result, rows, assume_unique=True)
+    return result
+
+
+def get_search_index(transactions, version):
+    """
+    Return the session's search index, rebuilt whenever the ledger was changed other than by this session
+
+    Args:
+        transactions (list): Transaction dicts as stored in the JSON file
+        version: Any value that changes whenever the ledger file changes
+
+    Returns:
+        dict: Search index from build_search_index
+    """
+    cached = st.session_state.get("search_index")
+    if cached is None or cached["version"] != version:
+        cached = {"version": version, "seq": history_seq("transactions", version),
+                  "index": build_search_index(transactions)}
+        st.session_state.search_index = cached
+    return cached["index"]
+
+
+def _follow_local_change(version):
+    """
+    The session's cached index if this session's save is the only change since it was built
+
+    Otherwise the cache is dropped, so the next search rebuilds it.
+    """
+    cached = st.session_state.get("search_index")
+    if cached is None:
+        return None
+    events = [] if cached["seq"] is None else events_since("transactions", cached["seq"])
+    seq = history_seq("transactions", version)
+    if len(events) != 1 or seq != events[0]["seq"]:
+        del st.session_state["search_index"]
+        return None
+    cached["version"], cached["seq"] = version, seq
+    return cached
+
+
+def sync_search_index(transactions, version):
+    """
+    Index rows appended by a save or import in this session
+
+    Nothing is built if the session has not searched yet.
+    """
+    cached = _follow_local_change(version)
+    if cached is not None:
+        add_to_search_index(cached["index"], transactions)
+
+
+def record_search_edit(row, old_transaction, new_transaction, version):
+    """
+    Apply an in-place edit made in this session to its search index
+    """
+    cached = _follow_local_change(version)
+    if cached is not None and cached["index"]["rows"] > row:
+        reindex_transaction(cached["index"], row, old_transaction, new_transaction)
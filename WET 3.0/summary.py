@@ -0,0 +1,54 @@
+import pandas as pd
+
+from fx import convert_frame, rates_version
+from goals import savings_contributions
+
+
+def summarise_ledger(df):
+    """
+    Totals and per-category breakdowns shown in the Home sidebar
+
+    Args:
+        df (DataFrame): Transactions in the reporting currency
+
+    Returns:
+        dict: "inflow", "outflow" and "saved" totals, and "expenses" and
+              "income" Series of amounts by (lower-cased) category
+    """
+    amounts = pd.to_numeric(df["amount(kes)"], errors="coerce")
+    valid = amounts.notna()
+    types = df["transaction type"].astype(str).str.strip().str.lower()[valid]
+    categories = df["category"].astype(str).str.strip().str.lower()[valid]
+    contributions = savings_contributions(df)[valid]
+    amounts = amounts[valid]
+
+    money_in = types.str.contains("debit|money in", na=False)
+    money_out = types.str.contains("credit|money out", na=False)
+
+    return {
+        "inflow": float(amounts[money_in].sum()),
+        "outflow": float(amounts[money_out].sum()),
+        # Net of withdrawals, including Sacco, Chama, MMF and Mshwari entries
+        "saved": float(contributions.sum()),
+        "expenses": amounts[money_out].groupby(categories[money_out]).sum(),
+        "income": amounts[money_in].groupby(categories[money_in]).sum(),
+    }
+
+
+def get_ledger_summary(ledger, currency):
+    """
+    The sidebar summary of a ledger snapshot, computed once per data version
+
+    The result depends only on the snapshot, the reporting currency and the
+    FX rate file, so it is kept on the shared snapshot under that key and
+    reused by every session and rerun until one of them changes.
+
+    Args:
+        ledger (LedgerSnapshot): Current ledger snapshot
+        currency (str): Reporting currency
+
+    Returns:
+        dict: Summary from summarise_ledger
+    """
+    return ledger.derived(("summary", currency, rates_version()),
+                          lambda records: summarise_ledger(convert_frame(ledger.frame(), currency)))
@@ -1,5 +1,6 @@
 import json
 import os
+import tempfile
 import streamlit as st
 from config import CATEGORY_FILE, TRANSACTION_FILE, BUDGET_FILE
 
@@ -18,8 +19,15 @@ def load_json_data(file_path):
 
 def save_json_data(file_path, data):
     try:
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
+        # Write a temporary file of this writer's own and swap it in, so readers never see a partial file
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(data, file, indent=4)
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
     except Exception as e:
         st.error(f"Error saving data to {file_path}: {str(e)}")
 
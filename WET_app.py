@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import copy
 import json
 import os
+import sys
+import tempfile
 import plotly.express as px
 import plotly.graph_objects as go
 
@@ -12,6 +16,36 @@ from datetime import datetime
 WET_FOLDER = "WET 3.0"
 os.makedirs(WET_FOLDER, exist_ok=True)
 
+# Helper modules live in the WET 3.0 folder next to this script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), WET_FOLDER))
+from networth import (RESOLUTIONS, balance_between, balance_on, get_networth_cache, networth_series,  # noqa: E402
+                      with_archived)
+from browser import SORT_OPTIONS, build_ledger_index, fetch_page, get_ledger_index, query_ledger_index  # noqa: E402
+from search import (build_search_index, get_search_index, record_search_edit, search_transactions,  # noqa: E402
+                    sync_search_index)
+from anomaly import current_anomalies, refresh_anomalies  # noqa: E402
+from backup import create_backup, list_backups  # noqa: E402
+from reports import REPORT_FOLDER, build_report_aggregate, generate_reports  # noqa: E402
+from archive import (archive_path, archived_flows, archived_totals, compact_ledger, load_archive_summaries,  # noqa: E402
+                     load_partition)
+from ledger import append_transactions, ledger_as_of, ledger_snapshot, replace_transaction  # noqa: E402
+from household import consolidate, ledger_file, load_household, save_household  # noqa: E402
+from history import HistoryConflict, commit, history_start, redo, undo, undo_labels  # noqa: E402
+from summary import get_ledger_summary  # noqa: E402
+from forecast import FORECAST_HORIZONS, forecast_totals, get_forecast  # noqa: E402
+from goals import (create_goal, get_weekly_savings, load_goals, project_goals, save_goals,  # noqa: E402
+                   savings_contributions)
+from recurring import (SCHEDULES, create_recurring, load_recurring, materialise_due, project_recurring,  # noqa: E402
+                       save_recurring)
+from cube import CUBE_DIMENSIONS, get_cube, slice_cube  # noqa: E402
+from fx import (BASE_CURRENCY, add_rate, available_currencies, convert_amount, convert_frame,  # noqa: E402
+                load_rate_table, rates_version, rows_without_rate)
+from mpesa import import_mpesa, text_lines  # noqa: E402
+from periods import (PERIOD_LEVELS, budget_rollup, get_weekly_spending, load_period_index,  # noqa: E402
+                     period_key_for)
+from schema import (ensure_valid_file, quarantine_records, validate_budgets,  # noqa: E402
+                    validate_transaction)
+
 # File paths
 CATEGORY_FILE = os.path.join(WET_FOLDER, "categories.json")
 TRANSACTION_FILE = os.path.join(WET_FOLDER, "saved_transactions.json")
@@ -33,7 +67,7 @@ STANDARD_COLUMNS = {
 }
 # Define the expected export column order
 EXPORT_COLUMNS = [
-    "date", "week", "amount(kes)", "transaction fees", "transaction type",
+    "date", "week", "amount(kes)", "currency", "transaction fees", "transaction type",
     "category", "subcategory", "payment method",
     "item description (money in)", "item description (money out)"
 ]
@@ -47,6 +81,17 @@ for file_path in [TRANSACTION_JSON, BUDGET_FILE, CATEGORY_FILE]:
             f"Transaction file: {os.path.exists(TRANSACTION_JSON)},"
             f"Size: {os.path.getsize(TRANSACTION_JSON)} bytes")
 
+# Validate files written outside the app; files already trusted cost one stat call
+for file_path, kind in [(TRANSACTION_FILE, "transactions"), (BUDGET_FILE, "budgets")]:
+    rejected_records = ensure_valid_file(file_path, kind)
+    if rejected_records:
+        st.sidebar.warning(f"{len(rejected_records)} invalid record(s) in {file_path} moved to quarantine")
+
+# Write recurring transactions that fell due since the last visit in one batch
+added_recurring = materialise_due()
+if added_recurring:
+    st.sidebar.info(f"Added {added_recurring} recurring transaction(s)")
+
 # Initialize categories if not already set
 if "categories" not in st.session_state:
     st.session_state.categories = {
@@ -68,6 +113,12 @@ if "categories" not in st.session_state:
     }
 
 dark_mode = st.sidebar.checkbox("🌙 Dark Mode", value=False)
+# All summaries, charts and budgets are shown in this currency
+reporting_currency = st.sidebar.selectbox(
+    "Reporting currency",
+    [BASE_CURRENCY] + sorted(set(load_rate_table()["currency"]) - {BASE_CURRENCY}),
+    key="reporting_currency"
+)
 if not dark_mode:
     st.markdown("""
         <style>
@@ -109,7 +160,7 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("<div style='margin-bottom: 10px'></div>", unsafe_allow_html=True)
 
-    col1, col2, col3 = st.columns([2, 1, 2])
+    col1, col2, col3, col4, col5 = st.columns([2, 1, 2, 2, 2])
     with col1:
         if st.button("HOME"):
             st.session_state.page = "Home"
@@ -119,6 +170,12 @@ with st.sidebar:
     with col3:
         if st.button("HONEY POT"):
             st.session_state.page = "Honey Pot"
+    with col4:
+        if st.button("HISTORY"):
+            st.session_state.page = "Transactions"
+    with col5:
+        if st.button("HOUSEHOLD"):
+            st.session_state.page = "Household"
 
     st.markdown("<div style='margin-bottom: 20px'></div>", unsafe_allow_html=True)
 
@@ -265,12 +322,6 @@ def load_expense_categories():
             }
             with open(CATEGORY_FILE, "w") as f:
                 json.dump(st.session_state.categories, f, indent=4)
-def save_transaction(transaction):
-    # Initialize 'transactions' as a list if it doesn't exist or is misconfigured
-    if 'transactions' not in st.session_state or not isinstance(st.session_state['transactions'], list):
-        st.session_state['transactions'] = []
-    # Append the new transaction
-    st.session_state['transactions'].append(transaction)
 def load_json_data(file_path=TRANSACTION_FILE):
     if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
         return []
@@ -290,10 +341,25 @@ def save_json_data(file_path, data):
     Save data to a JSON file
     """
     try:
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
+        # Write a temporary file of this writer's own and swap it in, so readers never see a partial file
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(data, file, indent=4)
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
     except Exception as e:
         st.error(f"Error saving data to {file_path}: {str(e)}")
+def get_file_version(file_path):
+    """
+    Cheap fingerprint of a data file used to invalidate cached indexes
+    """
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
 def load_budgets_from_file():
     if os.path.exists(BUDGET_FILE):
         with open(BUDGET_FILE, "r") as f:
@@ -317,13 +383,44 @@ def create_budget():
             new_item = {
                 'category': category,
                 'subcategory': selected_subcategory,
-                'amount (kes)': amount
+                'amount': amount
             }
             period_data['items'].append(new_item)
             st.success("Budget item added!")
-def save_budgets():
-    with open(BUDGET_FILE, "w") as f:
-        json.dump(st.session_state.budgets, f, indent=4)
+
+
+def save_budgets(period_key, label="Edit budgets"):
+    """
+    Validate and save the session's edit of one budget week
+
+    The edit is saved as the change from the week as the page last showed
+    it, applied to budgets.json as it is now, so weeks other sessions saved
+    meanwhile are kept and a save over theirs is refused.
+
+    Returns:
+        bool: False if the week was changed in another session since it was shown
+    """
+    base = dict(st.session_state.budgets)
+    if st.session_state.get("budget_week_base") is None:
+        base.pop(period_key, None)
+    else:
+        base[period_key] = st.session_state.budget_week_base
+    budgets, rejected = validate_budgets({**base, period_key: st.session_state.budgets[period_key]})
+    if rejected:
+        quarantine_records("budget editor", rejected)
+        st.warning(f"{len(rejected)} invalid budget item(s) were not saved: "
+                   + "; ".join(", ".join(item["errors"]) for item in rejected))
+    try:
+        budgets = commit("budgets", budgets, base=base, label=label)
+    except HistoryConflict:
+        st.error("This week's budget was changed in another session; it was not saved. "
+                 "Reload the page to edit the current version.")
+        return False
+    st.session_state.budgets = budgets
+    st.session_state.budget_week_seen = (period_key, copy.deepcopy(budgets.get(period_key)))
+    return True
+
+
 def deduplicate_columns(columns):
     seen = {}
     new_cols = []
@@ -346,55 +443,32 @@ def classify_transaction_type(row):
     else:
         return 'Unknown'
 
-# Load transactions from file
-transactions = load_json_data(TRANSACTION_FILE)
+# The parsed ledger is shared by every session and replaced whenever the file changes
+transactions = ledger_snapshot().records
+st.session_state.rendered_ledger_version = get_file_version(TRANSACTION_FILE)
+
+
+@st.fragment(run_every="5s")
+def ledger_watcher():
+    """
+    Rerun the page when the ledger is written outside this session, e.g. by the ingest service
+    """
+    if get_file_version(TRANSACTION_FILE) != st.session_state.get("rendered_ledger_version"):
+        st.rerun(scope="app")
+
+
+ledger_watcher()
 
 def export_transactions_to_csv():
-    # Load transactions from file
-    transactions = load_json_data(TRANSACTION_FILE)
+    ledger = ledger_snapshot()
 
     # Warn if none found
-    if not transactions:
+    if not ledger.records:
         st.warning("No transactions found to export.")
         return
 
-    # Convert to DataFrame and standardize
-    df = pd.DataFrame(transactions)
-    df = standardize_columns(df)
-
-    # Use the predefined EXPORT_COLUMNS instead of redefining
-    desired_order = EXPORT_COLUMNS
-
-    # Ensure all columns from desired_order exist
-    for col in desired_order:
-        if col not in df.columns:
-            if "description" in col or col == "payment method":
-                df[col] = ""
-            elif col == "date":
-                df[col] = pd.NaT
-            elif col == "week":
-                # Will be calculated from date below
-                continue
-            else:
-                df[col] = 0.0
-
-    # Calculate week from date if date exists
-    if "date" in df.columns:
-        # Convert to datetime first
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        # Calculate week number (ISO week)
-        df["week"] = df["date"].dt.isocalendar().week
-        # Format the date column as string
-        df["date"] = df["date"].dt.strftime("%Y-%m-%d")
-    else:
-        # If no date column, create empty week column
-        df["week"] = ""
-
-    # Handle case where week calculation failed for some rows
-    df["week"] = df["week"].fillna("").astype(str)
-
-    # Reorder columns safely
-    df = df[desired_order]
+    # Stored transactions are schema-validated, so every export column is present
+    df = ledger.frame()[EXPORT_COLUMNS]
 
     # Convert to CSV
     csv_data = df.to_csv(index=False)
@@ -408,31 +482,61 @@ def export_transactions_to_csv():
     )
 
 
-# Main page logic
-if st.session_state.page == "Home":
-    st.title("Transaction Log")
-    st.write("Record your week's expenditure and income.")
-    st.markdown("---")
+def flash(key, kind, message):
+    """
+    Queue a message to show after the rerun that follows a save
+    """
+    st.session_state.setdefault(key, []).append((kind, message))
+def show_flash(key):
+    for kind, message in st.session_state.pop(key, []):
+        getattr(st, kind)(message)
 
-    # Load all categories and subcategories
-    all_categories = load_categories()
 
-    # Get main categories for the dropdown
-    if isinstance(all_categories, dict):
-        main_categories = sorted(list(all_categories.keys()))
-    else:
-        # If all_categories is a list, extract keys from the dictionaries in the list
-        main_categories = []
-        for item in all_categories:
-            if isinstance(item, dict):
-                main_categories.extend(item.keys())
-        main_categories = sorted(list(set(main_categories)))  # Remove duplicates
+def warn_missing_rates(ledger, currency, archived=0):
+    """
+    Warn in the sidebar about transactions left out of totals for want of an exchange rate
 
-    # Load income categories from file
-    income_categories = sorted(load_income_categories())
+    Args:
+        ledger: LedgerSnapshot whose rows are converted
+        currency (str): Reporting currency
+        archived (int): Archived rows that had no rate when they were closed
+    """
+    missing = ledger.derived(("rows without rate", currency, rates_version()),
+                             lambda records: rows_without_rate(ledger.frame(), currency) if records else {})
+    for code, count in missing.items():
+        st.sidebar.warning(f"{count:,} {code} transaction(s) have no exchange rate to {currency} "
+                           "and are left out of the totals; add a rate under Exchange Rates")
+    if archived:
+        st.sidebar.warning(f"{archived:,} archived transaction(s) had no exchange rate when they were archived "
+                           "and are left out of the totals")
 
-    payment_methods = ["Cash", "M-Pesa", "Bank Transfer", "Credit Card", "Debit Card", "Other"]
 
+def history_controls(store, key):
+    """
+    Undo and redo buttons for the recorded changes to a store
+    """
+    show_flash(f"{key}_history")
+    undo_label, redo_label = undo_labels(store)
+    col1, col2 = st.columns(2)
+    try:
+        if col1.button(f"Undo: {undo_label}" if undo_label else "Undo", key=f"undo_{key}",
+                       disabled=undo_label is None):
+            flash(f"{key}_history", "success", f"Undone: {undo(store)}")
+            st.rerun()
+        if col2.button(f"Redo: {redo_label}" if redo_label else "Redo", key=f"redo_{key}",
+                       disabled=redo_label is None):
+            flash(f"{key}_history", "success", f"Redone: {redo(store)}")
+            st.rerun()
+    except HistoryConflict as e:
+        st.error(f"Could not replay the change: {e}")
+
+
+@st.fragment
+def transaction_entry(main_categories, income_categories, payment_methods):
+    """
+    The transaction form; Select buttons rerun only this fragment
+    """
+    show_flash("transaction_messages")
     with st.form(key="expense_form"):
         if "edit_index" not in st.session_state:
             st.session_state.edit_index = None
@@ -440,7 +544,9 @@ if st.session_state.page == "Home":
         transaction_type = st.selectbox("Transaction type", ["Money in (debit)", "Money out (credit)"])
         select_transaction_type = st.form_submit_button("Select")
         date = st.date_input("Transaction Date", value=datetime.today())
-        amount = st.number_input("Amount(Kes)", min_value=0.0, format="%.2f")
+        amount = st.number_input("Amount", min_value=0.0, format="%.2f")
+        currency = st.selectbox("Currency", available_currencies(),
+                                index=available_currencies().index(BASE_CURRENCY))
         transaction_fees = st.number_input("Transaction Fees", min_value=0.0, format="%.2f", value=0.0)
         payment_method = st.selectbox("Payment Method", payment_methods)
 
@@ -477,16 +583,12 @@ if st.session_state.page == "Home":
                     st.error("Please select a subcategory.")
                 else:
                     week = date.isocalendar()[1]
-                    transactions = load_json_data(TRANSACTION_FILE)
 
-                    # Ensure transactions is a list
-                    if not isinstance(transactions, list):
-                        transactions = []
-
-                    transaction = {
+                    transaction, errors = validate_transaction({
                         "date": date.strftime("%Y-%m-%d"),
                         "week": week,
                         "amount(kes)": amount,
+                        "currency": currency,
                         "transaction fees": transaction_fees,
                         "transaction type": "debit" if transaction_type == "Money in (debit)" else "credit",
                         "category": category_value,
@@ -494,105 +596,257 @@ if st.session_state.page == "Home":
                         "payment method": payment_method,
                         "item description (money in)": item_description if transaction_type == "Money in (debit)" else "",
                         "item description (money out)": item_description if transaction_type == "Money out (credit)" else ""
-                    }
-
-                    transactions.append(transaction)
-                    save_json_data(TRANSACTION_FILE, transactions)
-                    st.success("Transaction saved successfully!")
+                    })
+
+                    if errors:
+                        st.error("Transaction not saved: " + "; ".join(errors))
+                    else:
+                        saved = append_transactions([transaction], label=f"Add {category_value} transaction")
+                        sync_search_index(saved.records, get_file_version(TRANSACTION_FILE))
+                        flash("transaction_messages", "success", "Transaction saved successfully!")
+                        if currency not in set(load_rate_table()["currency"]) | {BASE_CURRENCY}:
+                            flash("transaction_messages", "warning",
+                                  f"No exchange rate for {currency} yet; add one on Honey Pot to include it "
+                                  "in summaries.")
+                        # The data changed, so rerun the whole page to refresh the summary
+                        st.rerun()
 
             except Exception as e:
                 st.error(f"An error occurred: {e}")
 
 
+@st.fragment
+def recurring_entry(main_categories, income_categories, payment_methods):
+    """
+    Recurring transactions, which are written automatically when they fall due
+    """
+    with st.expander("Recurring Transactions"):
+        with st.form(key="recurring_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                recurring_name = st.text_input("Name", placeholder="e.g. Rent")
+                recurring_schedule = st.selectbox("Repeats", list(SCHEDULES), index=3)
+                recurring_start = st.date_input("First occurrence", value=datetime.today())
+                recurring_end = st.date_input("Last occurrence (optional)", value=None)
+                recurring_type = st.selectbox("Transaction type", ["Money in (debit)", "Money out (credit)"],
+                                              index=1, key="recurring_type")
+            with col2:
+                recurring_amount = st.number_input("Amount", min_value=0.0, format="%.2f", key="recurring_amount")
+                recurring_currency = st.selectbox("Currency", available_currencies(),
+                                                  index=available_currencies().index(BASE_CURRENCY),
+                                                  key="recurring_currency")
+                recurring_fees = st.number_input("Transaction Fees", min_value=0.0, format="%.2f",
+                                                 key="recurring_fees")
+                recurring_category = st.selectbox("Category", main_categories + income_categories,
+                                                  key="recurring_category")
+                recurring_subcategory = st.text_input("Sub Category", key="recurring_subcategory")
+                recurring_payment = st.selectbox("Payment Method", payment_methods, key="recurring_payment")
+
+            if st.form_submit_button("Add Recurring Transaction"):
+                is_income = recurring_type == "Money in (debit)"
+                definition, errors = create_recurring(
+                    recurring_name or recurring_category,
+                    recurring_schedule,
+                    recurring_start,
+                    {
+                        "amount(kes)": recurring_amount,
+                        "currency": recurring_currency,
+                        "transaction fees": recurring_fees,
+                        "transaction type": "debit" if is_income else "credit",
+                        "category": recurring_category,
+                        "subcategory": recurring_subcategory,
+                        "payment method": recurring_payment,
+                        "item description (money in)": recurring_name if is_income else "",
+                        "item description (money out)": "" if is_income else recurring_name,
+                    },
+                    recurring_end
+                )
+                if errors:
+                    st.error("Recurring transaction not saved: " + "; ".join(errors))
+                else:
+                    save_recurring(load_recurring() + [definition])
+                    st.success(f"{definition['name']} will repeat {recurring_schedule.lower()}")
+                    st.rerun()
+
+        recurring_definitions = load_recurring()
+        if recurring_definitions:
+            st.dataframe(pd.DataFrame([{
+                "name": d["name"],
+                "repeats": d["schedule"],
+                "amount(kes)": d["template"]["amount(kes)"],
+                "category": d["template"]["category"],
+                "from": d["start_date"],
+                "until": d["end_date"] or "",
+            } for d in recurring_definitions]))
+
+            col1, col2 = st.columns([3, 1])
+            remove_id = col1.selectbox("Stop a recurring transaction", [d["id"] for d in recurring_definitions],
+                                       format_func=lambda i: next(d["name"] for d in recurring_definitions
+                                                                  if d["id"] == i))
+            if col2.button("Stop"):
+                save_recurring([d for d in recurring_definitions if d["id"] != remove_id])
+                st.rerun()
+
+            # Projections are generated on demand and never written to the ledger
+            today = pd.Timestamp(datetime.today()).normalize()
+            upcoming = project_recurring(today + pd.Timedelta(days=1), today + pd.Timedelta(days=30),
+                                         recurring_definitions)
+            st.caption("Upcoming in the next 30 days")
+            if upcoming.empty:
+                st.info("Nothing due in the next 30 days")
+            else:
+                st.dataframe(upcoming[["date", "name", "transaction type", "amount(kes)", "category"]])
 
 
+@st.fragment
+def mpesa_import():
+    """
+    Bulk import from M-Pesa confirmation messages or a statement export
+    """
+    with st.expander("Import M-Pesa"):
+        show_flash("mpesa_messages")
+        mpesa_text = st.text_area("Paste M-Pesa messages", height=150, key="mpesa_text")
+        mpesa_statement = st.file_uploader("Or upload an M-Pesa statement (CSV)", type=["csv"],
+                                           key="mpesa_statement")
+        if st.button("Import M-Pesa Transactions"):
+            if mpesa_statement is not None:
+                result = import_mpesa(text_lines(mpesa_statement), kind="statement")
+            elif mpesa_text.strip():
+                result = import_mpesa(mpesa_text.splitlines(), kind="sms")
+            else:
+                result = None
+                st.warning("Paste some messages or upload a statement first.")
+
+            if result is not None:
+                flash("mpesa_messages", "success", f"Imported {result['added']} transactions, skipped "
+                      f"{result['duplicates']} already imported.")
+                if result["rejected"]:
+                    flash("mpesa_messages", "warning",
+                          f"{result['rejected']} transactions failed validation and were quarantined.")
+                if result["unrecognised"]:
+                    flash("mpesa_messages", "warning", f"{len(result['unrecognised'])} messages were not recognised.")
+                if result["added"]:
+                    sync_search_index(result["transactions"], get_file_version(TRANSACTION_FILE))
+                    st.rerun()
+                show_flash("mpesa_messages")
+
+
+@st.fragment
+def export_section():
+    st.subheader("Export saved transactions")
+
+    if st.button("Export to CSV"):
+        export_transactions_to_csv()
 
-    st.sidebar.subheader("Export saved transactions")
 
-    if st.sidebar.button("Export to CSV"):
-        export_transactions_to_csv()
+# Main page logic
+if st.session_state.page != "Budget":
+    # Budget widgets start afresh from the file when the page is opened again
+    st.session_state.pop("budget_week_seen", None)
 
-    # 8. MOVE SUMMARY TO SIDEBAR (OUTSIDE FORM)
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("Financial Summary")
+if st.session_state.page == "Home":
+    st.title("Transaction Log")
+    st.write("Record your week's expenditure and income.")
+    st.markdown("---")
 
-    transactions = load_json_data(TRANSACTION_FILE)
+    # Load all categories and subcategories
+    all_categories = load_categories()
 
-    if transactions:
-        # Load transactions into DataFrame
-        df = pd.DataFrame(transactions)
+    # Get main categories for the dropdown
+    if isinstance(all_categories, dict):
+        main_categories = sorted(list(all_categories.keys()))
+    else:
+        # If all_categories is a list, extract keys from the dictionaries in the list
+        main_categories = []
+        for item in all_categories:
+            if isinstance(item, dict):
+                main_categories.extend(item.keys())
+        main_categories = sorted(list(set(main_categories)))  # Remove duplicates
 
-        # Standardize column names once
-        df = standardize_columns(df)
+    # Load income categories from file
+    income_categories = sorted(load_income_categories())
 
-        # Ensure amount is numeric
-        if 'amount(kes)' in df.columns:
-            df['amount(kes)'] = pd.to_numeric(df['amount(kes)'], errors='coerce')
+    payment_methods = ["Cash", "M-Pesa", "Bank Transfer", "Credit Card", "Debit Card", "Other"]
 
-        # Filter out invalid rows
-        df = df.dropna(subset=["amount(kes)"])
+    # Form, recurring and import sections are fragments, so their widgets rerun only themselves
+    transaction_entry(main_categories, income_categories, payment_methods)
+    recurring_entry(main_categories, income_categories, payment_methods)
+    mpesa_import()
 
-        # Normalize relevant columns for consistent filtering
-        if 'transaction type' in df.columns:
-            df["transaction type"] = df["transaction type"].str.strip().str.lower()
-        if 'category' in df.columns:
-            df["category"] = df["category"].str.strip().str.lower()
-
-        # Calculate summary statistics
-        if 'transaction type' in df.columns and 'amount(kes)' in df.columns:
-            # Use consistent case for filtering
-            total_inflow = df[df["transaction type"].str.contains("debit|money in", case=False, na=False)][
-                "amount(kes)"].sum()
-            total_outflow = df[df["transaction type"].str.contains("credit|money out", case=False, na=False)][
-                "amount(kes)"].sum()
-
-            # Look for savings in both income and expense categories
-            total_saved = df[
-                (df["category"].str.contains("savings", case=False, na=False)) |
-                (df["subcategory"].str.contains("savings", case=False, na=False))
-                ]["amount(kes)"].sum()
-
-            surplus = total_inflow - total_outflow
-
-            st.sidebar.markdown(f"**Total Inflow (Kes):** {total_inflow:,.2f}")
-            st.sidebar.markdown(f"**Total Outflow (Kes):** {total_outflow:,.2f}")
-            st.sidebar.markdown(f"**Surplus (Kes):** {surplus:,.2f}")
-            st.sidebar.markdown(f"**Total Saved (Kes):** {total_saved:,.2f}")
-
-            st.sidebar.markdown("---")
-
-            # Expense breakdown
-            expense_data = df[df["transaction type"].str.contains("credit|money out", case=False, na=False)]
-
-            if not expense_data.empty and 'category' in expense_data.columns:
-                # Create expense pie chart
-                fig_expense_pie = px.pie(
-                    expense_data,
-                    names='category',
-                    values='amount(kes)',
-                    title='Expense Distribution by Category'
-                )
-                st.sidebar.plotly_chart(fig_expense_pie, use_container_width=True)
-            else:
-                st.sidebar.info("No expenses recorded yet for category breakdown.")
+    with st.sidebar:
+        export_section()
 
-            # Income breakdown
-            income_data = df[df["transaction type"].str.contains("debit|money in", case=False, na=False)]
+    # 8. MOVE SUMMARY TO SIDEBAR (OUTSIDE FORM)
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Financial Summary")
 
-            if not income_data.empty and 'category' in income_data.columns:
-                # Create income pie chart
-                fig_income_pie = px.pie(
-                    income_data,
-                    names='category',
-                    values='amount(kes)',
-                    title='Income by Category',
-                    color_discrete_sequence=px.colors.sequential.Teal
-                )
-                st.sidebar.plotly_chart(fig_income_pie, use_container_width=True)
-            else:
-                st.sidebar.info("No income recorded yet for category breakdown.")
+    ledger = ledger_snapshot()
+    transactions = ledger.records
+
+    if transactions:
+        # Aggregated once per ledger, currency and FX version, then shared by every session and rerun
+        summary = get_ledger_summary(ledger, reporting_currency)
+        total_inflow = summary["inflow"]
+        total_outflow = summary["outflow"]
+        total_saved = summary["saved"]
+
+        # Closed periods only contribute their stored daily totals, converted at each day's rate
+        archived = archived_totals(reporting_currency)
+        total_inflow += archived["inflow"]
+        total_outflow += archived["outflow"]
+
+        surplus = total_inflow - total_outflow
+
+        st.sidebar.markdown(f"**Total Inflow ({reporting_currency}):** {total_inflow:,.2f}")
+        st.sidebar.markdown(f"**Total Outflow ({reporting_currency}):** {total_outflow:,.2f}")
+        st.sidebar.markdown(f"**Surplus ({reporting_currency}):** {surplus:,.2f}")
+        st.sidebar.markdown(f"**Total Saved ({reporting_currency}):** {total_saved:,.2f}")
+        warn_missing_rates(ledger, reporting_currency, archived["unconverted"])
+
+        # Weeks where a category's spend is out of line with its rolling statistics
+        anomalies = current_anomalies(refresh_anomalies(transactions, get_file_version(TRANSACTION_FILE)))
+        for anomaly in anomalies:
+            # Flags are kept in shillings; show them in the reporting currency at that week's rate
+            currency = reporting_currency
+            spend = convert_amount(anomaly['spend'], BASE_CURRENCY, currency, anomaly['week'])
+            usual = convert_amount(anomaly['usual'], BASE_CURRENCY, currency, anomaly['week'])
+            if pd.isna(spend) or pd.isna(usual):
+                # No rate for that week, which the missing-rates warning already reports
+                currency, spend, usual = BASE_CURRENCY, anomaly['spend'], anomaly['usual']
+            st.sidebar.warning(f"{anomaly['category']}: {currency} {spend:,.0f} in the week of "
+                               f"{anomaly['week']}, {anomaly['ratio']:.1f}x the usual "
+                               f"{currency} {usual:,.0f}")
+
+        st.sidebar.markdown("---")
+
+        # Expense breakdown
+        expense_data = summary["expenses"]
+
+        if not expense_data.empty:
+            # Create expense pie chart
+            fig_expense_pie = px.pie(
+                names=expense_data.index,
+                values=expense_data.to_numpy(),
+                title='Expense Distribution by Category'
+            )
+            st.sidebar.plotly_chart(fig_expense_pie, use_container_width=True)
+        else:
+            st.sidebar.info("No expenses recorded yet for category breakdown.")
+
+        # Income breakdown
+        income_data = summary["income"]
+
+        if not income_data.empty:
+            # Create income pie chart
+            fig_income_pie = px.pie(
+                names=income_data.index,
+                values=income_data.to_numpy(),
+                title='Income by Category',
+                color_discrete_sequence=px.colors.sequential.Teal
+            )
+            st.sidebar.plotly_chart(fig_income_pie, use_container_width=True)
         else:
-            st.sidebar.warning("Required columns not found in data")
+            st.sidebar.info("No income recorded yet for category breakdown.")
     else:
         st.sidebar.warning("No transactions found")
 
@@ -600,20 +854,16 @@ elif st.session_state.page == "Budget":
     st.title("Budget Management")
     load_expense_categories()
     load_budgets_from_file()
-    current_year = datetime.now().year
-    months = ["January", "February", "March", "April", "May", "June",
-              "July", "August", "September", "October", "November", "December"]
 
-    selected_month = st.selectbox(
-        "Select Month", months, index=datetime.now().month - 1, key="select_month"
-    )
+    # The month and ISO week are both derived from the date, so they always agree
+    selected_day = st.date_input("Budget week of", value=datetime.today(), key="budget_week_of")
+    period_key = period_key_for(selected_day)
 
-    weeks = [f"Week {i}" for i in range(1, 53)]
-    selected_week = st.selectbox(
-        "Select Week", weeks, index=min(datetime.now().isocalendar().week - 1, 51), key="select_week"
-    )
-
-    period_key = f"{selected_month} {current_year} - {selected_week}"
+    # The week as this session last showed it; saving over a change made elsewhere since then is refused
+    seen = st.session_state.get("budget_week_seen")
+    st.session_state.budget_week_base = seen[1] if seen and seen[0] == period_key \
+        else copy.deepcopy(st.session_state.budgets.get(period_key))
+    st.session_state.budget_week_seen = (period_key, copy.deepcopy(st.session_state.budgets.get(period_key)))
 
     if period_key not in st.session_state.budgets:
         st.session_state.budgets[period_key] = {
@@ -627,9 +877,10 @@ elif st.session_state.page == "Budget":
     # Overall budget input
     period_data['overall_budget'] = st.number_input(
         f"Set overall weekly budget for {period_key} (Kes):",
-        min_value=0,
-        step=1000,
-        value=period_data['overall_budget'],
+        min_value=0.0,
+        step=1000.0,
+        # Saved budgets hold floats, so every argument is a float
+        value=float(period_data['overall_budget'] or 0),
         key=f"overall_{period_key}"
     )
     create_budget()
@@ -646,34 +897,6 @@ elif st.session_state.page == "Budget":
                         'Savings & Investment', 'Debt Repayment']
 
     st.title("Weekly financial analysis")
-    # Period selection
-    current_year = datetime.now().year
-    months = ["January", "February", "March", "April", "May", "June",
-              "July", "August", "September", "October", "November", "December"]
-    selected_month = st.selectbox(
-        "Select Month", months,
-        index=datetime.now().month - 1,
-        key="select_month (budget_page)"
-    )
-    weeks = [f"Week {i}" for i in range(1, 53)]
-    selected_week = st.selectbox(
-        "Select Week", weeks,
-        index=min(datetime.now().isocalendar().week - 1, 51),
-        key = "select_week (budget_page)")
-
-    period_key = f"{selected_month} {current_year} - {selected_week}"
-
-    # Initialize period
-    if period_key not in st.session_state.budgets:
-        st.session_state.budgets[period_key] = {
-            'overall_budget': 0,
-            'items': []
-        }
-
-    st.session_state.current_period = period_key
-    period_data = st.session_state.budgets[period_key]
-
-    #--------
 
     # Edit budget items
     st.markdown("---")
@@ -705,15 +928,49 @@ elif st.session_state.page == "Budget":
 
         if st.button("Save Changes", key=f"save_{period_key}"):
             period_data['items'] = edited_df.to_dict('records')
-            save_budgets()
-            st.success("Budget updated!")
+            if save_budgets(period_key, f"Edit budget for {period_key}"):
+                st.success("Budget updated!")
 
     # Clear budget items
     st.markdown("---")
     if st.button("Clear All Budget Items", key=f"clear_{period_key}"):
         period_data['items'] = []
-        save_budgets()
-        st.success("All budget items cleared!")
+        if save_budgets(period_key, f"Clear budget for {period_key}"):
+            st.success("All budget items cleared!")
+    history_controls("budgets", "budgets")
+
+    # Weekly budgets rolled up against spending; the index is rebuilt only when budgets.json changes
+    st.markdown("---")
+    st.subheader("Budget vs Spending")
+    col1, col2 = st.columns(2)
+    rollup_level = col1.radio("Roll up by", PERIOD_LEVELS, index=1, horizontal=True, key="rollup_level")
+    rollup_category = col2.selectbox("Category", ["All categories"] + all_categories, key="rollup_category")
+
+    period_index = load_period_index()
+    if period_index.empty:
+        st.info("Save a budget to compare it with spending")
+    else:
+        snapshot = ledger_snapshot()
+        ledger = convert_frame(snapshot.frame(), reporting_currency) if snapshot.records else \
+            pd.DataFrame(columns=["date", "transaction type", "amount(kes)", "transaction fees", "category"])
+        spending = get_weekly_spending(ledger, get_file_version(TRANSACTION_FILE), reporting_currency)
+        rollup = budget_rollup(period_index, spending, rollup_level,
+                               None if rollup_category == "All categories" else rollup_category,
+                               convert_amount(1.0, BASE_CURRENCY, reporting_currency))
+
+        current = rollup.loc[rollup.index[-1]]
+        col1, col2, col3 = st.columns(3)
+        col1.metric(f"Budgeted {rollup.index[-1]} ({reporting_currency})",
+                    f"{current['spent'] + current['remaining']:,.0f}")
+        col2.metric(f"Spent ({reporting_currency})", f"{current['spent']:,.0f}")
+        col3.metric(f"Remaining ({reporting_currency})", f"{current['remaining']:,.0f}")
+
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=rollup.index, y=rollup["budgeted"], name="Budgeted"))
+        fig.add_trace(go.Bar(x=rollup.index, y=rollup["spent"], name="Spent"))
+        fig.update_layout(barmode="group", xaxis_title=rollup_level, yaxis_title=reporting_currency)
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(rollup.style.format({"used": "{:.0%}"}, precision=0, na_rep=""))
 
     # Track progress
     st.sidebar.subheader("Budget Progress")
@@ -735,15 +992,18 @@ elif st.session_state.page == "Budget":
 
         st.sidebar.subheader("Weekly Allocation")
         st.sidebar.progress(min(total_percent, 1.0))
-        st.sidebar.caption(f"Kes {total_budgeted:,.0f} of Kes {overall:,.0f} allocated")
+        # Budgets are entered in shillings and shown in the reporting currency
+        budget_rate = convert_amount(1.0, BASE_CURRENCY, reporting_currency)
+        st.sidebar.caption(f"{reporting_currency} {total_budgeted * budget_rate:,.0f} of "
+                           f"{reporting_currency} {overall * budget_rate:,.0f} allocated")
 
         st.sidebar.subheader("Fixed Expenses")
         st.sidebar.progress(min(fixed_percent, 1.0))
-        st.sidebar.caption(f"Kes {fixed_budgeted:,.0f} allocated")
+        st.sidebar.caption(f"{reporting_currency} {fixed_budgeted * budget_rate:,.0f} allocated")
 
         st.sidebar.subheader("Variable Expenses")
         st.sidebar.progress(min(variable_percent, 1.0))
-        st.sidebar.caption(f"Kes {variable_budgeted:,.0f} allocated")
+        st.sidebar.caption(f"{reporting_currency} {variable_budgeted * budget_rate:,.0f} allocated")
 
         # Budget feedback
         allocation_percent = total_budgeted / overall if overall else 0
@@ -764,53 +1024,97 @@ elif st.session_state.page == "Honey Pot":
     st.title("Honey Pot")
     st.write("Financial dashboard for tracking net worth and cashflow")
 
-    # 1. Load data with consistent column names using your custom function
-    transactions = load_json_data(TRANSACTION_FILE)
+    # 1. Load data from the shared ledger snapshot, or rebuild it from the history for a past day
+    ledger = ledger_snapshot()
+    as_of = st.date_input("Show as of", value=None, key="honey_pot_as_of",
+                          help="Show the dashboard as the ledger stood at the end of a past day")
+    if as_of is not None and as_of < datetime.today().date():
+        past = ledger_as_of(as_of)
+        if past is None:
+            started = history_start("transactions")
+            st.info(f"History starts on {started[:10]}; showing the current ledger" if started
+                    else "No changes recorded yet; showing the current ledger")
+        else:
+            ledger = past
+            st.caption(f"Showing the ledger at the end of {as_of:%d %B %Y}")
+    transactions = ledger.records
 
     if transactions:
-        df = pd.DataFrame(transactions)
-        # Standardize column names
-        df = standardize_columns(df)
+        # Stored rows are schema-validated, so no column patching is needed
+        df = convert_frame(ledger.frame(), reporting_currency)
     else:
         df = pd.DataFrame(columns=[
-            "date", "week", "amount(kes)", "transaction type",
+            "date", "week", "amount(kes)", "currency", "transaction type",
             "category", "subcategory", "transaction fees",
             "payment method", "item description (money in)", "item description (money out)"
         ])
 
     # 2. Set opening balance - ensure consistent naming
     st.sidebar.subheader("Set Opening Balance")
-    opening_bal = st.sidebar.number_input("Enter Opening Balance (Kes)",
+    opening_bal = st.sidebar.number_input(f"Enter Opening Balance ({reporting_currency})",
                                           min_value=0.0, format="%.2f",
                                           key="opening_bal")
 
     if st.sidebar.button("Save Opening Balance"):
-        # Store opening balance in session state instead of adding as a transaction
-        st.session_state.opening_balance = opening_bal
+        # Store opening balance in session state instead of adding as a transaction, in shillings
+        # so that switching the reporting currency converts it like everything else
+        st.session_state.opening_balance = convert_amount(opening_bal, reporting_currency, BASE_CURRENCY)
         st.sidebar.success("Opening balance saved!")
 
-    # Get opening balance from session state or use 0 as default
-    opening_balance = st.session_state.get('opening_balance', 0.0)
-
-    # 3. Ensure standardization after any modifications
-    df = standardize_columns(df)
-
-    # 4. Add missing columns if they don't exist
-    required_columns = [
-        "date", "week", "amount(kes)", "transaction type",
-        "category", "subcategory", "transaction fees",
-        "payment method", "item description (money in)", "item description (money out)"
-    ]
-    for col in required_columns:
-        if col not in df.columns:
-            if "description" in col:
-                df[col] = ""
-            elif col == "date":
-                df[col] = pd.NaT
-            else:
-                df[col] = 0.0
-
-    # 5. Safe calculation of metrics
+    # Get opening balance from session state or use 0 as default; a balance has no date, so today's rate applies
+    opening_balance = convert_amount(st.session_state.get('opening_balance', 0.0), BASE_CURRENCY, reporting_currency)
+
+    # Exchange rates used to convert other currencies into the reporting currency
+    with st.sidebar.expander("Exchange Rates"):
+        with st.form(key="fx_rate_form"):
+            fx_date = st.date_input("Rate date", value=datetime.today())
+            fx_currency = st.text_input("Currency code", "USD", max_chars=3)
+            fx_rate = st.number_input(f"{BASE_CURRENCY} per 1 unit", min_value=0.0, format="%.4f")
+            if st.form_submit_button("Save Rate"):
+                if fx_rate > 0 and len(fx_currency.strip()) == 3:
+                    add_rate(fx_date, fx_currency.strip(), fx_rate)
+                    st.rerun()
+                else:
+                    st.error("Enter a 3-letter currency code and a positive rate.")
+        rate_table = load_rate_table()
+        if not rate_table.empty:
+            st.dataframe(rate_table.groupby("currency").last())
+
+    # Archive closed years; their totals stay available from the summary index
+    st.sidebar.subheader("Archive")
+    if st.sidebar.button("Archive closed years"):
+        archived_keys = compact_ledger("year")
+        if archived_keys:
+            st.sidebar.success(f"Archived {', '.join(archived_keys)}")
+            st.rerun()
+        else:
+            st.sidebar.info("Nothing to archive")
+
+    # Incremental backups: only chunks of changed files are stored
+    st.sidebar.subheader("Backup")
+    if st.sidebar.button("Back up now"):
+        backup_result = create_backup()
+        st.sidebar.success(f"Backed up {backup_result['files']} changed file(s), "
+                           f"{backup_result['bytes'] / 1024:,.0f} KB new")
+    backup_names = list_backups()
+    st.sidebar.caption(f"Last backup: {datetime.strptime(backup_names[-1][:15], '%Y%m%d-%H%M%S'):%d %b %Y %H:%M}"
+                       if backup_names else "No backups yet")
+
+    # Static HTML reports; only weeks and months whose transactions or budgets changed are rendered again
+    st.sidebar.subheader("Reports")
+    if st.sidebar.button("Update reports"):
+        current_ledger = ledger_snapshot()
+        report_aggregate = current_ledger.derived(
+            ("report aggregate", reporting_currency, rates_version()),
+            lambda records: build_report_aggregate(convert_frame(current_ledger.frame(), reporting_currency)
+                                                   if records else pd.DataFrame()))
+        report_result = generate_reports(currency=reporting_currency, aggregate=report_aggregate)
+        st.sidebar.success(f"{len(report_result['rendered'])} report(s) updated, {report_result['unchanged']} "
+                           f"unchanged; open \"{os.path.join(REPORT_FOLDER, 'index.html')}\"")
+    archived = archived_totals(reporting_currency)
+    warn_missing_rates(ledger, reporting_currency, archived["unconverted"])
+
+    # 3. Safe calculation of metrics
     try:
         # Normalize transaction type for consistent filtering
         if 'transaction type' in df.columns:
@@ -832,25 +1136,29 @@ elif st.session_state.page == "Honey Pot":
 
         transaction_costs = df["transaction fees"].sum() if 'transaction fees' in df.columns else 0.0
 
-        total_saved = expense_df[
-            (expense_df["category"].str.contains("savings", case=False, na=False)) |
-            (expense_df["subcategory"].str.contains("savings", case=False, na=False))
-            ]["amount(kes)"].sum() if not expense_df.empty else 0.0
+        # Add closed periods from their summary records
+        total_inflow += archived["inflow"]
+        total_outflow += archived["outflow"]
+        transaction_costs += archived["fees"]
+
+        total_saved = savings_contributions(df).sum()
 
         net_worth = opening_balance + total_inflow - total_outflow - transaction_costs
 
-        # 6. Display metrics safely
+        # 4. Display metrics safely
         st.subheader("Financial Summary")
         col1, col2, col3 = st.columns(3)
 
-        col1.metric("Total Inflow", f"KSh {total_inflow:,.2f}")
-        col2.metric("Total Outflow", f"KSh {total_outflow:,.2f}")
-        col3.metric("Net Worth", f"KSh {net_worth:,.2f}",
-                    delta=f"KSh {net_worth - opening_balance:,.2f} from opening")
+        col1.metric("Total Inflow", f"{reporting_currency} {total_inflow:,.2f}")
+        col2.metric("Total Outflow", f"{reporting_currency} {total_outflow:,.2f}")
+        col3.metric("Net Worth", f"{reporting_currency} {net_worth:,.2f}",
+                    delta=f"{reporting_currency} {net_worth - opening_balance:,.2f} from opening")
 
         # Additional metrics
-        st.metric("Total Saved", f"KSh {total_saved:,.2f}")
-        st.metric("Total Transaction Fees", f"KSh {transaction_costs:,.2f}")
+        st.metric("Total Saved", f"{reporting_currency} {total_saved:,.2f}")
+        st.metric("Total Transaction Fees", f"{reporting_currency} {transaction_costs:,.2f}")
+        if archived["rows"]:
+            st.caption(f"Includes {archived['rows']:,} archived transactions from closed periods")
 
     except KeyError as e:
         st.error(f"Missing column in data: {e}")
@@ -858,8 +1166,61 @@ elif st.session_state.page == "Honey Pot":
         # Set default values to prevent further errors
         total_inflow, total_outflow, transaction_costs, total_saved, net_worth = 0.0, 0.0, 0.0, 0.0, opening_balance
 
+    # Savings goals; progress comes from the weekly savings series cached on the ledger snapshot
+    st.markdown("---")
+    st.subheader("Savings Goals")
+    with st.expander("Add a savings goal"):
+        with st.form(key="goal_form"):
+            col1, col2 = st.columns(2)
+            goal_name = col1.text_input("Goal", placeholder="e.g. Emergency fund")
+            goal_target = col1.number_input(f"Target ({BASE_CURRENCY})", min_value=0.0, step=1000.0)
+            goal_deadline = col1.date_input("Deadline", value=None)
+            goal_categories = col2.multiselect("Counts savings in categories",
+                                               sorted(st.session_state.categories) if st.session_state.categories
+                                               else ["Savings & Investment"])
+            goal_subcategories = col2.multiselect("Or subcategories", ["Mshwari", "Sacco", "Chama", "MMF"])
+            goal_start = col2.date_input("Count savings from (optional)", value=None)
+            st.caption("Leave categories and subcategories empty to count all savings")
+            if st.form_submit_button("Save Goal"):
+                goal, errors = create_goal(goal_name, goal_target, goal_deadline, goal_categories,
+                                           goal_subcategories, goal_start)
+                if errors:
+                    st.error("Goal not saved: " + "; ".join(errors))
+                else:
+                    save_goals(load_goals() + [goal])
+                    st.rerun()
+
+    savings_goals = load_goals()
+    if not savings_goals:
+        st.info("No savings goals yet")
+    else:
+        # Savings are converted at their own dates; targets are plans, so they take today's rate
+        goal_rate = convert_amount(1.0, BASE_CURRENCY, reporting_currency)
+        goal_progress = project_goals(get_weekly_savings(ledger, reporting_currency),
+                                      [{**goal, "target": goal["target"] * goal_rate} for goal in savings_goals])
+        for goal_id, goal in goal_progress.iterrows():
+            st.markdown(f"**{goal['name']}**: {reporting_currency} {goal['saved']:,.0f} of "
+                        f"{goal['target']:,.0f} by {goal['deadline']:%d %b %Y}")
+            st.progress(float(goal["progress"]))
+            if goal["saved"] >= goal["target"]:
+                st.success("Target reached")
+            elif goal["on track"]:
+                st.caption(f"On track: saving {reporting_currency} {goal['weekly rate']:,.0f} a week, "
+                           f"projected to reach it by {goal['projected date']:%d %b %Y}")
+            else:
+                st.warning(f"Short by {reporting_currency} {goal['shortfall']:,.0f} at the current rate "
+                           f"of {goal['weekly rate']:,.0f} a week; "
+                           f"{goal['required rate']:,.0f} a week is needed")
+
+        col1, col2 = st.columns([3, 1])
+        remove_goal = col1.selectbox("Remove a goal", list(goal_progress.index),
+                                     format_func=lambda i: goal_progress.at[i, "name"])
+        if col2.button("Remove Goal"):
+            save_goals([goal for goal in savings_goals if goal["id"] != remove_goal])
+            st.rerun()
+
     st.markdown("---")
-    # 7. Cashflow chart with safe column handling
+    # 5. Cashflow chart with safe column handling
     st.subheader("Monthly Cashflow Overview")
     if not df.empty and 'date' in df.columns:
         try:
@@ -1010,7 +1371,7 @@ elif st.session_state.page == "Honey Pot":
                     barmode='group',
                     title="Monthly Cashflow",
                     xaxis_title="Month",
-                    yaxis_title="Amount (Kes)",
+                    yaxis_title=f"Amount ({reporting_currency})",
                     legend_title="Type"
                 )
 
@@ -1031,7 +1392,83 @@ elif st.session_state.page == "Honey Pot":
     else:
         st.warning("No valid transaction data available for chart")
 
-    # 8. Recent transactions with safe column handling
+    # Forward-looking cashflow from smoothed weekly history, recurring schedules and budgets
+    st.subheader("Cashflow Forecast")
+    forecast_weeks = st.select_slider("Weeks ahead", FORECAST_HORIZONS, value=8, key="forecast_weeks")
+    forecast_rate = convert_amount(1.0, BASE_CURRENCY, reporting_currency)
+    forecast = get_forecast(ledger, forecast_weeks) * forecast_rate
+    if not forecast.to_numpy().any():
+        st.info("Not enough history, recurring transactions or budgets to forecast from")
+    else:
+        forecast_summary = forecast_totals(forecast, net_worth)
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=forecast_summary.index, y=forecast_summary["income"], name="Income",
+                             marker_color="green"))
+        fig.add_trace(go.Bar(x=forecast_summary.index, y=forecast_summary["expense"], name="Expense",
+                             marker_color="red"))
+        fig.add_trace(go.Scatter(x=forecast_summary.index, y=forecast_summary["balance"], mode="lines+markers",
+                                 name="Projected balance", line=dict(color="blue", dash="dot")))
+        fig.update_layout(barmode="group", xaxis_title="Week starting",
+                          yaxis_title=f"Amount ({reporting_currency})", legend_title="Type")
+        st.plotly_chart(fig, use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        col1.metric(f"Projected net over {forecast_weeks} weeks ({reporting_currency})",
+                    f"{forecast_summary['net'].sum():,.2f}")
+        col2.metric(f"Projected balance ({reporting_currency})", f"{forecast_summary['balance'].iloc[-1]:,.2f}")
+
+        with st.expander("Forecast by category"):
+            forecast_table = forecast.T.copy()
+            forecast_table.columns = forecast_table.columns.strftime("%d %b")
+            st.dataframe(forecast_table.style.format(precision=0))
+
+    # Net worth over time from the cached cumulative series
+    st.subheader("Net Worth Over Time")
+    # Archived periods step in from their summaries, at the rate used for their totals above
+    networth_cache = with_archived(get_networth_cache(df), archived_flows(reporting_currency))
+    if len(networth_cache["dates"]):
+        resolution = st.radio("Resolution", list(RESOLUTIONS), index=1, horizontal=True, key="networth_resolution")
+        networth_df = networth_series(networth_cache, resolution, opening_balance)
+        fig_networth = px.line(networth_df, x="period", y="net worth", markers=True,
+                               title=f"Net Worth by {resolution}")
+        fig_networth.update_layout(xaxis_title=resolution, yaxis_title=f"Net Worth ({reporting_currency})")
+        st.plotly_chart(fig_networth, use_container_width=True)
+
+        first_date = pd.Timestamp(networth_cache["dates"][0]).date()
+        col1, col2 = st.columns(2)
+        with col1:
+            balance_date = st.date_input("Balance on", value=datetime.today(), key="networth_on")
+            st.metric("Net Worth", f"{reporting_currency} {balance_on(networth_cache, balance_date, opening_balance):,.2f}")
+        with col2:
+            balance_range = st.date_input("Balance between", value=(first_date, datetime.today().date()),
+                                          key="networth_between")
+            if isinstance(balance_range, (list, tuple)) and len(balance_range) == 2:
+                movement = balance_between(networth_cache, balance_range[0], balance_range[1], opening_balance)
+                st.metric("Closing Net Worth", f"{reporting_currency} {movement['end']:,.2f}",
+                          delta=f"{reporting_currency} {movement['change']:,.2f} over the period")
+    else:
+        st.info("No dated transactions available for net worth history")
+
+    # Payment method and fee analytics, sliced from the pre-aggregated cube
+    st.subheader("Payment Methods & Fees")
+    analytics_cube = get_cube(ledger, reporting_currency)
+    if not analytics_cube.empty:
+        col1, col2, col3 = st.columns(3)
+        slice_by = col1.selectbox("Group by", CUBE_DIMENSIONS, index=1, key="cube_by")
+        period_filter = col2.multiselect("Periods", sorted(analytics_cube.index.unique("period")), key="cube_periods")
+        type_filter = col3.multiselect("Transaction type", sorted(analytics_cube.index.unique("transaction type")),
+                                       key="cube_types")
+        cube_slice = slice_cube(analytics_cube, slice_by, period=period_filter, transaction_type=type_filter)
+
+        fig_fees = px.bar(cube_slice.reset_index(), x=slice_by, y="fees", hover_data=["count", "amount", "fee ratio"],
+                          title=f"Transaction Fees by {slice_by.title()}")
+        fig_fees.update_layout(yaxis_title=f"Fees ({reporting_currency})")
+        st.plotly_chart(fig_fees, use_container_width=True)
+        st.dataframe(cube_slice.style.format({"amount": "{:,.2f}", "fees": "{:,.2f}", "fee ratio": "{:.2%}"}))
+    else:
+        st.info("No transactions available for payment method analytics")
+
+    # 6. Recent transactions with safe column handling
     st.subheader("Recent Transactions")
     if not df.empty:
         try:
@@ -1061,3 +1498,232 @@ elif st.session_state.page == "Honey Pot":
             st.error(f"Error displaying recent transactions: {e}")
     else:
         st.info("No transactions available")
+
+elif st.session_state.page == "Transactions":
+    st.title("Transaction History")
+    st.write("Browse, filter and edit your past transactions.")
+    history_controls("transactions", "transactions")
+
+    if "edit_index" not in st.session_state:
+        st.session_state.edit_index = None
+
+    # Archived periods are only opened when picked here
+    ledger_choice = st.selectbox("Ledger", ["Current"] + list(load_archive_summaries()), key="browse_ledger")
+    if ledger_choice == "Current":
+        ledger = ledger_snapshot()
+        transactions, ledger_version = ledger.records, ledger.version
+    else:
+        transactions = load_partition(ledger_choice)
+        ledger_version = (ledger_choice, get_file_version(archive_path(ledger_choice)))
+        st.caption("Archived periods are read-only")
+
+    if not transactions:
+        st.info("No transactions available")
+    else:
+        # Filtering and sorting run on the cached index; only the visible page is built
+        ledger_index = ledger.derived("ledger_index", build_ledger_index) if ledger_choice == "Current" \
+            else get_ledger_index(transactions, ledger_version)
+
+        search_query = st.text_input("Search descriptions, subcategories and payment methods",
+                                     key="browse_search", placeholder="e.g. naivas mpesa")
+
+        with st.expander("Filters", expanded=True):
+            col1, col2 = st.columns(2)
+            with col1:
+                date_range = st.date_input("Date range", value=(), key="browse_dates")
+                type_choice = st.selectbox("Transaction type", ["All", "Money in (debit)", "Money out (credit)"],
+                                           key="browse_type")
+                min_amount = st.number_input("Minimum amount", min_value=0.0, value=0.0, key="browse_min")
+            with col2:
+                category_filter = st.multiselect("Category", sorted(ledger_index["category_names"]),
+                                                 key="browse_categories")
+                payment_filter = st.multiselect("Payment method", sorted(ledger_index["payment_method_names"]),
+                                                key="browse_payment_methods")
+                max_amount = st.number_input("Maximum amount (0 for no limit)", min_value=0.0, value=0.0,
+                                             key="browse_max")
+            sort_choice = st.selectbox("Sort by", list(SORT_OPTIONS), key="browse_sort")
+
+        start_date = date_range[0] if len(date_range) > 0 else None
+        end_date = date_range[1] if len(date_range) > 1 else start_date
+        type_filter = {"Money in (debit)": "debit", "Money out (credit)": "credit"}.get(type_choice)
+
+        matching_rows = query_ledger_index(
+            ledger_index,
+            start=start_date,
+            end=end_date,
+            transaction_type=type_filter,
+            categories=category_filter,
+            payment_methods=payment_filter,
+            min_amount=min_amount or None,
+            max_amount=max_amount or None,
+            sort=sort_choice
+        )
+        if search_query.strip():
+            search_index = get_search_index(transactions, ledger_version) if ledger_choice == "Current" \
+                else build_search_index(transactions)
+            search_hits = search_transactions(search_index, search_query)
+            matching_rows = matching_rows[np.isin(matching_rows, search_hits)]
+
+        col1, col2 = st.columns(2)
+        page_size = col1.selectbox("Rows per page", [10, 25, 50, 100], index=1, key="browse_page_size")
+        total_pages = max(1, -(-len(matching_rows) // page_size))
+        page_number = col2.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1,
+                                        key="browse_page")
+
+        st.caption(f"{len(matching_rows):,} matching transactions - page {page_number} of {total_pages}")
+        page_df = fetch_page(transactions, matching_rows, page_number, page_size)
+        st.dataframe(page_df)
+
+        # Pick a visible row to edit
+        if not page_df.empty and ledger_choice == "Current":
+            col1, col2 = st.columns([3, 1])
+            selected_row = col1.selectbox(
+                "Select transaction to edit",
+                page_df.index.tolist(),
+                format_func=lambda i: f"{transactions[i].get('date', '')} - {transactions[i].get('category', '')} - "
+                                      f"{transactions[i].get('currency', BASE_CURRENCY)} "
+                                      f"{transactions[i].get('amount(kes)', 0)}",
+                key="browse_selected"
+            )
+            if col2.button("Edit"):
+                st.session_state.edit_index = int(selected_row)
+
+        edit_index = st.session_state.edit_index
+        if ledger_choice == "Current" and edit_index is not None and 0 <= edit_index < len(transactions):
+            transaction = transactions[edit_index]
+            st.markdown("---")
+            st.subheader("Edit Transaction")
+
+            with st.form(key="edit_transaction_form"):
+                edit_date = pd.to_datetime(transaction.get("date"), errors="coerce")
+                edit_date = st.date_input("Transaction Date",
+                                          value=datetime.today() if pd.isna(edit_date) else edit_date.date())
+                is_income = str(transaction.get("transaction type", "")).lower() == "debit"
+                edit_type = st.selectbox("Transaction type", ["Money in (debit)", "Money out (credit)"],
+                                         index=0 if is_income else 1)
+                edit_amount = st.number_input("Amount", min_value=0.0, format="%.2f",
+                                              value=float(pd.to_numeric(transaction.get("amount(kes)"),
+                                                                        errors="coerce") or 0.0))
+                currency_options = available_currencies()
+                edit_currency = transaction.get("currency", BASE_CURRENCY)
+                edit_currency = st.selectbox("Currency", currency_options,
+                                             index=currency_options.index(edit_currency)
+                                             if edit_currency in currency_options else 0)
+                edit_fees = st.number_input("Transaction Fees", min_value=0.0, format="%.2f",
+                                            value=float(pd.to_numeric(transaction.get("transaction fees"),
+                                                                      errors="coerce") or 0.0))
+                edit_category = st.text_input("Category", transaction.get("category", ""))
+                edit_subcategory = st.text_input("Sub Category", transaction.get("subcategory", ""))
+                edit_payment = st.text_input("Payment Method", transaction.get("payment method", ""))
+                edit_description = st.text_input(
+                    "Item Description",
+                    transaction.get("item description (money in)") or transaction.get("item description (money out)", "")
+                )
+
+                col1, col2 = st.columns(2)
+                save_edit = col1.form_submit_button("Save Changes")
+                cancel_edit = col2.form_submit_button("Cancel")
+
+            if save_edit:
+                edited_transaction, errors = validate_transaction({
+                    "date": edit_date.strftime("%Y-%m-%d"),
+                    "week": edit_date.isocalendar()[1],
+                    "amount(kes)": edit_amount,
+                    "currency": edit_currency,
+                    "transaction fees": edit_fees,
+                    "transaction type": "debit" if edit_type == "Money in (debit)" else "credit",
+                    "category": edit_category,
+                    "subcategory": edit_subcategory,
+                    "payment method": edit_payment,
+                    "item description (money in)": edit_description if edit_type == "Money in (debit)" else "",
+                    "item description (money out)": edit_description if edit_type == "Money out (credit)" else ""
+                })
+                if errors:
+                    st.error("Transaction not saved: " + "; ".join(errors))
+                else:
+                    try:
+                        replace_transaction(edit_index, transaction, edited_transaction, transactions,
+                                            label=f"Edit {edited_transaction['category']} transaction")
+                    except HistoryConflict:
+                        st.error("This transaction was changed in another session; it was not saved. "
+                                 "Reload the page to edit the current version.")
+                    else:
+                        record_search_edit(edit_index, transaction, edited_transaction,
+                                           get_file_version(TRANSACTION_FILE))
+                        st.session_state.edit_index = None
+                        st.rerun()
+            elif cancel_edit:
+                st.session_state.edit_index = None
+                st.rerun()
+
+elif st.session_state.page == "Household":
+    st.title("Household")
+    st.write("Income and spending across every ledger in the household, without the transfers between them.")
+
+    household = load_household()
+    with st.expander("Ledgers"):
+        st.dataframe(pd.DataFrame(household, columns=["name", "path"]), hide_index=True)
+        with st.form("household_form", clear_on_submit=True):
+            col1, col2 = st.columns(2)
+            ledger_name = col1.text_input("Name", placeholder="Partner")
+            ledger_path = col2.text_input("Ledger file or WET data folder")
+            if st.form_submit_button("Add Ledger"):
+                if not ledger_name.strip() or not os.path.exists(ledger_file(ledger_path.strip())):
+                    st.error("Enter a name and the path of an existing ledger file or WET data folder.")
+                elif ledger_name.strip() in {ledger["name"] for ledger in household}:
+                    st.error(f"There is already a ledger called {ledger_name.strip()}.")
+                else:
+                    save_household(household + [{"name": ledger_name.strip(), "path": ledger_path.strip()}])
+                    st.rerun()
+        ledger_to_remove = st.selectbox("Remove ledger", [""] + [ledger["name"] for ledger in household],
+                                        key="household_remove")
+        if ledger_to_remove and st.button("Remove Ledger"):
+            save_household([ledger for ledger in household if ledger["name"] != ledger_to_remove])
+            st.rerun()
+
+    missing = [ledger["name"] for ledger in household if not os.path.exists(ledger_file(ledger["path"]))]
+    if missing:
+        st.warning(f"Ledger file not found for {', '.join(missing)}")
+    # Each changed ledger is aggregated in its own process; unchanged ones are reused
+    consolidated = consolidate([ledger for ledger in household if ledger["name"] not in missing])
+    household_rollup = consolidated["rollup"]
+    transfers = consolidated["transfers"]
+
+    if household_rollup.empty:
+        st.info("No transactions in the household ledgers")
+    else:
+        household_rollup = household_rollup.assign(
+            amount=household_rollup["amount"] * convert_amount(1.0, BASE_CURRENCY, reporting_currency),
+            fees=household_rollup["fees"] * convert_amount(1.0, BASE_CURRENCY, reporting_currency))
+        money_in = household_rollup[household_rollup["transaction type"] == "debit"]
+        money_out = household_rollup[household_rollup["transaction type"] == "credit"]
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Money In", f"{reporting_currency} {money_in['amount'].sum():,.2f}")
+        col2.metric("Money Out", f"{reporting_currency} {money_out['amount'].sum():,.2f}")
+        col3.metric("Fees", f"{reporting_currency} {household_rollup['fees'].sum():,.2f}")
+        col4.metric("Net", f"{reporting_currency} "
+                    f"{money_in['amount'].sum() - money_out['amount'].sum() - household_rollup['fees'].sum():,.2f}")
+
+        st.subheader("Monthly Spending by Ledger")
+        monthly = money_out.groupby(["period", "ledger"], as_index=False)["amount"].sum()
+        fig_household = px.bar(monthly, x="period", y="amount", color="ledger", barmode="stack")
+        fig_household.update_layout(xaxis_title="Month", yaxis_title=f"Amount ({reporting_currency})")
+        st.plotly_chart(fig_household, use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("Spending by Category")
+            by_category = money_out.groupby("category", as_index=False)["amount"].sum()
+            st.plotly_chart(px.pie(by_category, values="amount", names="category", hole=0.4),
+                            use_container_width=True)
+        with col2:
+            st.subheader("Payment Methods")
+            by_method = money_out.groupby("payment method", as_index=False)[["amount", "fees"]].sum()
+            st.plotly_chart(px.bar(by_method, x="payment method", y=["amount", "fees"], barmode="group"),
+                            use_container_width=True)
+
+    if not transfers.empty:
+        with st.expander(f"Transfers between ledgers ({len(transfers) // 2}), left out of the totals"):
+            st.dataframe(transfers[["ledger", "date", "transaction type", "category", "amount(kes)", "reference"]]
+                         .sort_values("date"), hide_index=True)
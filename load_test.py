@@ -0,0 +1,179 @@
+"""
+Concurrent-session load test for WET_app.py
+
+Drives the app headlessly with streamlit.testing.v1.AppTest against a
+synthetic ledger in a scratch copy of the app, so real data is never
+touched. Each simulated session saves a transaction, exports a CSV,
+opens Budget and opens Honey Pot, in a loop. AppTest keeps a
+process-wide runtime, so every session runs in its own worker process;
+they all share the same data files, like sessions on one server.
+
+    python load_test.py --sessions 8 --iterations 5 --ledger-rows 20000
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+WET_FOLDER = "WET 3.0"
+TRANSACTION_FILE = os.path.join(WET_FOLDER, "saved_transactions.json")
+
+sys.path.insert(0, os.path.join(APP_DIR, WET_FOLDER))
+
+
+def prepare_workspace(ledger_rows):
+    """
+    Copy the app and its helper modules into a scratch folder with a synthetic ledger
+
+    The working directory is switched to the scratch folder, as the app
+    resolves its data files relative to it; callers switch back before
+    removing the folder.
+
+    Returns:
+        str: Path of the scratch folder
+    """
+    workspace = tempfile.mkdtemp(prefix="wet_load_test_")
+    shutil.copy(os.path.join(APP_DIR, "WET_app.py"), workspace)
+    os.makedirs(os.path.join(workspace, WET_FOLDER))
+    for path in glob.glob(os.path.join(APP_DIR, WET_FOLDER, "*.py")) + \
+            [os.path.join(APP_DIR, WET_FOLDER, "categories.json")]:
+        shutil.copy(path, os.path.join(workspace, WET_FOLDER))
+
+    os.chdir(workspace)
+    from records import sample_transactions
+    from schema import save_validated
+
+    # Written as the app would, so sessions start from a trusted ledger
+    save_validated(TRANSACTION_FILE, sample_transactions(ledger_rows))
+    return workspace
+
+
+def _timed_run(at, timings, step):
+    start = time.perf_counter()
+    at.run()
+    timings.append((step, time.perf_counter() - start))
+    if at.exception:
+        raise RuntimeError(f"{step}: {at.exception[0].value}")
+
+
+def _click(at, label):
+    next(button for button in at.button if button.label == label).click()
+
+
+def run_session(workspace, iterations):
+    """
+    One user's flow, repeated: save, export, Budget, Honey Pot
+
+    Returns:
+        tuple: (transactions saved successfully, list of (step, seconds))
+    """
+    os.chdir(workspace)
+    timings = []
+    at = AppTest.from_file(os.path.join(workspace, "WET_app.py"), default_timeout=300)
+    _timed_run(at, timings, "load home")
+    saved = 0
+    for _ in range(iterations):
+        at.session_state["page"] = "Home"
+        _timed_run(at, timings, "open home")
+        next(n for n in at.number_input if n.label == "Amount").set_value(float(np.random.randint(50, 5000)))
+        _click(at, "Save Transaction")
+        _timed_run(at, timings, "save transaction")
+        saved += any(s.value == "Transaction saved successfully!" for s in at.success)
+
+        _click(at, "Export to CSV")
+        _timed_run(at, timings, "export csv")
+
+        _click(at, "BUDGET")
+        _timed_run(at, timings, "open budget")
+
+        _click(at, "HONEY POT")
+        _timed_run(at, timings, "open honey pot")
+    return saved, timings
+
+
+def run_load_test(sessions, iterations, ledger_rows):
+    """
+    Run concurrent sessions and summarise latency, throughput and lost writes
+
+    Returns:
+        dict: Per-step latency percentiles and overall totals; "stored" and
+              "lost_writes" are None if the ledger file was left unreadable
+    """
+    cwd = os.getcwd()
+    workspace = prepare_workspace(ledger_rows)
+    try:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=sessions) as pool:
+            results = list(pool.map(run_session, [workspace] * sessions, [iterations] * sessions))
+        elapsed = time.perf_counter() - start
+
+        # Concurrent read-modify-write saves can drop other sessions' rows or
+        # interleave into an unreadable file; an unreadable file is reported as
+        # such, as its row count says nothing about lost writes
+        try:
+            with open(TRANSACTION_FILE) as file:
+                stored = len(json.load(file))
+        except json.JSONDecodeError:
+            stored = None
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    saved = sum(count for count, _ in results)
+    timings = [timing for _, session_timings in results for timing in session_timings]
+    expected = ledger_rows + saved
+
+    steps = {}
+    for step, seconds in timings:
+        steps.setdefault(step, []).append(seconds)
+    all_runs = np.array([seconds for _, seconds in timings])
+
+    return {
+        "steps": {step: {"runs": len(values),
+                         "p50": float(np.percentile(values, 50)),
+                         "p95": float(np.percentile(values, 95))} for step, values in steps.items()},
+        "reruns": len(all_runs),
+        "p50": float(np.percentile(all_runs, 50)),
+        "p95": float(np.percentile(all_runs, 95)),
+        "throughput": len(all_runs) / elapsed,
+        "saved": saved,
+        "expected": expected,
+        "stored": stored,
+        "lost_writes": None if stored is None else expected - stored,
+        "corrupted": stored is None,
+        "elapsed": elapsed,
+    }
+
+
+def print_report(result, sessions, ledger_rows):
+    print(f"\n{sessions} sessions against a {ledger_rows:,}-row ledger, {result['elapsed']:.1f}s total\n")
+    print(f"{'step':<18}{'runs':>6}{'p50 (s)':>10}{'p95 (s)':>10}")
+    for step, stats in result["steps"].items():
+        print(f"{step:<18}{stats['runs']:>6}{stats['p50']:>10.3f}{stats['p95']:>10.3f}")
+    print(f"{'all reruns':<18}{result['reruns']:>6}{result['p50']:>10.3f}{result['p95']:>10.3f}")
+    print(f"\nthroughput: {result['throughput']:.2f} reruns/s")
+    if result["corrupted"]:
+        print(f"writes: {result['saved']} confirmed saves, but the ledger file was left unreadable by concurrent "
+              f"writes, so lost writes cannot be counted")
+    else:
+        print(f"writes: {result['saved']} confirmed saves, ledger has {result['stored']:,} of "
+              f"{result['expected']:,} expected rows, {result['lost_writes']:,} lost")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate concurrent WET sessions with Streamlit AppTest")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=3, help="flows per session")
+    parser.add_argument("--ledger-rows", type=int, default=10_000, help="synthetic ledger size")
+    args = parser.parse_args()
+
+    print_report(run_load_test(args.sessions, args.iterations, args.ledger_rows), args.sessions, args.ledger_rows)
@@ -0,0 +1,367 @@
+"""
+Memory and latency regression gates for the app's hot paths
+
+Every hot path runs against a synthetic ledger of a fixed size in a scratch
+copy of the app (see load_test.prepare_workspace), so real data is never
+touched and no network is needed. Each is measured three ways and checked
+against its budget in perf_budgets.json:
+
+    peak    extra memory at the high-water mark of the call (tracemalloc), which
+            grows with every transient copy, e.g. a df.copy() or a repeated
+            pd.to_datetime on a page
+    blocks  memory blocks the call allocated and still holds on return: its
+            result and anything it cached
+    time    median wall time in units of a reference pandas workload timed on
+            the same machine, so a budget holds on a fast and a slow box alike
+
+Timing runs are not traced; memory is taken from extra traced runs after a
+warm-up call, so imports and first-use caches are not counted. Anything else
+the process allocates meanwhile, e.g. a Streamlit background thread, lands in
+the traced window too and only ever adds, so the lowest of the traced runs
+is kept.
+
+    python perf_test.py               # report, exit status 1 if a budget is exceeded
+    python perf_test.py --only cube   # hot paths whose name contains "cube"
+    python perf_test.py --record      # write new budgets from this machine's measurements
+    python perf_test.py --record --runs 3   # ... from the median time of three runs, as timings are noisy
+    python -m pytest perf_test.py
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from streamlit.logger import set_log_level
+from streamlit.testing.v1 import AppTest
+
+from load_test import APP_DIR, TRANSACTION_FILE, prepare_workspace
+
+BUDGET_FILE = os.path.join(APP_DIR, "perf_budgets.json")
+# Fixed ledger size, so budgets stay comparable between runs
+LEDGER_ROWS = 20_000
+PAGES = ["Home", "Budget", "Honey Pot", "Transactions", "Household"]
+# New budgets leave this much room over the measurement; wall time is the noisiest
+HEADROOM = {"peak": 1.3, "blocks": 1.3, "time": 2.0}
+UNITS = {"peak": "MiB", "blocks": "blocks", "time": "time units"}
+# Small absolute allowances, so near-zero measurements do not fail on noise
+SLACK = {"peak": 1.0, "blocks": 500, "time": 0.5}
+# Traced runs per hot path; memory is the lowest of them
+TRACED_RUNS = 2
+
+
+def reference_unit():
+    """
+    Median seconds of a fixed pandas groupby, the unit time budgets are in
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"key": rng.integers(0, 1000, 200_000), "value": rng.random(200_000)})
+    runs = []
+    for _ in range(7):
+        started = time.perf_counter()
+        df.groupby("key")["value"].agg(["sum", "mean", "size"])
+        runs.append(time.perf_counter() - started)
+    return statistics.median(runs)
+
+
+def _budgets():
+    """
+    Synthetic weekly budgets for the first year of the sample ledger
+    """
+    from periods import period_key_for
+
+    budgets = {}
+    for week in pd.date_range("2020-01-06", periods=52, freq="7D"):
+        budgets[period_key_for(week.date())] = {
+            "overall_budget": 150_000.0,
+            "items": [{"category": "Food & Beverages", "amount": 40_000.0},
+                      {"category": "Transport", "amount": 15_000.0},
+                      {"category": "Utilities", "amount": 8_000.0}],
+        }
+    return budgets
+
+
+def helper_paths():
+    """
+    The WET 3.0 helper hot paths as (name, setup, call)
+
+    setup takes the ledger records and returns the call's input, built
+    outside the measurement; call is what is measured.
+    """
+    from anomaly import backfill
+    from archive import summarize_partition
+    from browser import build_ledger_index
+    from cube import build_cube
+    from forecast import weekly_flows
+    from fx import convert_frame
+    from goals import weekly_savings
+    from history import diff
+    from household import partial_rollup
+    from ledger import LedgerSnapshot
+    from networth import networth_series, update_networth_cache
+    from periods import budget_rollup, build_period_index, weekly_spending
+    from reports import build_report_aggregate
+    from schema import validate_transactions
+    from search import build_search_index
+    from summary import summarise_ledger
+
+    def frame(records):
+        return pd.DataFrame(records)
+
+    return [
+        ("schema.validate_transactions", lambda records: records, validate_transactions),
+        ("ledger.LedgerSnapshot.frame", lambda records: records,
+         lambda records: LedgerSnapshot(None, records).frame()),
+        ("fx.convert_frame", frame, lambda df: convert_frame(df, "USD")),
+        ("summary.summarise_ledger", frame, summarise_ledger),
+        ("cube.build_cube", frame, build_cube),
+        ("periods.weekly_spending", frame, weekly_spending),
+        ("periods.budget_rollup",
+         lambda records: (build_period_index(_budgets()), weekly_spending(frame(records))),
+         lambda inputs: budget_rollup(*inputs, "Month")),
+        ("networth.update_networth_cache", frame, update_networth_cache),
+        ("networth.networth_series", lambda records: update_networth_cache(frame(records)),
+         lambda cache: networth_series(cache, "Week")),
+        ("browser.build_ledger_index", lambda records: records, build_ledger_index),
+        ("search.build_search_index", lambda records: records, build_search_index),
+        ("anomaly.backfill", lambda records: records, backfill),
+        ("forecast.weekly_flows", frame, weekly_flows),
+        ("goals.weekly_savings", frame, weekly_savings),
+        ("archive.summarize_partition", lambda records: records, summarize_partition),
+        ("reports.build_report_aggregate", frame, build_report_aggregate),
+        ("household.partial_rollup", lambda records: TRANSACTION_FILE,
+         lambda path: partial_rollup("Me", path)),
+        ("history.diff", lambda records: (records, records + [dict(records[-1], reference="X1")]),
+         lambda states: diff(*states)),
+    ]
+
+
+def _share_bytecode():
+    """
+    Compile the app once for all AppTest runs, as a server does
+
+    AppTest compiles the script afresh on every run; at over 6 MiB that
+    would be the peak of every page and hide what the page itself allocates.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    if getattr(ScriptCache.get_bytecode, "shared", False):
+        return
+    compiled, get_bytecode = {}, ScriptCache.get_bytecode
+
+    def shared_bytecode(self, script_path):
+        if script_path not in compiled:
+            compiled[script_path] = get_bytecode(self, script_path)
+        return compiled[script_path]
+
+    shared_bytecode.shared = True
+    ScriptCache.get_bytecode = shared_bytecode
+
+
+def page_paths():
+    """
+    WET_app.py page loads as (name, setup, call): a new session opening each page
+    """
+    _share_bytecode()
+
+    def open_page(page):
+        at = AppTest.from_file(os.path.abspath("WET_app.py"), default_timeout=300)
+        at.session_state["page"] = page
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"{page}: {at.exception[0].value}")
+        return at
+
+    return [(f"page {page}", lambda records, page=page: page, open_page) for page in PAGES]
+
+
+def measure(setup, call, records, repeats):
+    """
+    Time and trace one hot path
+
+    Returns:
+        dict: "peak" MiB, retained "blocks" and median "seconds"
+    """
+    argument = setup(records)
+    call(argument)  # warm-up: imports and first-use caches
+
+    seconds = []
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        call(argument)
+        seconds.append(time.perf_counter() - started)
+
+    peaks, retained = [], []
+    for _ in range(TRACED_RUNS):
+        gc.collect()
+        tracemalloc.start()
+        blocks_before = sys.getallocatedblocks()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = call(argument)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        gc.collect()
+        retained.append(sys.getallocatedblocks() - blocks_before)
+        tracemalloc.stop()
+        del result
+    return {"peak": min(peaks) / 2 ** 20, "blocks": max(min(retained), 0), "seconds": statistics.median(seconds)}
+
+
+def run_perf_suite(only=None, repeats=3):
+    """
+    Measure every hot path against a LEDGER_ROWS ledger
+
+    Args:
+        only (str): Only hot paths whose name contains this
+        repeats (int): Timed runs per hot path
+
+    Returns:
+        dict: "unit" seconds and "results", one dict per hot path with
+              "name", "rows", "peak", "blocks", "seconds" and "time" (in units)
+    """
+    # Helpers called outside a running app warn on every cached call
+    set_log_level("error")
+    cwd = os.getcwd()
+    unit = reference_unit()
+    workspace = prepare_workspace(LEDGER_ROWS)
+    try:
+        from fx import add_rate
+        from records import sample_transactions
+        from schema import save_validated
+
+        records = sample_transactions(LEDGER_ROWS)
+        add_rate("2019-12-31", "USD", 130.0)
+        save_validated(os.path.join("WET 3.0", "budgets.json"), _budgets())
+        results = []
+        # Page loads take seconds each, so they get one timed run fewer
+        for paths, runs in [(helper_paths, repeats), (page_paths, max(1, repeats - 1))]:
+            for name, setup, call in paths():
+                if only and only not in name:
+                    continue
+                measured = measure(setup, call, records, runs)
+                results.append(dict(measured, name=name, rows=LEDGER_ROWS, time=measured["seconds"] / unit))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+    return {"unit": unit, "results": results}
+
+
+def load_budgets():
+    if not os.path.exists(BUDGET_FILE):
+        return {}
+    with open(BUDGET_FILE) as file:
+        return json.load(file)
+
+
+def check(results, budgets):
+    """
+    Compare measurements with their budgets
+
+    Returns:
+        list: (name, measure, value, budget) for every budget exceeded; a hot
+              path without a budget, or measured at another size, is one failure
+    """
+    failures = []
+    for result in results:
+        budget = budgets.get(result["name"])
+        if budget is None or budget["rows"] != result["rows"]:
+            failures.append((result["name"], "budget", None, None))
+            continue
+        for key in ("peak", "blocks", "time"):
+            if result[key] > budget[key]:
+                failures.append((result["name"], key, result[key], budget[key]))
+    return failures
+
+
+def combine_runs(suites):
+    """
+    Each hot path's median time and highest peak and blocks over several runs of the suite
+
+    The time budget already carries HEADROOM for noise, so the median run is
+    recorded rather than the slowest one.
+
+    Returns:
+        list: One result per hot path, as in run_perf_suite
+    """
+    results = {}
+    for suite in suites:
+        for result in suite["results"]:
+            results.setdefault(result["name"], []).append(result)
+    combined = []
+    for runs in results.values():
+        result = dict(runs[0])
+        for key in ("peak", "blocks"):
+            result[key] = max(run[key] for run in runs)
+        for key in ("time", "seconds"):
+            result[key] = statistics.median(run[key] for run in runs)
+        combined.append(result)
+    return combined
+
+
+def record_budgets(results):
+    budgets = load_budgets()
+    for result in results:
+        budgets[result["name"]] = {
+            "rows": result["rows"],
+            "peak": round(result["peak"] * HEADROOM["peak"] + SLACK["peak"], 1),
+            "blocks": int(result["blocks"] * HEADROOM["blocks"] + SLACK["blocks"]),
+            "time": round(result["time"] * HEADROOM["time"] + SLACK["time"], 1),
+        }
+    with open(BUDGET_FILE, "w") as file:
+        json.dump(dict(sorted(budgets.items())), file, indent=4)
+        file.write("\n")
+
+
+def format_report(suite, budgets):
+    failures = check(suite["results"], budgets)
+    over = {}
+    for name, key, _, _ in failures:
+        over.setdefault(name, []).append(key)
+
+    lines = [f"time unit: {suite['unit'] * 1000:.1f} ms (reference groupby on this machine)", "",
+             f"{'hot path':<34}{'rows':>7}{'peak MiB':>17}{'blocks':>21}{'time':>15}{'ms':>9}  status"]
+    for result in suite["results"]:
+        budget = budgets.get(result["name"], {})
+        lines.append(
+            f"{result['name']:<34}{result['rows']:>7}"
+            f"{result['peak']:>9.1f} /{budget.get('peak', float('nan')):>6.1f}"
+            f"{result['blocks']:>10,} /{budget.get('blocks', 0):>9,}"
+            f"{result['time']:>7.1f} /{budget.get('time', float('nan')):>6.1f}"
+            f"{result['seconds'] * 1000:>9.0f}  "
+            + ("OVER " + ", ".join(over[result["name"]]) if result["name"] in over else "ok"))
+    if failures:
+        lines.append("")
+        for name, key, value, budget in failures:
+            lines.append(f"{name}: no budget at this size; run perf_test.py --record" if key == "budget"
+                         else f"{name}: {key} {value:,.1f} {UNITS[key]} exceeds its budget of {budget:,.1f}")
+    return "\n".join(lines)
+
+
+def test_hot_paths():
+    budgets = load_budgets()
+    suite = run_perf_suite()
+    assert not check(suite["results"], budgets), "\n" + format_report(suite, budgets)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check peak memory, retained blocks and time of the hot paths")
+    parser.add_argument("--only", help="only hot paths whose name contains this")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per hot path")
+    parser.add_argument("--record", action="store_true", help="write budgets from this run's measurements")
+    parser.add_argument("--runs", type=int, default=1, help="run the suite this many times and keep the median time")
+    args = parser.parse_args()
+
+    suites = [run_perf_suite(args.only, args.repeats) for _ in range(max(1, args.runs))]
+    suite = {"unit": suites[-1]["unit"], "results": combine_runs(suites)}
+    if args.record:
+        record_budgets(suite["results"])
+        print(f"Budgets written to {BUDGET_FILE}\n")
+    budgets = load_budgets()
+    print(format_report(suite, budgets))
+    sys.exit(1 if check(suite["results"], budgets) else 0)